@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import json
+import platform
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.app.services import monthly_tax_pdf
+from backend.app.services.sii_synthetic import SyntheticConfig, generate_company
+from backend.app.services.timing import percentile
+
+# Harness de benchmark sobre datos sintéticos.
+# Resultados en storage/bench/<label>.json para comparar contra una corrida previa.
+BENCH_DIRNAME = "bench"
+CASES = ("build_monthly_tax_summary", "read_bhe_summary", "render_pdf")
+
+
+@dataclass
+class CaseResult:
+    name: str
+    runs: int
+    p50_ms: float
+    p95_ms: float
+    min_ms: float
+    max_ms: float
+    total_ms: float
+
+
+@dataclass
+class BenchResult:
+    label: str
+    created_at: str
+    config: Dict[str, Any]
+    python: str
+    cases: Dict[str, CaseResult] = field(default_factory=dict)
+
+
+# ----------------------------
+# Medición
+# ----------------------------
+def _measure(name: str, fn: Callable[[], Any], repeat: int, warmup: int) -> CaseResult:
+    for _ in range(max(0, warmup)):
+        fn()
+    samples: List[float] = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return CaseResult(
+        name=name,
+        runs=len(samples),
+        p50_ms=round(percentile(samples, 50), 3),
+        p95_ms=round(percentile(samples, 95), 3),
+        min_ms=round(samples[0], 3),
+        max_ms=round(samples[-1], 3),
+        total_ms=round(sum(samples), 3),
+    )
+
+
+def _month_inputs(company_dir: Path, year: int, month: int) -> Dict[str, Optional[Path]]:
+    mm = f"{month:02d}"
+    tag = f"{year}{mm}"
+    dcv_dir = company_dir / "dcv" / str(year) / mm
+    rem_dir = company_dir / "f29_remanente" / str(year) / mm
+    rem = sorted(rem_dir.glob(f"remanente_prev_*_para_{tag}.json"))
+    return {
+        "compras": next(iter(sorted(dcv_dir.glob("RCV_COMPRA_REGISTRO_*.csv"))), None),
+        "ventas": next(iter(sorted(dcv_dir.glob("RCV_VENTA_*.csv"))), None),
+        "bhe": company_dir / "bhe" / str(year) / mm / f"BHE_{tag}.html",
+        "remanente": rem[-1] if rem else None,
+    }
+
+
+def run_benchmark(
+    data_root: Path,
+    cfg: SyntheticConfig,
+    *,
+    label: str,
+    month: Optional[int] = None,
+    repeat: int = 5,
+    warmup: int = 1,
+) -> BenchResult:
+    """
+    Genera una empresa sintética en data_root y mide las 3 etapas
+    calientes del resumen mensual sobre el mes indicado (default: cfg.to_month).
+    """
+    data_root = Path(data_root)
+    month = month or cfg.to_month
+    company = generate_company(data_root, cfg)
+    company_dir = data_root / "companies" / company.company_id
+    inputs = _month_inputs(company_dir, cfg.year, month)
+    if not inputs["compras"] or not inputs["ventas"]:
+        raise RuntimeError(f"Datos sintéticos incompletos en {company_dir}")
+
+    def build() -> Dict[str, Any]:
+        return monthly_tax_pdf.build_monthly_tax_summary(
+            company_name=company.razon_social,
+            period_year=cfg.year,
+            period_month=month,
+            ventas_path=str(inputs["ventas"]),
+            compras_path=str(inputs["compras"]),
+            boletas_honorarios_path=str(inputs["bhe"]),
+            formulario_compacto_path=str(inputs["remanente"]) if inputs["remanente"] else None,
+        )
+
+    summary = build()
+    month_label = f"{monthly_tax_pdf.MONTH_LABELS.get(month, str(month))} {cfg.year}"
+
+    result = BenchResult(
+        label=label,
+        created_at=datetime.now(timezone.utc).isoformat(),
+        config=asdict(cfg),
+        python=platform.python_version(),
+    )
+    result.cases["build_monthly_tax_summary"] = _measure("build_monthly_tax_summary", build, repeat, warmup)
+    result.cases["read_bhe_summary"] = _measure(
+        "read_bhe_summary", lambda: monthly_tax_pdf._read_bhe_summary(inputs["bhe"]), repeat, warmup
+    )
+    with tempfile.TemporaryDirectory(prefix="sii_bench_pdf_") as tmp:
+        out_pdf = Path(tmp) / "bench.pdf"
+        result.cases["render_pdf"] = _measure(
+            "render_pdf", lambda: monthly_tax_pdf._render_pdf(summary, out_pdf, month_label), repeat, warmup
+        )
+    return result
+
+
+# ----------------------------
+# Persistencia y comparación
+# ----------------------------
+def bench_dir(storage_root: Path) -> Path:
+    return Path(storage_root) / BENCH_DIRNAME
+
+
+def save_result(storage_root: Path, result: BenchResult) -> Path:
+    out_dir = bench_dir(storage_root)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"{result.label}.json"
+    out_path.write_text(json.dumps(asdict(result), ensure_ascii=False, indent=2), encoding="utf-8")
+    return out_path
+
+
+def load_result(path: Path) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def resolve_result_path(storage_root: Path, ref: str) -> Path:
+    """Acepta una ruta a .json o un label dentro de storage/bench."""
+    candidate = Path(ref)
+    if candidate.suffix == ".json" and candidate.exists():
+        return candidate
+    return bench_dir(storage_root) / f"{ref}.json"
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    *,
+    metric: str = "p50_ms",
+    threshold_pct: float = 10.0,
+) -> List[Dict[str, Any]]:
+    """
+    Compara caso a caso. regression=True si current supera baseline en más de threshold_pct.
+    """
+    rows: List[Dict[str, Any]] = []
+    base_cases = baseline.get("cases") or {}
+    cur_cases = current.get("cases") or {}
+    extra = sorted((set(base_cases) | set(cur_cases)) - set(CASES))
+    for name in [c for c in CASES if c in base_cases or c in cur_cases] + extra:
+        base_v = (base_cases.get(name) or {}).get(metric)
+        cur_v = (cur_cases.get(name) or {}).get(metric)
+        delta_pct = None
+        if base_v and cur_v is not None:
+            delta_pct = round((float(cur_v) - float(base_v)) / float(base_v) * 100.0, 2)
+        rows.append(
+            {
+                "case": name,
+                "baseline": base_v,
+                "current": cur_v,
+                "delta_pct": delta_pct,
+                "regression": delta_pct is not None and delta_pct > threshold_pct,
+            }
+        )
+    return rows
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import html
+import mmap
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+# Extractor de una sola pasada para el informe mensual BHE (HTML del SII).
+# Un único finditer sobre el texto entrega: campos ocultos liquido1..4, fila
+# "Totales" y filas por boleta (DOM renderizado o arreglo JS arr_informe_mensual).
+
+# Estados que cuentan como vigentes: DOM renderizado ("VIG") y código crudo del JS ("N").
+VIGENTE_STATES = frozenset({"VIG", "VIGENTE", "N"})
+
+_TOKEN_RE = re.compile(
+    r"<script\b[^>]*>(?P<js>.*?)</script\s*>"
+    r"|(?P<tr_open><tr\b[^>]*>)"
+    r"|(?P<tr_close></tr\s*>)"
+    r"|<t[dh]\b[^>]*>(?P<cell>.*?)</t[dh]\s*>"
+    r"|name=[\"'](?P<hname>liquido\d)[\"']\s+value=[\"'](?P<hval>[^\"']*)[\"']",
+    re.IGNORECASE | re.DOTALL,
+)
+_HIDDEN_RE = re.compile(r"name=[\"'](liquido\d)[\"']\s+value=[\"']([^\"']*)[\"']", re.IGNORECASE)
+_JS_FIELD_RE = re.compile(
+    r"arr_informe_mensual\['(?P<key>[a-z_]+?)_(?P<idx>\d+)'\]\s*=\s*(?:formatMiles\(\s*)?\"(?P<val>[^\"]*)\"",
+    re.IGNORECASE,
+)
+# Variantes para recorrer el archivo mapeado (bytes latin-1) sin decodificarlo completo:
+# solo se decodifican celdas, scripts con arr_informe_mensual y campos ocultos. "\s" se
+# expande a lo que significa sobre str latin-1 para que ambos recorridos coincidan.
+_LATIN1_SPACE = r"[ \t\n\r\f\v\x1c-\x1f\x85\xa0]"
+_TOKEN_RE_BYTES = re.compile(
+    _TOKEN_RE.pattern.replace(r"\s", _LATIN1_SPACE).encode("latin-1"), re.IGNORECASE | re.DOTALL
+)
+_TABLE_RE_BYTES = re.compile(rb"<table", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_NUMERIC_RE = re.compile(r"[0-9.,]+")
+_SPACES_RE = re.compile(r"\s+")
+
+# Encabezados del DOM -> campo de BHEBoleta
+_HEADER_FIELDS = {
+    "estado": "estado",
+    "fecha": "fecha",
+    "rut": "rut",
+    "brutos": "bruto",
+    "retenido": "retenido",
+    "pagado": "pagado",
+}
+
+
+@dataclass
+class BHEBoleta:
+    numero: Optional[str]
+    estado: str
+    fecha: Optional[str]
+    rut: Optional[str]
+    nombre: Optional[str]
+    bruto: Optional[int]
+    retenido: Optional[int]
+    pagado: Optional[int]
+
+    @property
+    def vigente(self) -> bool:
+        return self.estado.strip().upper() in VIGENTE_STATES
+
+
+@dataclass
+class BHEScan:
+    hidden: Dict[str, str] = field(default_factory=dict)
+    totals: Optional[Tuple[Optional[int], Optional[int], Optional[int]]] = None
+    boletas: List[BHEBoleta] = field(default_factory=list)
+    rows_source: Optional[str] = None  # "dom" | "js"
+
+    def vigentes(self) -> List[BHEBoleta]:
+        return [b for b in self.boletas if b.vigente]
+
+    def boletas_totals(self) -> Optional[Tuple[int, int, int]]:
+        """Suma (bruto, retenido, pagado) de boletas vigentes; None si no hay filas."""
+        if not self.boletas:
+            return None
+        bruto = retenido = pagado = 0
+        for b in self.vigentes():
+            bruto += b.bruto or 0
+            retenido += b.retenido or 0
+            pagado += b.pagado or 0
+        return bruto, retenido, pagado
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def _money(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    digits = re.sub(r"[^\d-]", "", value)
+    if not digits or digits == "-":
+        return None
+    try:
+        return int(digits)
+    except ValueError:
+        return None
+
+
+def _latin1(raw: bytes) -> str:
+    return raw.decode("latin-1")
+
+
+def _cell_text(raw: str) -> str:
+    text = _TAG_RE.sub(" ", raw)
+    text = html.unescape(text.replace("&nbsp;", " "))
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def _header_map(cells: List[str]) -> Optional[Dict[str, int]]:
+    lowered = [c.lower() for c in cells]
+    if "estado" not in lowered or not any(c.startswith("bruto") for c in lowered):
+        return None
+    mapping: Dict[str, int] = {}
+    for i, c in enumerate(lowered):
+        key = _HEADER_FIELDS.get(c)
+        if key is None and c.startswith("n") and len(c) <= 3:
+            # "N°" (puede venir como "NÂ°" al leer en latin-1 un HTML guardado en utf-8)
+            key = "numero"
+        if key is None and c.startswith("nombre"):
+            key = "nombre"
+        if key is None and c.startswith("bruto"):
+            key = "bruto"
+        if key and key not in mapping:
+            mapping[key] = i
+    return mapping
+
+
+def _js_boletas(js: str, fields: Dict[str, Dict[str, str]]) -> None:
+    for m in _JS_FIELD_RE.finditer(js):
+        fields.setdefault(m.group("idx"), {})[m.group("key").lower()] = m.group("val")
+
+
+def _boletas_from_js(fields: Dict[str, Dict[str, str]]) -> List[BHEBoleta]:
+    out: List[BHEBoleta] = []
+    for idx in sorted(fields, key=int):
+        f = fields[idx]
+        if "nroboleta" not in f:
+            continue
+        rut = f.get("rutemisor")
+        if rut and f.get("dvemisor"):
+            rut = f"{rut}-{f['dvemisor']}"
+        out.append(
+            BHEBoleta(
+                numero=f.get("nroboleta"),
+                estado=(f.get("estado") or "").strip(),
+                fecha=f.get("fecha_boleta"),
+                rut=rut,
+                nombre=(f.get("nombre_emisor") or "").strip() or None,
+                bruto=_money(f.get("totalhonorarios")),
+                retenido=_money(f.get("retencion_receptor")),
+                pagado=_money(f.get("honorariosliquidos")),
+            )
+        )
+    return out
+
+
+# ----------------------------
+# API
+# ----------------------------
+def has_table(data: Union[str, bytes, mmap.mmap]) -> bool:
+    if isinstance(data, str):
+        return "<table" in data.lower()
+    return _TABLE_RE_BYTES.search(data) is not None
+
+
+def scan_bhe_html(text: Union[str, bytes, mmap.mmap]) -> BHEScan:
+    """
+    `text` puede ser el HTML decodificado o sus bytes (p. ej. storage_io.mapped); con bytes
+    se decodifica en latin-1 solo lo que se usa, con el mismo resultado.
+    """
+    if isinstance(text, str):
+        token_re, decode = _TOKEN_RE, None
+    else:
+        token_re, decode = _TOKEN_RE_BYTES, _latin1
+    scan = BHEScan()
+    header: Optional[Dict[str, int]] = None
+    dom_rows: List[BHEBoleta] = []
+    js_fields: Dict[str, Dict[str, str]] = {}
+    cells: List[str] = []
+
+    def close_row() -> None:
+        nonlocal header
+        if not cells:
+            return
+        if scan.totals is None and any("totales" in c.lower() for c in cells):
+            nums = [c for c in cells if _NUMERIC_RE.fullmatch(c)]
+            if len(nums) >= 3:
+                scan.totals = (_money(nums[-3]), _money(nums[-2]), _money(nums[-1]))
+        elif header is None:
+            header = _header_map(cells)
+        elif len(cells) > max(header.values()):
+
+            def get(key: str) -> Optional[str]:
+                return cells[header[key]] if key in header else None
+
+            estado = get("estado") or ""
+            if estado:
+                dom_rows.append(
+                    BHEBoleta(
+                        numero=get("numero"),
+                        estado=estado,
+                        fecha=get("fecha"),
+                        rut=get("rut"),
+                        nombre=get("nombre"),
+                        bruto=_money(get("bruto")),
+                        retenido=_money(get("retenido")),
+                        pagado=_money(get("pagado")),
+                    )
+                )
+        cells.clear()
+
+    for m in token_re.finditer(text):
+        kind = m.lastgroup
+        if kind == "js":
+            js = m.group("js")
+            if decode is not None:
+                if b"arr_informe_mensual" not in js:
+                    continue
+                js = decode(js)
+            if "arr_informe_mensual" in js:
+                _js_boletas(js, js_fields)
+        elif kind == "tr_open" or kind == "tr_close":
+            close_row()
+        elif kind == "cell":
+            raw = m.group("cell") if decode is None else decode(m.group("cell"))
+            if "liquido" in raw.lower():
+                for name, value in _HIDDEN_RE.findall(raw):
+                    scan.hidden.setdefault(name.lower(), value)
+            cells.append(_cell_text(raw))
+        elif kind in ("hname", "hval"):
+            name, value = m.group("hname"), m.group("hval")
+            if decode is not None:
+                name, value = decode(name), decode(value)
+            scan.hidden.setdefault(name.lower(), value)
+    close_row()
+
+    if dom_rows:
+        scan.boletas, scan.rows_source = dom_rows, "dom"
+    else:
+        js_rows = _boletas_from_js(js_fields)
+        if js_rows:
+            scan.boletas, scan.rows_source = js_rows, "js"
+    return scan
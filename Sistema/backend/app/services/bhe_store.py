@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import heapq
+import json
+import re
+import struct
+import sys
+import threading
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from backend.app.services import retention, storage_io
+from backend.app.services.bhe_html import VIGENTE_STATES, BHEBoleta, scan_bhe_html
+from backend.app.services.timing import span
+
+# Almacén columnar por empresa-año de las boletas de honorarios (detalle por boleta).
+# Se construye una vez desde bhe/<año>/<MM>/BHE_*.html y se persiste en
+# bhe/<año>/boletas_<año>.bin; las consultas anuales (top emisores, tendencia mensual,
+# retenciones) se responden desde memoria sin volver a abrir el HTML.
+STORE_MAGIC = b"BHEY1\n"
+STORE_FILENAME = "boletas_{year}.bin"
+MONEY_FIELDS = ("bruto", "retenido", "pagado")
+
+# Columnas persistidas (nombre, typecode de array). El orden define el layout del archivo.
+_COLUMNS = (
+    ("month", "B"),
+    ("fecha", "I"),  # AAAAMMDD (0 = sin fecha)
+    ("folio", "q"),  # -1 = sin folio numérico
+    ("issuer", "I"),  # índice en issuers
+    ("estado", "B"),  # índice en estados
+    ("bruto", "q"),
+    ("retenido", "q"),
+    ("pagado", "q"),
+)
+_FECHA_RE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+
+_MEMO: Dict[Path, Tuple[Tuple, "BHEYearStore"]] = {}
+_MEMO_LOCK = threading.Lock()
+
+
+@dataclass
+class IssuerTotal:
+    rut: str
+    nombre: Optional[str]
+    boletas: int
+    bruto: int
+    retenido: int
+    pagado: int
+
+
+class BHEYearStore:
+    """
+    Boletas de un año en columnas tipadas (array). RUT/nombre y estado se guardan
+    codificados como índices a tablas de strings para no repetirlos por fila.
+    """
+
+    def __init__(self, year: int) -> None:
+        self.year = int(year)
+        self.issuers: List[Tuple[str, Optional[str]]] = []
+        self.estados: List[str] = []
+        self._issuer_idx: Dict[str, int] = {}
+        self._estado_idx: Dict[str, int] = {}
+        for name, code in _COLUMNS:
+            setattr(self, name, array(code))
+
+    def __len__(self) -> int:
+        return len(self.month)
+
+    # ----------------------------
+    # Carga
+    # ----------------------------
+    def _intern_issuer(self, rut: Optional[str], nombre: Optional[str]) -> int:
+        key = (rut or "").strip().upper()
+        idx = self._issuer_idx.get(key)
+        if idx is None:
+            idx = len(self.issuers)
+            self._issuer_idx[key] = idx
+            self.issuers.append((key, nombre))
+        elif nombre and not self.issuers[idx][1]:
+            self.issuers[idx] = (key, nombre)
+        return idx
+
+    def _intern_estado(self, estado: str) -> int:
+        key = (estado or "").strip().upper()
+        idx = self._estado_idx.get(key)
+        if idx is None:
+            idx = len(self.estados)
+            self._estado_idx[key] = idx
+            self.estados.append(key)
+        return idx
+
+    def append(self, month: int, boleta: BHEBoleta) -> None:
+        fecha = 0
+        m = _FECHA_RE.search(boleta.fecha or "")
+        if m:
+            fecha = int(m.group(3)) * 10000 + int(m.group(2)) * 100 + int(m.group(1))
+        folio = re.sub(r"\D", "", boleta.numero or "")
+        self.month.append(int(month))
+        self.fecha.append(fecha)
+        self.folio.append(int(folio) if folio else -1)
+        self.issuer.append(self._intern_issuer(boleta.rut, boleta.nombre))
+        self.estado.append(self._intern_estado(boleta.estado))
+        self.bruto.append(boleta.bruto or 0)
+        self.retenido.append(boleta.retenido or 0)
+        self.pagado.append(boleta.pagado or 0)
+
+    def clear_month(self, month: int) -> None:
+        keep = [i for i, m in enumerate(self.month) if m != month]
+        if len(keep) == len(self):
+            return
+        for name, code in _COLUMNS:
+            col = getattr(self, name)
+            setattr(self, name, array(code, (col[i] for i in keep)))
+
+    # ----------------------------
+    # Consultas
+    # ----------------------------
+    def _vigente_mask(self) -> List[bool]:
+        flags = [e in VIGENTE_STATES for e in self.estados]
+        return [flags[e] for e in self.estado]
+
+    def _rows(self, vigentes_only: bool) -> Iterator[int]:
+        if not vigentes_only:
+            return iter(range(len(self)))
+        mask = self._vigente_mask()
+        return (i for i, ok in enumerate(mask) if ok)
+
+    def months(self) -> List[int]:
+        return sorted(set(self.month))
+
+    def boletas(self, month: Optional[int] = None, vigentes_only: bool = False) -> Iterator[BHEBoleta]:
+        for i in self._rows(vigentes_only):
+            if month is not None and self.month[i] != month:
+                continue
+            rut, nombre = self.issuers[self.issuer[i]]
+            f = self.fecha[i]
+            yield BHEBoleta(
+                numero=str(self.folio[i]) if self.folio[i] >= 0 else None,
+                estado=self.estados[self.estado[i]],
+                fecha=f"{f % 100:02d}/{f // 100 % 100:02d}/{f // 10000}" if f else None,
+                rut=rut or None,
+                nombre=nombre,
+                bruto=self.bruto[i],
+                retenido=self.retenido[i],
+                pagado=self.pagado[i],
+            )
+
+    def issuer_totals(self, vigentes_only: bool = True) -> List[IssuerTotal]:
+        n = len(self.issuers)
+        count = [0] * n
+        sums = {f: [0] * n for f in MONEY_FIELDS}
+        cols = {f: getattr(self, f) for f in MONEY_FIELDS}
+        issuer = self.issuer
+        for i in self._rows(vigentes_only):
+            k = issuer[i]
+            count[k] += 1
+            for f in MONEY_FIELDS:
+                sums[f][k] += cols[f][i]
+        return [
+            IssuerTotal(
+                rut=self.issuers[k][0],
+                nombre=self.issuers[k][1],
+                boletas=count[k],
+                bruto=sums["bruto"][k],
+                retenido=sums["retenido"][k],
+                pagado=sums["pagado"][k],
+            )
+            for k in range(n)
+            if count[k]
+        ]
+
+    def top_issuers(self, n: int = 10, by: str = "bruto", vigentes_only: bool = True) -> List[IssuerTotal]:
+        if by not in MONEY_FIELDS + ("boletas",):
+            raise ValueError(f"Campo no soportado para ranking: {by}")
+        return heapq.nlargest(n, self.issuer_totals(vigentes_only), key=lambda t: (getattr(t, by), t.rut))
+
+    def monthly_trend(self, field: str = "bruto", vigentes_only: bool = True) -> Dict[int, int]:
+        """Total mensual (1..12) del campo indicado; meses sin boletas quedan en 0."""
+        if field not in MONEY_FIELDS:
+            raise ValueError(f"Campo no soportado: {field}")
+        col = getattr(self, field)
+        out = {m: 0 for m in range(1, 13)}
+        for i in self._rows(vigentes_only):
+            out[self.month[i]] += col[i]
+        return out
+
+    def retention_totals(self, vigentes_only: bool = True) -> Dict[str, object]:
+        totals = {f: 0 for f in MONEY_FIELDS}
+        boletas = 0
+        for i in self._rows(vigentes_only):
+            boletas += 1
+            for f in MONEY_FIELDS:
+                totals[f] += getattr(self, f)[i]
+        tasa = round(totals["retenido"] * 100.0 / totals["bruto"], 2) if totals["bruto"] else None
+        return {"boletas": boletas, **totals, "tasa_retencion_pct": tasa}
+
+    # ----------------------------
+    # Persistencia (binario compacto)
+    # ----------------------------
+    def to_bytes(self, sources: Dict[str, List[int]]) -> bytes:
+        header = {
+            "year": self.year,
+            "byteorder": sys.byteorder,
+            "rows": len(self),
+            "columns": [[name, code] for name, code in _COLUMNS],
+            "issuers": self.issuers,
+            "estados": self.estados,
+            "sources": sources,
+        }
+        head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        parts = [STORE_MAGIC, struct.pack("<I", len(head)), head]
+        parts.extend(getattr(self, name).tobytes() for name, _code in _COLUMNS)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Tuple["BHEYearStore", Dict[str, List[int]]]:
+        if not data.startswith(STORE_MAGIC):
+            raise ValueError("Archivo de boletas BHE inválido")
+        pos = len(STORE_MAGIC)
+        (head_len,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+        header = json.loads(data[pos:pos + head_len].decode("utf-8"))
+        pos += head_len
+        if [tuple(c) for c in header["columns"]] != list(_COLUMNS):
+            raise ValueError("Layout de columnas BHE desconocido")
+        store = cls(header["year"])
+        rows = int(header["rows"])
+        swap = header["byteorder"] != sys.byteorder
+        for name, code in _COLUMNS:
+            col = array(code)
+            size = col.itemsize * rows
+            col.frombytes(data[pos:pos + size])
+            if swap:
+                col.byteswap()
+            pos += size
+            setattr(store, name, col)
+        store.issuers = [(rut, nombre) for rut, nombre in header["issuers"]]
+        store.estados = list(header["estados"])
+        store._issuer_idx = {rut: i for i, (rut, _n) in enumerate(store.issuers)}
+        store._estado_idx = {e: i for i, e in enumerate(store.estados)}
+        return store, header.get("sources") or {}
+
+
+# ----------------------------
+# Construcción desde storage
+# ----------------------------
+def _year_dir(storage_root: Path, company_id: str, year: int) -> Path:
+    return Path(storage_root) / "companies" / company_id / "bhe" / str(year)
+
+
+def store_path(storage_root: Path, company_id: str, year: int) -> Path:
+    return _year_dir(storage_root, company_id, year) / STORE_FILENAME.format(year=year)
+
+
+def _month_sources(year_dir: Path) -> Dict[str, Path]:
+    """Un HTML por mes (bhe/<año>/<MM>/BHE_*.html); el XLS no se usa para el detalle."""
+    out: Dict[str, Path] = {}
+    if not year_dir.exists():
+        return out
+    for mdir in sorted(p for p in year_dir.iterdir() if p.is_dir() and p.name.isdigit()):
+        htmls = storage_io.glob(mdir, "*.htm*")
+        if htmls:
+            out[mdir.name] = htmls[0]
+    return out
+
+
+def _signature(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _read_cached(path: Path) -> Optional[Tuple[BHEYearStore, Dict[str, List[int]]]]:
+    if not path.exists():
+        return None
+    try:
+        return BHEYearStore.from_bytes(path.read_bytes())
+    except Exception:
+        return None
+
+
+def load_year(
+    storage_root: Path,
+    company_id: str,
+    year: int,
+    *,
+    rebuild: bool = False,
+    persist: bool = True,
+) -> BHEYearStore:
+    """
+    Devuelve el almacén del año. Reutiliza (en orden): memoria del proceso, archivo
+    boletas_<año>.bin y, solo para los meses cuyo HTML cambió, un nuevo escaneo.
+    """
+    retention.ensure_year(storage_root, company_id, "bhe", year)
+    year_dir = _year_dir(storage_root, company_id, year)
+    out_path = store_path(storage_root, company_id, year)
+    sources = _month_sources(year_dir)
+    signatures = {m: _signature(p) for m, p in sources.items()}
+    memo_key = tuple(sorted((m, tuple(s)) for m, s in signatures.items()))
+
+    if not rebuild:
+        with _MEMO_LOCK:
+            hit = _MEMO.get(out_path)
+        if hit and hit[0] == memo_key:
+            return hit[1]
+
+    cached = None if rebuild else _read_cached(out_path)
+    if cached:
+        store, old_sources = cached
+    else:
+        store, old_sources = BHEYearStore(year), {}
+
+    changed = False
+    for m in set(old_sources) - set(signatures):
+        store.clear_month(int(m))
+        changed = True
+    for m, path in sources.items():
+        if old_sources.get(m) == signatures[m]:
+            continue
+        with span("bhe_parse", source="bhe_store", file=path.name):
+            with storage_io.mapped(path) as buf:
+                scan = scan_bhe_html(buf)
+        store.clear_month(int(m))
+        for boleta in scan.boletas:
+            store.append(int(m), boleta)
+        changed = True
+
+    if persist and (changed or not out_path.exists()) and sources:
+        out_path.write_bytes(store.to_bytes(signatures))
+
+    with _MEMO_LOCK:
+        _MEMO[out_path] = (memo_key, store)
+    return store
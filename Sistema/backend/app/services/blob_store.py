@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+# Almacén direccionado por contenido (opcional) para los archivos crudos descargados.
+# Con SII_BLOB_STORE=1 cada CSV/HTML/XLS se guarda una sola vez en
+# <storage>/blobs/sha256/<aa>/<hash> y la ruta de siempre (companies/<id>/dcv/...) queda
+# como hardlink al blob: los lectores no cambian y una re-descarga idéntica (SII_DCV_FORCE,
+# 12_5_run_all_replace) no ocupa espacio nuevo.
+# Un blob sin otras referencias tiene st_nlink == 1; gc() borra esos blobs.
+# Los archivos enlazados nunca se sobrescriben en el lugar (eso modificaría el blob
+# compartido): write_bytes/write_text sueltan la referencia antes de escribir.
+BLOBS_DIRNAME = "blobs"
+HASH_NAME = "sha256"
+ENABLED = os.getenv("SII_BLOB_STORE", "").strip().lower() in ("1", "true", "yes", "y")
+
+# Fuentes crudas que se deduplican (por empresa) y archivos mutables que nunca se enlazan.
+RAW_SOURCES = ("dcv", "bhe", "f29_remanente")
+RAW_SUFFIXES = (".csv", ".html", ".htm", ".xls", ".xlsx", ".pdf", ".txt", ".gz", ".zst")
+_CHUNK = 1024 * 1024
+
+
+@dataclass
+class DedupeStats:
+    files: int = 0
+    linked: int = 0
+    new_blobs: int = 0
+    bytes_saved: int = 0
+
+
+@dataclass
+class GCStats:
+    blobs: int = 0
+    removed: int = 0
+    bytes_freed: int = 0
+
+
+# ----------------------------
+# Rutas
+# ----------------------------
+def storage_root_for(path: Path) -> Optional[Path]:
+    """<storage> a partir de una ruta companies/<id>/...; None si no está bajo companies/."""
+    for parent in Path(path).resolve().parents:
+        if parent.name == "companies":
+            return parent.parent
+    return None
+
+
+def blobs_dir(storage_root: Path) -> Path:
+    return Path(storage_root) / BLOBS_DIRNAME / HASH_NAME
+
+
+def blob_path(storage_root: Path, digest: str) -> Path:
+    return blobs_dir(storage_root) / digest[:2] / digest
+
+
+def hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_linked(path: Path) -> bool:
+    try:
+        return Path(path).stat().st_nlink > 1
+    except OSError:
+        return False
+
+
+# ----------------------------
+# Escritura
+# ----------------------------
+def _link_into(storage_root: Path, src: Path, dest: Path, digest: str) -> bool:
+    """
+    Deja `dest` como hardlink al blob `digest` (creándolo desde `src` si no existe).
+    Retorna True si el blob ya existía (contenido deduplicado).
+    """
+    blob = blob_path(storage_root, digest)
+    existed = blob.exists()
+    if not existed:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(src, blob)
+        except FileExistsError:
+            existed = True
+    if dest.exists() and os.path.samefile(blob, dest):
+        return existed  # el blob se creó desde dest: ya es una referencia
+    tmp = dest.with_name(f".{dest.name}.lnk")
+    if tmp.exists():
+        tmp.unlink()
+    os.link(blob, tmp)
+    os.replace(tmp, dest)
+    return existed
+
+
+def write_bytes(path: Path, data: bytes, storage_root: Optional[Path] = None) -> Path:
+    """
+    Reemplazo de Path.write_bytes para artefactos crudos. Sin SII_BLOB_STORE escribe igual
+    que antes; si la ruta era una referencia, primero se suelta para no tocar el blob.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    detach(path)
+    root = (storage_root or storage_root_for(path)) if ENABLED else None
+    if root is None:
+        path.write_bytes(data)
+        return path
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    tmp = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        _link_into(Path(root), tmp, path, hashlib.sha256(data).hexdigest())
+    except OSError:
+        path.write_bytes(data)  # sin soporte de hardlinks (otro volumen/FS): archivo normal
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
+
+
+def write_text(path: Path, text: str, encoding: str = "utf-8", storage_root: Optional[Path] = None) -> Path:
+    return write_bytes(path, text.encode(encoding), storage_root)
+
+
+def detach(path: Path) -> None:
+    """Quita la referencia antes de que un tercero (p.ej. Playwright save_as) escriba en `path`."""
+    path = Path(path)
+    if is_linked(path):
+        path.unlink()
+
+
+def adopt(path: Path, storage_root: Optional[Path] = None) -> bool:
+    """
+    Mueve un archivo ya escrito al almacén y lo deja como referencia.
+    Retorna True si su contenido ya estaba (espacio recuperado).
+    """
+    path = Path(path)
+    root = storage_root or storage_root_for(path)
+    if root is None or not path.is_file():
+        return False
+    digest = hash_file(path)
+    blob = blob_path(Path(root), digest)
+    try:
+        if blob.exists() and os.path.samefile(blob, path):
+            return False
+        return _link_into(Path(root), path, path, digest)
+    except OSError:
+        return False
+
+
+# ----------------------------
+# Recorrido / deduplicación de lo existente
+# ----------------------------
+def iter_raw_files(storage_root: Path, company_ids: Optional[Iterable[str]] = None) -> Iterator[Path]:
+    base = Path(storage_root) / "companies"
+    companies = [base / c for c in company_ids] if company_ids else sorted(p for p in base.iterdir() if p.is_dir())
+    for company_dir in companies:
+        for source in RAW_SOURCES:
+            src_dir = company_dir / source
+            if not src_dir.is_dir():
+                continue
+            for path in sorted(src_dir.rglob("*")):
+                if path.is_file() and path.suffix.lower() in RAW_SUFFIXES and not path.name.startswith("."):
+                    yield path
+
+
+def dedupe_tree(storage_root: Path, company_ids: Optional[Iterable[str]] = None) -> DedupeStats:
+    """Enlaza al almacén todos los archivos crudos existentes (idempotente)."""
+    stats = DedupeStats()
+    for path in iter_raw_files(storage_root, company_ids):
+        stats.files += 1
+        if is_linked(path):
+            continue
+        size = path.stat().st_size
+        if adopt(path, storage_root):
+            stats.bytes_saved += size
+            stats.linked += 1
+        elif is_linked(path):
+            stats.new_blobs += 1
+    return stats
+
+
+def gc(storage_root: Path, dry_run: bool = False) -> GCStats:
+    """Borra blobs sin referencias (st_nlink == 1: solo el propio blob)."""
+    stats = GCStats()
+    root = blobs_dir(storage_root)
+    if not root.exists():
+        return stats
+    for blob in root.glob("*/*"):
+        if not blob.is_file():
+            continue
+        stats.blobs += 1
+        st = blob.stat()
+        if st.st_nlink <= 1:
+            stats.removed += 1
+            stats.bytes_freed += st.st_size
+            if not dry_run:
+                blob.unlink()
+    if not dry_run:
+        for shard in root.iterdir():
+            if shard.is_dir() and not any(shard.iterdir()):
+                shard.rmdir()
+    return stats
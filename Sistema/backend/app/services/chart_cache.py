@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from backend.app.services.timing import span
+
+LOGGER = logging.getLogger(__name__)
+
+# Gráficos mensuales (enero..mes actual) de compras/ventas para sii_report_pdf.
+# Cacheados en companies/<id>/Resumen/charts/<seccion>_<año>_<MM>_<hash>.png (MM = último
+# mes de la serie): el hash cubre
+# la serie y el estilo, así que un reporte con los mismos números reutiliza el PNG.
+# Nada pesado se importa al cargar el módulo: reportlab.graphics (renderPM) se intenta
+# solo al renderizar y, si no tiene backend, se usa un escritor PNG en Python puro.
+CHARTS_DIRNAME = "charts"
+CHART_STYLE_VERSION = 1
+WIDTH, HEIGHT = 900, 400
+
+Color = Tuple[int, int, int]
+SECTION_COLORS: Dict[str, Color] = {
+    "compras": (0x5B, 0x2C, 0x83),  # PURPLE del reporte
+    "ventas": (0x1F, 0x77, 0xB4),
+}
+_WHITE: Color = (255, 255, 255)
+_AXIS: Color = (0x4B, 0x55, 0x63)
+_GRID: Color = (0xE5, 0xE7, 0xEB)
+
+# Dígitos 3x5 para rotular meses en el PNG puro (sin fuentes).
+_DIGITS = {
+    "0": ("111", "101", "101", "101", "111"),
+    "1": ("010", "110", "010", "010", "111"),
+    "2": ("111", "001", "111", "100", "111"),
+    "3": ("111", "001", "111", "001", "111"),
+    "4": ("101", "101", "111", "001", "001"),
+    "5": ("111", "100", "111", "001", "111"),
+    "6": ("111", "100", "111", "101", "111"),
+    "7": ("111", "001", "010", "010", "010"),
+    "8": ("111", "101", "111", "101", "111"),
+    "9": ("111", "101", "111", "001", "111"),
+}
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+def series_hash(section: str, year: int, values: Sequence[int], title: str = "") -> str:
+    payload = {
+        "v": CHART_STYLE_VERSION,
+        "section": section,
+        "year": int(year),
+        "values": [int(v or 0) for v in values],
+        "title": title,
+        "size": [WIDTH, HEIGHT],
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def charts_dir(storage_root: Path, company_id: str) -> Path:
+    return Path(storage_root) / "companies" / company_id / "Resumen" / CHARTS_DIRNAME
+
+
+def monthly_chart(
+    storage_root: Path,
+    company_id: str,
+    section: str,
+    year: int,
+    values: Sequence[int],
+    *,
+    title: str = "",
+    prune: bool = True,
+) -> Path:
+    """
+    PNG de barras mensuales (values[0] = enero). Si ya existe uno con la misma serie,
+    se devuelve sin renderizar. `prune` borra los PNG previos de la misma sección/año/mes.
+    """
+    values = [int(v or 0) for v in values][:12]
+    digest = series_hash(section, year, values, title)
+    out_dir = charts_dir(storage_root, company_id)
+    prefix = f"{section}_{int(year)}_{len(values):02d}"
+    out_path = out_dir / f"{prefix}_{digest}.png"
+    if out_path.exists():
+        with span("chart_render", section=section, cached=True):
+            return out_path
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    color = SECTION_COLORS.get(section, _AXIS)
+    with span("chart_render", section=section, cached=False, file=out_path.name) as rec:
+        tmp = out_path.with_suffix(".png.tmp")
+        if not _render_reportlab(tmp, values, color, title):
+            tmp.write_bytes(render_png_bars(values, color))
+        tmp.replace(out_path)
+        rec["bytes"] = out_path.stat().st_size
+
+    if prune:
+        for old in out_dir.glob(f"{prefix}_*.png"):
+            if old != out_path:
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+    return out_path
+
+
+# ----------------------------
+# Render con reportlab (opcional)
+# ----------------------------
+def _render_reportlab(out_path: Path, values: List[int], color: Color, title: str) -> bool:
+    """renderPM necesita un backend (rlPyCairo o _renderPM); sin él se retorna False."""
+    try:
+        from reportlab.graphics import renderPM
+        from reportlab.graphics.charts.barcharts import VerticalBarChart
+        from reportlab.graphics.shapes import Drawing, String
+        from reportlab.lib import colors
+    except Exception:
+        return False
+    try:
+        d = Drawing(WIDTH, HEIGHT)
+        chart = VerticalBarChart()
+        chart.x, chart.y = 70, 40
+        chart.width, chart.height = WIDTH - 100, HEIGHT - 90
+        chart.data = [values or [0]]
+        chart.categoryAxis.categoryNames = [f"{m:02d}" for m in range(1, len(values) + 1)] or ["01"]
+        chart.valueAxis.valueMin = min(0, min(values or [0]))
+        chart.valueAxis.labelTextFormat = lambda v: f"{int(v):,}".replace(",", ".")
+        chart.bars[0].fillColor = colors.Color(*(c / 255 for c in color))
+        chart.bars[0].strokeColor = None
+        d.add(chart)
+        if title:
+            d.add(String(WIDTH / 2, HEIGHT - 25, title, textAnchor="middle", fontName="Helvetica-Bold", fontSize=14))
+        renderPM.drawToFile(d, str(out_path), fmt="PNG")
+        return True
+    except Exception as exc:
+        LOGGER.debug("renderPM no disponible (%s); usando PNG puro", exc)
+        return False
+
+
+# ----------------------------
+# PNG puro (zlib + struct)
+# ----------------------------
+class _Canvas:
+    def __init__(self, width: int, height: int, bg: Color) -> None:
+        self.width, self.height = width, height
+        self.rows = [bytearray(bytes(bg) * width) for _ in range(height)]
+
+    def rect(self, x0: int, y0: int, x1: int, y1: int, color: Color) -> None:
+        """Rectángulo relleno; coordenadas con y hacia abajo, extremos inclusivos-exclusivos."""
+        x0, x1 = max(0, min(x0, x1)), min(self.width, max(x0, x1))
+        y0, y1 = max(0, min(y0, y1)), min(self.height, max(y0, y1))
+        if x0 >= x1:
+            return
+        span_bytes = bytes(color) * (x1 - x0)
+        for y in range(y0, y1):
+            self.rows[y][x0 * 3:x1 * 3] = span_bytes
+
+    def text_digits(self, x: int, y: int, text: str, color: Color, scale: int = 3) -> None:
+        for ch in text:
+            glyph = _DIGITS.get(ch)
+            if glyph:
+                for gy, line in enumerate(glyph):
+                    for gx, bit in enumerate(line):
+                        if bit == "1":
+                            self.rect(x + gx * scale, y + gy * scale, x + (gx + 1) * scale, y + (gy + 1) * scale, color)
+            x += 4 * scale
+
+    def to_png(self) -> bytes:
+        raw = b"".join(b"\x00" + bytes(row) for row in self.rows)
+
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+        ihdr = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def render_png_bars(values: Sequence[int], color: Color, *, width: int = WIDTH, height: int = HEIGHT) -> bytes:
+    """Barras mensuales con ejes, grilla y número de mes. Sin dependencias externas."""
+    c = _Canvas(width, height, _WHITE)
+    left, right, top, bottom = 40, width - 20, 20, height - 40
+    values = [int(v or 0) for v in values] or [0]
+    vmax, vmin = max(max(values), 0), min(min(values), 0)
+    rng = (vmax - vmin) or 1
+
+    def y_of(v: int) -> int:
+        return bottom - int(round((v - vmin) * (bottom - top) / rng))
+
+    for i in range(1, 5):
+        gy = top + (bottom - top) * i // 5
+        c.rect(left, gy, right, gy + 1, _GRID)
+    zero = y_of(0)
+
+    slots = 12
+    slot_w = (right - left) / slots
+    bar_w = max(2, int(slot_w * 0.6))
+    for i, v in enumerate(values[:slots]):
+        cx = int(left + slot_w * i + slot_w / 2)
+        c.rect(cx - bar_w // 2, min(zero, y_of(v)), cx + bar_w // 2, max(zero, y_of(v)) + 1, color)
+        label = str(i + 1)
+        c.text_digits(cx - (len(label) * 12 - 3) // 2, bottom + 12, label, _AXIS)
+
+    c.rect(left, top, left + 2, bottom + 1, _AXIS)
+    c.rect(left, zero, right, zero + 2, _AXIS)
+    return c.to_png()
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import fnmatch
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from backend.app.services import retention, storage_io
+from backend.app.services.remanente_index import RemanenteIndex, load_index
+
+# Acceso a storage/companies/<id> resuelto una sola vez por empresa.
+# - El id nuevo (<num>-<dv>) manda; state.json y profile.json caen al id legacy (solo
+#   dígitos) si no existen con el nuevo. Cada resolución se memoriza.
+# - Cada carpeta de mes se lista una vez (os.scandir) y los selectores (ventas, compras,
+#   boletas, bhe) emparejan contra esa lista en memoria con las mismas reglas que
+#   storage_io.glob: nombre lógico (sin .gz/.zst), gana la variante más reciente, último
+#   por nombre. prefetch_year() llena la lista de los 12 meses de una fuente recorriendo el
+#   directorio del año una vez.
+# La lista no se refresca sola: tras descargar archivos nuevos llamar invalidate().
+# Un año compactado por retention (<fuente>/<año>.zip) se restaura la primera vez que se
+# lee (retention.ensure_year).
+VENTAS_PATTERNS = ("RCV_VENTA_*_{tag}*.csv", "VENTAS_{tag}*.csv")
+COMPRAS_PATTERNS = ("RCV_COMPRA_*_{tag}*.csv", "COMPRAS_{tag}*.csv")
+BOLETAS_PATTERNS = ("VENTAS_BOLETAS_RESUMEN_*.csv",)
+BHE_PATTERNS = ("*.html", "*.htm", "*.xls", "*.xlsx")
+_CODEC_EXTS = tuple(storage_io.CODEC_SUFFIXES.values())
+
+
+@dataclass
+class CompanyStorage:
+    storage_root: Path
+    company_id: str
+    legacy_id: Optional[str] = None
+    _listings: Dict[str, Dict[str, str]] = field(default_factory=dict, repr=False)
+    _resolved: Dict[str, Path] = field(default_factory=dict, repr=False)
+    _profile: Optional[Dict[str, Any]] = field(default=None, repr=False)
+    _rem_index: Optional[RemanenteIndex] = field(default=None, repr=False)
+    _years: Set[Tuple[str, int]] = field(default_factory=set, repr=False)
+
+    def __post_init__(self) -> None:
+        self.storage_root = Path(self.storage_root)
+        self._dir_str = str(self.dir)
+
+    @classmethod
+    def for_rut(cls, storage_root: Path, rut: str) -> "CompanyStorage":
+        # sii_auth arrastra playwright; los servicios de reportes no lo necesitan.
+        from backend.app.services.sii_auth import company_id_from_rut, company_id_legacy_from_rut
+
+        company_id = company_id_from_rut(rut)
+        legacy = company_id_legacy_from_rut(rut)
+        return cls(Path(storage_root), company_id, legacy if legacy != company_id else None)
+
+    # ----------------------------
+    # Directorios
+    # ----------------------------
+    @property
+    def dir(self) -> Path:
+        return self.storage_root / "companies" / self.company_id
+
+    @property
+    def legacy_dir(self) -> Optional[Path]:
+        return self.storage_root / "companies" / self.legacy_id if self.legacy_id else None
+
+    def source_dir(self, source: str) -> Path:
+        return self.dir / source
+
+    def month_dir(self, source: str, year: int, month: int) -> Path:
+        return self.dir / source / str(int(year)) / f"{int(month):02d}"
+
+    def with_fallback(self, relative: str) -> Path:
+        """Ruta bajo el id nuevo o, si solo existe ahí, bajo el id legacy (memorizado)."""
+        cached = self._resolved.get(relative)
+        if cached is not None:
+            return cached
+        path = self.dir / relative
+        if not path.exists() and self.legacy_dir is not None:
+            legacy = self.legacy_dir / relative
+            if legacy.exists():
+                path = legacy
+        self._resolved[relative] = path
+        return path
+
+    # ----------------------------
+    # Sesión / perfil
+    # ----------------------------
+    def state_path(self) -> Path:
+        return self.with_fallback("playwright_state/state.json")
+
+    def has_state(self) -> bool:
+        return self.state_path().exists()
+
+    def profile_path(self) -> Path:
+        return self.with_fallback("profile.json")
+
+    def profile(self) -> Dict[str, Any]:
+        if self._profile is None:
+            path = self.profile_path()
+            data: Dict[str, Any] = {}
+            if path.exists():
+                try:
+                    data = json.loads(path.read_text(encoding="utf-8")) or {}
+                except Exception:
+                    data = {}
+            self._profile = data
+        return self._profile
+
+    def razon_social(self) -> str:
+        profile = self.profile()
+        return str(profile.get("razon_social") or profile.get("rut") or self.company_id)
+
+    # ----------------------------
+    # Listados cacheados
+    # ----------------------------
+    def _names(self, folder: str) -> Dict[str, str]:
+        """Nombre lógico -> ruta real (str) de una carpeta; una sola lectura del directorio."""
+        cached = self._listings.get(folder)
+        if cached is not None:
+            return cached
+        best: Dict[str, os.DirEntry] = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    name = entry.name
+                    if name.startswith(".") or not entry.is_file():
+                        continue
+                    root, ext = os.path.splitext(name)
+                    key = root if ext.lower() in _CODEC_EXTS else name
+                    cur = best.get(key)
+                    if cur is None or entry.stat().st_mtime_ns > cur.stat().st_mtime_ns:
+                        best[key] = entry
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        names = {k: best[k].path for k in sorted(best)}
+        self._listings[folder] = names
+        return names
+
+    def _ensure_year(self, source: str, year: int) -> None:
+        key = (source, int(year))
+        if key not in self._years:
+            if retention.ensure_year(self.storage_root, self.company_id, source, year):
+                self._listings.clear()
+            self._years.add(key)
+
+    def _month_key(self, source: str, year: int, month: int) -> str:
+        self._ensure_year(source, year)
+        return os.path.join(self._dir_str, source, str(int(year)), f"{int(month):02d}")
+
+    def listing(self, folder: Path) -> Dict[str, Path]:
+        return {k: Path(v) for k, v in self._names(str(folder)).items()}
+
+    def prefetch_year(self, source: str, year: int) -> None:
+        """Lista de una vez todas las carpetas de mes de <fuente>/<año>."""
+        self._ensure_year(source, year)
+        ydir = os.path.join(self._dir_str, source, str(int(year)))
+        try:
+            with os.scandir(ydir) as it:
+                months = [e.path for e in it if e.name.isdigit() and e.is_dir()]
+        except FileNotFoundError:
+            return
+        for mdir in months:
+            self._names(mdir)
+
+    def invalidate(self, folder: Optional[Path] = None) -> None:
+        if folder is None:
+            self._listings.clear()
+            self._resolved.clear()
+            self._profile = None
+            self._rem_index = None
+        else:
+            self._listings.pop(str(folder), None)
+
+    def _pick(self, folder: str, patterns: Iterable[str]) -> Optional[Path]:
+        names = self._names(folder)
+        for pattern in patterns:
+            matches = [k for k in names if fnmatch.fnmatchcase(k, pattern)]
+            if matches:
+                return Path(names[matches[-1]])
+        return None
+
+    def glob(self, folder: Path, pattern: str) -> List[Path]:
+        """Equivalente a storage_io.glob sobre la lista cacheada."""
+        return [Path(v) for k, v in self._names(str(folder)).items() if fnmatch.fnmatchcase(k, pattern)]
+
+    def pick_latest(self, folder: Path, patterns: Iterable[str]) -> Optional[Path]:
+        return self._pick(str(folder), patterns)
+
+    # ----------------------------
+    # Insumos por período
+    # ----------------------------
+    def _pick_dcv(self, patterns: Tuple[str, ...], year: int, month: int) -> Optional[Path]:
+        tag = f"{int(year)}{int(month):02d}"
+        return self._pick(self._month_key("dcv", year, month), [p.format(tag=tag) for p in patterns])
+
+    def ventas(self, year: int, month: int) -> Optional[Path]:
+        return self._pick_dcv(VENTAS_PATTERNS, year, month)
+
+    def compras(self, year: int, month: int) -> Optional[Path]:
+        return self._pick_dcv(COMPRAS_PATTERNS, year, month)
+
+    def boletas(self, year: int, month: int) -> Optional[Path]:
+        return self._pick_dcv(BOLETAS_PATTERNS, year, month)
+
+    def bhe(self, year: int, month: int) -> Optional[Path]:
+        return self._pick(self._month_key("bhe", year, month), BHE_PATTERNS)
+
+    def remanente_index(self) -> RemanenteIndex:
+        if self._rem_index is None:
+            self._rem_index = load_index(self.storage_root, self.company_id)
+        return self._rem_index
+
+    def remanente(self, year: int, month: int) -> Optional[int]:
+        """Código 77 del período (desde el índice de remanente)."""
+        return self.remanente_index().codigo_77(year, month)
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import html
+import json
+import re
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backend.app.services import storage_io
+
+# Lectura local del Formulario Compacto F29 (HTML del #printingFrame):
+# - parse_compacto(): todos los códigos/montos/glosas del formulario en una pasada.
+# - Store por período declarado en f29_remanente/forms/F29_<AAAAMM>.bin (binario compacto)
+#   para conciliaciones (IVA, PPM, retenciones, impuesto único) sin navegador.
+# - Caché de la cadena IVA en f29_remanente/f29_cache.json (modo --chain).
+
+# Códigos de la cadena IVA que se guardan en la caché.
+IVA_CHAIN_CODES = {
+    77: "Remanente de crédito fiscal para el período siguiente",
+    504: "Remanente crédito fiscal mes anterior",
+    538: "Total débitos",
+    537: "Total créditos",
+    89: "IVA determinado",
+    62: "PPM neto determinado",
+    151: "Retención impuesto segunda categoría",
+    48: "Impuesto único segunda categoría",
+    91: "Total a pagar dentro del plazo legal",
+}
+CACHE_FILENAME = "f29_cache.json"
+FORMS_DIRNAME = "forms"
+FORM_MAGIC = b"F29C1\n"
+_NONE_AMOUNT = -(2**63)  # centinela para "código presente sin monto"
+
+_TD_RE = re.compile(r"<td\b(?P<attrs>[^>]*)>(?P<body>.*?)</td\s*>", re.IGNORECASE | re.DOTALL)
+_TR_RE = re.compile(r"<tr\b[^>]*>(?P<body>.*?)</tr\s*>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_CODE_RE = re.compile(r"^\d{1,4}$")
+_AMOUNT_RE = re.compile(r"^-?[\d\.\,]+$")
+_FOLIO_RE = re.compile(r"folio\D{0,20}(\d{6,})", re.IGNORECASE)
+_COMPACTO_NAME_RE = re.compile(r"F29_COMPACTO_(\d{4})(\d{2})", re.IGNORECASE)
+
+
+@dataclass
+class F29Form:
+    folio: Optional[str] = None
+    codes: Dict[int, Optional[int]] = field(default_factory=dict)
+    glosas: Dict[int, str] = field(default_factory=dict)
+
+    def get(self, code: int, default: Optional[int] = None) -> Optional[int]:
+        value = self.codes.get(int(code))
+        return default if value is None else value
+
+    def subset(self, codes: Iterable[int]) -> Dict[int, Optional[int]]:
+        return {int(c): self.codes.get(int(c)) for c in codes if int(c) in self.codes}
+
+
+# ----------------------------
+# Parser
+# ----------------------------
+def _text(raw: str) -> str:
+    return html.unescape(_TAG_RE.sub(" ", raw).replace("&nbsp;", " ")).strip()
+
+
+def _amount(text: str) -> Optional[int]:
+    digits = re.sub(r"[^\d]", "", text)
+    if not digits:
+        return None
+    return -int(digits) if text.startswith("-") else int(digits)
+
+
+def parse_compacto(text: str) -> F29Form:
+    """
+    Formulario completo desde el HTML del compacto. Cada celda 'celda-codigo' toma el
+    primer monto que la sigue antes del próximo código (una fila puede traer varios
+    pares); la glosa es el último texto no numérico visto antes del código.
+    """
+    form = F29Form()
+    pending: Optional[int] = None
+    last_label = ""
+    for m in _TD_RE.finditer(text or ""):
+        body = _text(m.group("body"))
+        if "celda-codigo" in m.group("attrs").lower() and _CODE_RE.match(body):
+            pending = int(body)
+            form.codes.setdefault(pending, None)
+            if last_label and pending not in form.glosas:
+                form.glosas[pending] = last_label
+            continue
+        if not body:
+            continue
+        if _AMOUNT_RE.match(body):
+            if pending is not None:
+                if form.codes.get(pending) is None:
+                    form.codes[pending] = _amount(body)
+                pending = None
+        else:
+            last_label = re.sub(r"\s+", " ", body)
+    if form.codes.get(77) is None:
+        value = _row_amount_for_code(text or "", 77)
+        if value is not None:
+            form.codes[77] = value
+    folio = _FOLIO_RE.search(_TAG_RE.sub(" ", text or ""))
+    form.folio = folio.group(1) if folio else None
+    return form
+
+
+def _row_amount_for_code(text: str, code: int) -> Optional[int]:
+    """
+    Respaldo para layouts sin 'celda-codigo': cualquier <td> con el código, y el monto de
+    su fila en 'tabla_td_fixed_b_right' o, si no hay, en la última celda (como el scraper).
+    """
+    for row in _TR_RE.finditer(text):
+        cells = [(m.group("attrs").lower(), _text(m.group("body"))) for m in _TD_RE.finditer(row.group("body"))]
+        if not any(body == str(code) for _attrs, body in cells):
+            continue
+        fixed = [body for attrs, body in cells if "tabla_td_fixed_b_right" in attrs]
+        raw = fixed[0] if fixed else cells[-1][1]
+        if raw and raw != str(code):
+            return _amount(raw)
+    return None
+
+
+def parse_compacto_codes(text: str) -> Dict[int, Optional[int]]:
+    return parse_compacto(text).codes
+
+
+# ----------------------------
+# Store de formularios por período (binario compacto)
+# ----------------------------
+def period_key(year: int, month: int) -> str:
+    return f"{int(year)}{int(month):02d}"
+
+
+def forms_dir(storage_dir: Path, company_id: str) -> Path:
+    return Path(storage_dir) / "companies" / company_id / "f29_remanente" / FORMS_DIRNAME
+
+
+def form_path(storage_dir: Path, company_id: str, year: int, month: int) -> Path:
+    return forms_dir(storage_dir, company_id) / f"F29_{period_key(year, month)}.bin"
+
+
+def form_to_bytes(form: F29Form, source: Optional[Dict] = None) -> bytes:
+    """Header JSON (folio, glosas, origen) + columnas array('H') códigos / array('q') montos."""
+    items = sorted(form.codes.items())
+    codes = array("H", (c for c, _v in items))
+    values = array("q", (_NONE_AMOUNT if v is None else v for _c, v in items))
+    header = {
+        "byteorder": sys.byteorder,
+        "rows": len(items),
+        "folio": form.folio,
+        "glosas": {str(c): g for c, g in sorted(form.glosas.items())},
+        "source": source or {},
+    }
+    head = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"".join([FORM_MAGIC, struct.pack("<I", len(head)), head, codes.tobytes(), values.tobytes()])
+
+
+def form_from_bytes(data: bytes) -> Tuple[F29Form, Dict]:
+    if not data.startswith(FORM_MAGIC):
+        raise ValueError("Archivo de formulario F29 inválido")
+    pos = len(FORM_MAGIC)
+    (head_len,) = struct.unpack_from("<I", data, pos)
+    pos += 4
+    header = json.loads(data[pos:pos + head_len].decode("utf-8"))
+    pos += head_len
+    rows = int(header["rows"])
+    codes, values = array("H"), array("q")
+    codes.frombytes(data[pos:pos + codes.itemsize * rows])
+    pos += codes.itemsize * rows
+    values.frombytes(data[pos:pos + values.itemsize * rows])
+    if header["byteorder"] != sys.byteorder:
+        codes.byteswap()
+        values.byteswap()
+    form = F29Form(
+        folio=header.get("folio"),
+        codes={c: (None if v == _NONE_AMOUNT else v) for c, v in zip(codes, values)},
+        glosas={int(c): g for c, g in (header.get("glosas") or {}).items()},
+    )
+    return form, header.get("source") or {}
+
+
+def save_form(
+    storage_dir: Path,
+    company_id: str,
+    year: int,
+    month: int,
+    form: F29Form,
+    *,
+    html_path: Optional[Path] = None,
+) -> Path:
+    source: Dict = {}
+    if html_path and Path(html_path).exists():
+        st = Path(html_path).stat()
+        source = {"html": str(html_path), "sig": [st.st_size, st.st_mtime_ns]}
+    out = form_path(storage_dir, company_id, year, month)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(form_to_bytes(form, source))
+    return out
+
+
+def load_form(storage_dir: Path, company_id: str, year: int, month: int) -> Optional[F29Form]:
+    path = form_path(storage_dir, company_id, year, month)
+    if not path.exists():
+        return None
+    try:
+        return form_from_bytes(path.read_bytes())[0]
+    except Exception:
+        return None
+
+
+def read_codes(storage_dir: Path, company_id: str, year: int, month: int, codes: Iterable[int]) -> Dict[int, Optional[int]]:
+    """Códigos pedidos del F29 declarado para el período (vacío si no hay formulario)."""
+    form = load_form(storage_dir, company_id, year, month)
+    return form.subset(codes) if form else {}
+
+
+def sync_forms(storage_dir: Path, company_id: str) -> List[Path]:
+    """
+    Parsea los F29_COMPACTO_*.html guardados que no tengan formulario en el store
+    (o cuyo HTML cambió). Retorna los .bin escritos.
+    """
+    root = Path(storage_dir) / "companies" / company_id / "f29_remanente"
+    written: List[Path] = []
+    if not root.exists():
+        return written
+    for html_path in sorted(root.glob("*/*/F29_COMPACTO_*.htm*")):
+        m = _COMPACTO_NAME_RE.search(html_path.name)
+        if not m:
+            continue
+        year, month = int(m.group(1)), int(m.group(2))
+        st = html_path.stat()
+        out = form_path(storage_dir, company_id, year, month)
+        if out.exists():
+            try:
+                _form, source = form_from_bytes(out.read_bytes())
+                if source.get("sig") == [st.st_size, st.st_mtime_ns]:
+                    continue
+            except Exception:
+                pass
+        form = parse_compacto(storage_io.read_text(html_path, errors="ignore"))
+        written.append(save_form(storage_dir, company_id, year, month, form, html_path=html_path))
+    return written
+
+
+# ----------------------------
+# Caché por período declarado
+# ----------------------------
+def cache_path(storage_dir: Path, company_id: str) -> Path:
+    return Path(storage_dir) / "companies" / company_id / "f29_remanente" / CACHE_FILENAME
+
+
+def load_cache(storage_dir: Path, company_id: str) -> Dict:
+    path = cache_path(storage_dir, company_id)
+    if not path.exists():
+        return {"periods": {}}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {"periods": {}}
+
+
+def save_cache(storage_dir: Path, company_id: str, cache: Dict) -> None:
+    path = cache_path(storage_dir, company_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(cache, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def put_period(cache: Dict, year: int, month: int, *, folio: Optional[str], codes: Dict[int, Optional[int]], html_path: Optional[Path]) -> Dict:
+    entry = {
+        "folio": folio,
+        "codes": {str(c): v for c, v in sorted(codes.items()) if c in IVA_CHAIN_CODES},
+        "html": str(html_path) if html_path else None,
+        "scraped_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    cache.setdefault("periods", {})[period_key(year, month)] = entry
+    return entry
+
+
+def drop_period(cache: Dict, year: int, month: int) -> None:
+    cache.get("periods", {}).pop(period_key(year, month), None)
+
+
+def get_period(cache: Dict, year: int, month: int) -> Optional[Dict]:
+    return cache.get("periods", {}).get(period_key(year, month))
+
+
+def _prev_period(year: int, month: int) -> Tuple[int, int]:
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def derive_remanente(cache: Dict, target_year: int, target_month: int) -> Tuple[Optional[int], Optional[str], Optional[str]]:
+    """
+    Remanente para el mes objetivo M desde la caché: código 77 del F29 de M-1 y,
+    si ese F29 no lo trae, código 504 del F29 de M (remanente del mes anterior).
+    Retorna (monto, folio, origen) con origen "77@AAAAMM" / "504@AAAAMM" o None.
+    """
+    py, pm = _prev_period(target_year, target_month)
+    prev = get_period(cache, py, pm)
+    if prev and prev.get("codes", {}).get("77") is not None:
+        return prev["codes"]["77"], prev.get("folio"), f"77@{period_key(py, pm)}"
+    cur = get_period(cache, target_year, target_month)
+    if cur and cur.get("codes", {}).get("504") is not None:
+        return cur["codes"]["504"], cur.get("folio"), f"504@{period_key(target_year, target_month)}"
+    return None, prev.get("folio") if prev else None, None
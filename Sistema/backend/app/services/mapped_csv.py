@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import csv
+import mmap
+from operator import itemgetter
+from typing import Callable, Iterator, List, Optional, Sequence, Union
+
+# CSV del SII leído directo sobre bytes (storage_io.mapped): el header se decodifica
+# una vez, el cuerpo se recorre en bloques acotados (CHUNK_BYTES) partidos en líneas y
+# campos con split (en C) y de cada fila solo se decodifican los campos pedidos; nunca
+# se materializa el archivo completo como texto. Semántica "loose" de siempre: filas más
+# cortas que el header se completan con "", más largas se recortan (columna vacía final
+# del SII). Las líneas con comillas (poco comunes en el RCV) pasan por csv.reader.
+
+BOM = b"\xef\xbb\xbf"
+CHUNK_BYTES = 1 << 22
+Buffer = Union[bytes, mmap.mmap]
+
+
+class MappedCsv:
+    def __init__(self, buf: Buffer, encoding: str = "utf-8") -> None:
+        self.buf = buf
+        self.encoding = encoding
+        self.size = len(buf)
+        start = len(BOM) if buf[: len(BOM)] == BOM else 0
+        end = self._line_end(start)
+        first = buf[start:end]
+        # Mismo criterio de delimitador que los lectores de texto: ';' si aparece, si no ','.
+        self.sniffed = b";" in first or b"," in first
+        self.delimiter = b";" if b";" in first else b","
+        self._header_line = first.rstrip(b"\r")
+        self.header: List[str] = self._fields(self._header_line) if self._header_line else []
+        self.body_start = min(end + 1, self.size)
+
+    def _line_end(self, pos: int) -> int:
+        nl = self.buf.find(b"\n", pos)
+        return self.size if nl < 0 else nl
+
+    def _fields(self, line: bytes) -> List[str]:
+        if b'"' in line:
+            text = line.decode(self.encoding, "ignore")
+            return next(csv.reader([text], delimiter=self.delimiter.decode()), [])
+        return [f.decode(self.encoding, "ignore") for f in line.split(self.delimiter)]
+
+    # ----------------------------
+    # Recorrido
+    # ----------------------------
+    def _chunks(self) -> Iterator[bytes]:
+        """
+        Bloques de ~CHUNK_BYTES que terminan en fin de línea (sin el '\\n' final). Si un
+        bloque deja comillas abiertas se extiende hasta cerrarlas: ningún registro queda
+        partido entre dos bloques.
+        """
+        buf, pos, size = self.buf, self.body_start, self.size
+        while pos < size:
+            end = min(pos + CHUNK_BYTES, size)
+            if end < size:
+                nl = buf.rfind(b"\n", pos, end)
+                end = nl if nl >= 0 else self._line_end(end)
+            chunk = buf[pos:end]
+            while end < size and chunk.count(b'"') % 2:
+                nxt = self._line_end(end + 1)
+                chunk += buf[end:nxt]
+                end = nxt
+            yield chunk
+            pos = end + 1
+
+    def lines(self) -> Iterator[bytes]:
+        """Líneas crudas del cuerpo (sin el header), con el '\\r' final si lo hubiera."""
+        for chunk in self._chunks():
+            yield from chunk.split(b"\n")
+
+    def needs_loose(self, sample_lines: int = 200) -> bool:
+        """¿Alguna de las primeras filas trae más campos que el header?"""
+        if not self._header_line or not self.sniffed:
+            return False
+        width = self._header_line.count(self.delimiter)
+        for i, line in enumerate(self.lines()):
+            if i >= sample_lines:
+                break
+            if line.count(self.delimiter) > width:
+                return True
+        return False
+
+    def columns(self, keep: Callable[[str], bool]) -> List[int]:
+        """Índices del header que cumplen `keep` (primera aparición de cada nombre)."""
+        seen = set()
+        out: List[int] = []
+        for i, name in enumerate(self.header):
+            if name in seen:
+                continue
+            seen.add(name)
+            if keep(name):
+                out.append(i)
+        return out
+
+    def rows(self, columns: Optional[Sequence[int]] = None, *, skip_short: bool = False) -> Iterator[List[str]]:
+        """
+        Filas no vacías. Con `columns` se entregan solo esos campos (en ese orden) y el
+        resto de la línea no se decodifica; sin `columns`, todos al ancho del header.
+        Con `skip_short` se omiten (en vez de completarse) las filas que no alcanzan la
+        última columna pedida.
+        """
+        width = len(self.header)
+        wanted = list(range(width)) if columns is None else list(columns)
+        if not wanted:
+            return
+        last = max(wanted)
+        pick = itemgetter(*wanted) if len(wanted) > 1 else (lambda parts: (parts[wanted[0]],))
+        delim, enc = self.delimiter, self.encoding
+        for chunk in self._chunks():
+            quoted, crlf = b'"' in chunk, b"\r" in chunk
+            lines = iter(chunk.split(b"\n"))
+            for line in lines:
+                if crlf and line.endswith(b"\r"):
+                    line = line[:-1]
+                if not line:
+                    continue
+                if quoted and b'"' in line:
+                    # Un campo entre comillas puede cruzar saltos de línea.
+                    while line.count(b'"') % 2:
+                        nxt = next(lines, None)
+                        if nxt is None:
+                            break
+                        line += b"\n" + nxt.rstrip(b"\r")
+                    fields = self._fields(line)
+                    n = len(fields)
+                    if n <= last and skip_short:
+                        continue
+                    yield [fields[i] if i < n else "" for i in wanted]
+                    continue
+                parts = line.split(delim, last + 1)
+                if len(parts) > last:
+                    yield [v.decode(enc, "ignore") for v in pick(parts)]
+                elif not skip_short:
+                    n = len(parts)
+                    yield [parts[i].decode(enc, "ignore") if i < n else "" for i in wanted]
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Registro opcional de métricas (formato texto Prometheus).
+# Deshabilitado por defecto: cada inc()/observe() retorna apenas revisa el flag.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_ENABLED = False
+_SERVER: Optional[ThreadingHTTPServer] = None
+
+LabelKey = Tuple[str, ...]
+
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+
+def enable() -> None:
+    global _ENABLED
+    _ENABLED = True
+
+
+def disable() -> None:
+    global _ENABLED
+    _ENABLED = False
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# ----------------------------
+# Tipos de métrica
+# ----------------------------
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not _ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        if not _ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not _ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # por label: [conteos por bucket..., suma, total]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not _ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines: List[str] = []
+        for key, state in items:
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_number(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_number(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_number(state[-1])}")
+        return lines
+
+
+# ----------------------------
+# Registro
+# ----------------------------
+REGISTRY: List[_Metric] = []
+
+
+def _register(metric: _Metric) -> _Metric:
+    REGISTRY.append(metric)
+    return metric
+
+
+DOWNLOADS = _register(Counter("sii_downloads_total", "Artefactos descargados/guardados.", ("source", "outcome")))
+BYTES_FETCHED = _register(Counter("sii_bytes_fetched_total", "Bytes obtenidos desde el SII.", ("source",)))
+WAIT_SECONDS = _register(
+    Histogram("sii_playwright_wait_seconds", "Tiempo esperando al SII vía Playwright.", ("source", "stage", "outcome"))
+)
+PARSE_SECONDS = _register(
+    Histogram("sii_parse_seconds", "Tiempo de parseo/agregación local.", ("source", "stage", "outcome"))
+)
+PARSE_FALLBACKS = _register(
+    Counter("sii_parse_fallbacks_total", "Parseos que cayeron a la ruta lenta (ej: pd.read_html).", ("source", "kind"))
+)
+PDF_RENDERS = _register(Counter("sii_pdf_renders_total", "PDFs renderizados.", ("source", "outcome")))
+PDF_RENDER_SECONDS = _register(Histogram("sii_pdf_render_seconds", "Duración del render PDF.", ("source", "outcome")))
+LOGIN_REFRESHES = _register(Counter("sii_login_refreshes_total", "Logins/renovaciones de sesión.", ("source", "outcome")))
+QUEUE_DEPTH = _register(Gauge("sii_queue_depth", "Meses pendientes por procesar.", ("source",)))
+
+WAIT_STAGES = frozenset({"login", "navigation", "consult", "anchor_wait"})
+PARSE_STAGES = frozenset({"csv_parse", "aggregation", "bhe_parse", "remanente_extract"})
+
+
+def observe_stage(stage: str, duration_s: float, outcome: str, source: Optional[str], nbytes: Optional[int]) -> None:
+    """
+    Traduce un span de timing a métricas. Llamado desde timing.span() solo si está habilitado.
+    """
+    if not _ENABLED:
+        return
+    source = source or "local"
+    if stage in WAIT_STAGES:
+        WAIT_SECONDS.observe(duration_s, source=source, stage=stage, outcome=outcome)
+        if stage == "login":
+            LOGIN_REFRESHES.inc(source=source, outcome=outcome)
+    elif stage in PARSE_STAGES:
+        PARSE_SECONDS.observe(duration_s, source=source, stage=stage, outcome=outcome)
+    elif stage == "pdf_render":
+        PDF_RENDERS.inc(source=source, outcome=outcome)
+        PDF_RENDER_SECONDS.observe(duration_s, source=source, outcome=outcome)
+    elif stage == "file_write":
+        DOWNLOADS.inc(source=source, outcome=outcome)
+        if nbytes and outcome == "ok":
+            BYTES_FETCHED.inc(float(nbytes), source=source)
+
+
+def render_text() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------
+# Endpoint HTTP local
+# ----------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Silencio: no ensuciar el stdout de los scripts.
+        return
+
+
+def start_metrics_server(port: int, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Habilita el registro y expone /metrics en addr:port (hilo daemon).
+    """
+    global _SERVER
+    enable()
+    if _SERVER is not None:
+        return _SERVER
+    server = ThreadingHTTPServer((addr, int(port)), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="sii-metrics", daemon=True)
+    thread.start()
+    _SERVER = server
+    return server
+
+
+def stop_metrics_server() -> None:
+    global _SERVER
+    if _SERVER is not None:
+        _SERVER.shutdown()
+        _SERVER.server_close()
+        _SERVER = None
+    disable()
+
+
+def start_from_env() -> Optional[ThreadingHTTPServer]:
+    """
+    Opt-in por entorno:
+      SII_METRICS_PORT=9108        -> expone /metrics en 127.0.0.1:9108
+      SII_METRICS_ADDR=0.0.0.0     -> (opcional) interfaz de escucha
+    """
+    port = os.getenv("SII_METRICS_PORT", "").strip()
+    if not port:
+        return None
+    addr = os.getenv("SII_METRICS_ADDR", "127.0.0.1").strip() or "127.0.0.1"
+    return start_metrics_server(int(port), addr)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import csv
+import io
 import json
 import logging
 import os
@@ -9,7 +9,7 @@ import unicodedata
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
 
 import pandas as pd
 from reportlab.lib import colors
@@ -18,6 +18,12 @@ from reportlab.lib.units import mm
 from reportlab.pdfgen import canvas
 from reportlab.platypus import Table, TableStyle
 
+from backend.app.services import metrics, storage_io
+from backend.app.services.bhe_html import VIGENTE_STATES, BHEScan, has_table, scan_bhe_html
+from backend.app.services.mapped_csv import MappedCsv
+from backend.app.services.remanente_index import extract_from_file as extract_remanente_file
+from backend.app.services.timing import span, timed
+
 LOGGER = logging.getLogger(__name__)
 SILENCE_INCONSISTENCIES = os.getenv("SII_PDF_SILENCE_INCONSISTENCIES", "1").strip().lower() in (
     "1",
@@ -152,6 +158,12 @@ def _alias_map() -> Dict[str, Tuple[str, ...]]:
             "fechadocumento",
             "fecha",
         ),
+        "rut": (
+            "rutproveedor",
+            "rutcliente",
+            "rut",
+        ),
+        "razon_social": ("razonsocial",),
     }
 
 
@@ -194,25 +206,32 @@ def _sign_for_code(code: int) -> int:
     return 1
 
 
-def _read_dataframe(path: Path) -> pd.DataFrame:
+def _read_dataframe(path: Path, keep: Optional[Callable[[str], bool]] = None) -> pd.DataFrame:
+    """
+    Con `keep` (CSV) solo se materializan las columnas cuyo nombre lo cumple, leídas
+    sobre el archivo mapeado; el resto de cada fila no se decodifica.
+    """
     if not path.exists():
         raise FileNotFoundError(f"No existe archivo: {path}")
-    suffix = path.suffix.lower()
-    if suffix in (".csv", ".txt"):
-        # Algunos CSV del SII traen una columna extra vacía al final de cada fila.
-        # Pandas desplaza los datos cuando el número de campos no coincide.
-        if _csv_needs_loose_read(path):
-            df = _read_csv_loose(path)
-        else:
-            try:
-                df = pd.read_csv(path, dtype=str, sep=None, engine="python")
-            except Exception:
+    suffix = storage_io.logical_suffix(path)
+    with span("csv_parse", file=path.name) as rec:
+        rec["bytes"] = path.stat().st_size
+        if suffix in (".csv", ".txt"):
+            # Algunos CSV del SII traen una columna extra vacía al final de cada fila.
+            # Pandas desplaza los datos cuando el número de campos no coincide.
+            if keep is not None or _csv_needs_loose_read(path):
+                df = _read_csv_loose(path, keep)
+            else:
                 try:
-                    df = pd.read_csv(path, dtype=str, sep=";")
+                    df = pd.read_csv(path, dtype=str, sep=None, engine="python")
                 except Exception:
-                    df = pd.read_csv(path, dtype=str, sep=",")
-    else:
-        df = pd.read_excel(path, dtype=str)
+                    try:
+                        df = pd.read_csv(path, dtype=str, sep=";")
+                    except Exception:
+                        df = pd.read_csv(path, dtype=str, sep=",")
+        else:
+            df = pd.read_excel(storage_io.open_binary(path) if storage_io.codec_of(path) else path, dtype=str)
+        rec["rows"] = len(df)
     df.columns = [str(c).strip() for c in df.columns]
     return df
 
@@ -222,45 +241,22 @@ def _csv_needs_loose_read(path: Path, sample_lines: int = 200) -> bool:
     Detecta filas con más campos que el header (por delimitadores extra al final).
     """
     try:
-        with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
-            first_line = f.readline()
-            if not first_line:
-                return False
-            delim = ";" if ";" in first_line else ("," if "," in first_line else None)
-            if not delim:
-                return False
-            header = first_line.rstrip("\n").split(delim)
-            header_len = len(header)
-            if header_len == 0:
-                return False
-            for i, line in enumerate(f):
-                if i >= sample_lines:
-                    break
-                row_len = len(line.rstrip("\n").split(delim))
-                if row_len > header_len:
-                    return True
-        return False
+        with storage_io.mapped(path) as buf:
+            return MappedCsv(buf).needs_loose(sample_lines)
     except Exception:
         return False
 
 
-def _read_csv_loose(path: Path) -> pd.DataFrame:
+def _read_csv_loose(path: Path, keep: Optional[Callable[[str], bool]] = None) -> pd.DataFrame:
     """
     Lee CSV recortando/paddeando filas al largo del header.
     """
-    with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
-        first_line = f.readline()
-        delim = ";" if ";" in first_line else ("," if "," in first_line else ",")
-        header = first_line.rstrip("\n").split(delim)
-        rows: list[list[str]] = []
-        reader = csv.reader(f, delimiter=delim)
-        for row in reader:
-            if len(row) < len(header):
-                row = row + [""] * (len(header) - len(row))
-            elif len(row) > len(header):
-                row = row[: len(header)]
-            rows.append(row)
-    return pd.DataFrame(rows, columns=header)
+    with storage_io.mapped(path) as buf:
+        reader = MappedCsv(buf)
+        columns = reader.columns(keep) if keep is not None else list(range(len(reader.header)))
+        names = [reader.header[i] for i in columns]
+        rows = list(reader.rows(columns))
+    return pd.DataFrame(rows, columns=names)
 
 
 def _resolve_columns(df: pd.DataFrame) -> Dict[str, str]:
@@ -286,13 +282,44 @@ def _parse_period_filter(df: pd.DataFrame, col: str, year: int, month: int) -> p
     return df.loc[mask].copy()
 
 
-def _summarize_dcv(
-    path: Path,
-    year: Optional[int] = None,
-    month: Optional[int] = None,
-    include_exento_in_neto: bool = False,
-) -> Tuple[Dict[int, Dict[str, Optional[int]]], Dict[str, Optional[int]]]:
-    df = _read_dataframe(path)
+@dataclass
+class DcvRow:
+    """Fila normalizada de un RCV: montos con signo del tipo de documento (NC restan)."""
+
+    code: int
+    neto: Optional[int]
+    iva: Optional[int]
+    total: Optional[int]
+    exento: Optional[int]
+    fecha: Optional[int] = None  # AAAAMMDD
+    rut: Optional[str] = None
+    razon_social: Optional[str] = None
+
+
+def _column_values(df: pd.DataFrame, col: Optional[str]) -> list:
+    return df[col].tolist() if col else [None] * len(df)
+
+
+def _fecha_values(df: pd.DataFrame, col: Optional[str]) -> list:
+    if not col:
+        return [None] * len(df)
+    dates = pd.to_datetime(df[col], dayfirst=True, errors="coerce")
+    return [None if pd.isna(d) else d.year * 10000 + d.month * 100 + d.day for d in dates]
+
+
+_DCV_COLUMNS = frozenset(name for names in _alias_map().values() for name in names)
+
+
+def _is_dcv_column(name: str) -> bool:
+    return _normalize_col(name) in _DCV_COLUMNS
+
+
+def iter_dcv_rows(path: Path, year: Optional[int] = None, month: Optional[int] = None) -> Iterator[DcvRow]:
+    """
+    Filas normalizadas de un RCV (CSV/XLS). Si el nombre no trae AAAAMM del período se
+    filtra por fecha de emisión, igual que el resumen mensual.
+    """
+    df = _read_dataframe(path, keep=_is_dcv_column)
     cols = _resolve_columns(df)
     missing = [k for k in ("codigo_tipo_documento", "neto") if k not in cols]
     if missing:
@@ -305,24 +332,41 @@ def _summarize_dcv(
         if period_tag not in path.name:
             df = _parse_period_filter(df, cols["fecha_emision"], year, month)
 
-    code_col = cols["codigo_tipo_documento"]
-    neto_col = cols.get("neto")
-    iva_col = cols.get("iva")
-    total_col = cols.get("total")
-    exento_col = cols.get("exento")
-
-    summary: Dict[int, Dict[str, Optional[int]]] = {}
-    for _, row in df.iterrows():
-        code_raw = row.get(code_col)
+    columns = zip(
+        _column_values(df, cols["codigo_tipo_documento"]),
+        _column_values(df, cols.get("neto")),
+        _column_values(df, cols.get("iva")),
+        _column_values(df, cols.get("total")),
+        _column_values(df, cols.get("exento")),
+        _fecha_values(df, cols.get("fecha_emision")),
+        _column_values(df, cols.get("rut")),
+        _column_values(df, cols.get("razon_social")),
+    )
+    for code_raw, neto, iva, total, exento, fecha, rut, razon in columns:
         try:
             code = int(re.sub(r"[^\d]", "", str(code_raw)))
         except Exception:
             continue
         sign = _sign_for_code(code)
-        neto = _apply_sign(_to_int_money(row.get(neto_col)), sign) if neto_col else None
-        iva = _apply_sign(_to_int_money(row.get(iva_col)), sign) if iva_col else None
-        total = _apply_sign(_to_int_money(row.get(total_col)), sign) if total_col else None
-        exento = _apply_sign(_to_int_money(row.get(exento_col)), sign) if exento_col else None
+        yield DcvRow(
+            code=code,
+            neto=_apply_sign(_to_int_money(neto), sign),
+            iva=_apply_sign(_to_int_money(iva), sign),
+            total=_apply_sign(_to_int_money(total), sign),
+            exento=_apply_sign(_to_int_money(exento), sign),
+            fecha=fecha,
+            rut=str(rut).strip().upper() if isinstance(rut, str) and rut.strip() else None,
+            razon_social=str(razon).strip() if isinstance(razon, str) and razon.strip() else None,
+        )
+
+
+def summarize_dcv_rows(
+    rows: Iterable[DcvRow], include_exento_in_neto: bool = False, label: str = ""
+) -> Tuple[Dict[int, Dict[str, Optional[int]]], Dict[str, Optional[int]]]:
+    """Totales por código de documento y generales a partir de filas normalizadas."""
+    summary: Dict[int, Dict[str, Optional[int]]] = {}
+    for row in rows:
+        neto, iva, total, exento = row.neto, row.iva, row.total, row.exento
 
         if include_exento_in_neto and exento is not None:
             neto = (neto or 0) + exento
@@ -332,9 +376,9 @@ def _summarize_dcv(
         if total is not None and neto is not None and iva is not None:
             if abs(total - (neto + iva)) > 1:
                 if not SILENCE_INCONSISTENCIES:
-                    LOGGER.warning("Total inconsistente en %s: %s", path.name, row.to_dict())
+                    LOGGER.warning("Total inconsistente en %s: %s", label, row)
 
-        bucket = summary.setdefault(code, {"neto": 0, "iva": 0, "total": 0})
+        bucket = summary.setdefault(row.code, {"neto": 0, "iva": 0, "total": 0})
         if neto is not None:
             bucket["neto"] = (bucket["neto"] or 0) + neto
         if iva is not None:
@@ -350,13 +394,24 @@ def _summarize_dcv(
     return summary, totals
 
 
+def _summarize_dcv(
+    path: Path,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    include_exento_in_neto: bool = False,
+) -> Tuple[Dict[int, Dict[str, Optional[int]]], Dict[str, Optional[int]]]:
+    rows = list(iter_dcv_rows(path, year, month))
+    with span("aggregation", file=path.name, rows=len(rows)):
+        return summarize_dcv_rows(rows, include_exento_in_neto, label=path.name)
+
+
 def _detect_boletas_path(ventas_path: Path) -> Optional[Path]:
     if ventas_path.is_dir():
-        matches = sorted(ventas_path.glob("VENTAS_BOLETAS_RESUMEN_*.csv"))
+        matches = storage_io.glob(ventas_path, "VENTAS_BOLETAS_RESUMEN_*.csv")
         return matches[-1] if matches else None
     if "BOLETAS" in ventas_path.name.upper():
         return ventas_path
-    matches = sorted(ventas_path.parent.glob("VENTAS_BOLETAS_RESUMEN_*.csv"))
+    matches = storage_io.glob(ventas_path.parent, "VENTAS_BOLETAS_RESUMEN_*.csv")
     return matches[-1] if matches else None
 
 
@@ -373,82 +428,48 @@ def _read_boletas_summary(boletas_path: Path) -> Optional[Dict[str, int]]:
     return {"neto": neto or 0, "iva": iva or 0, "total": total or 0}
 
 
+@timed("bhe_parse")
 def _read_bhe_summary(path: Optional[Path]) -> HonorariosSummary:
     if not path or not path.exists():
         return HonorariosSummary(bruto=None, retenido=None, pagado=None)
-    suffix = path.suffix.lower()
-    if suffix in (".html", ".htm", ".txt"):
-        text = path.read_text(encoding="latin-1", errors="ignore")
-        bruto = _to_int_money(_extract_hidden_value(text, "liquido1"))
-        retenido = _to_int_money(_extract_hidden_value(text, "liquido3"))
-        pagado = _to_int_money(_extract_hidden_value(text, "liquido4"))
-        if bruto is None or retenido is None or pagado is None:
-            totals = _extract_bhe_totals_row(text)
-            if totals:
-                return totals
-        return HonorariosSummary(bruto=bruto, retenido=retenido, pagado=pagado)
-
-    # Algunos .xls del SII en realidad son HTML. Parsearlos directo evita problemas con pandas.
+    suffix = storage_io.logical_suffix(path)
+    # Un solo escaneo del HTML sobre el archivo mapeado (solo se decodifica lo que se usa).
+    is_html = suffix in (".html", ".htm", ".txt")
+    scan: Optional[BHEScan] = None
     try:
-        text = path.read_text(encoding="latin-1", errors="ignore")
+        with storage_io.mapped(path) as buf:
+            # Algunos .xls del SII en realidad son HTML. Parsearlos directo evita problemas con pandas.
+            if is_html or has_table(buf):
+                scan = scan_bhe_html(buf)
     except Exception:
-        text = None
-    if text and "<table" in text.lower():
-        totals = _extract_bhe_totals_row(text)
-        if totals:
-            return totals
+        scan = None
+
+    if is_html:
+        scan = scan or BHEScan()
+        return _bhe_summary_from_scan(scan) or _bhe_hidden_summary(scan)
+
+    if scan is not None:
+        summary = _bhe_summary_from_scan(scan)
+        if summary:
+            return summary
 
     try:
         df = _read_dataframe(path)
     except Exception:
         df = None
 
-    def _fallback_from_html(text: str) -> Optional[HonorariosSummary]:
-        bruto = _to_int_money(_extract_hidden_value(text, "liquido1"))
-        retenido = _to_int_money(_extract_hidden_value(text, "liquido3"))
-        pagado = _to_int_money(_extract_hidden_value(text, "liquido4"))
-        if bruto or retenido or pagado:
-            return HonorariosSummary(bruto=bruto, retenido=retenido, pagado=pagado)
-        totals = _extract_bhe_totals_row(text)
-        if totals:
-            return totals
-        try:
-            tables = pd.read_html(text)
-        except Exception:
-            return None
-        if not tables:
-            return None
-        df_html = None
-        for tbl in tables:
-            tbl = _flatten_columns(tbl)
-            if _find_alt_column_relaxed(tbl, ("brutos", "bruto")) and _find_alt_column_relaxed(
-                tbl, ("retenido", "retencion", "retenciones")
-            ):
-                df_html = tbl
-                break
-        if df_html is None:
-            df_html = _flatten_columns(tables[1] if len(tables) > 1 else tables[0])
-        bruto_col = _find_alt_column_relaxed(df_html, ("brutos", "bruto"))
-        retenido_col = _find_alt_column_relaxed(df_html, ("retenido", "retencion", "retenciones"))
-        pagado_col = _find_alt_column_relaxed(df_html, ("pagado", "liquido", "liquidoapagar", "liquidoapago"))
-        if not (bruto_col or retenido_col or pagado_col):
-            return None
-
-        estado_col = _find_alt_column_relaxed(df_html, ("estado",))
-        if estado_col:
-            estado = df_html[estado_col].astype(str).str.strip().str.upper()
-            df_html = df_html[estado == "VIGENTE"]
-
-        return HonorariosSummary(
-            bruto=_sum_column(df_html, bruto_col),
-            retenido=_sum_column(df_html, retenido_col),
-            pagado=_sum_column(df_html, pagado_col),
-        )
+    def _fallback_from_html() -> Optional[HonorariosSummary]:
+        html_scan = scan if scan is not None else _scan_bhe_file(path)
+        hidden = _bhe_hidden_summary(html_scan)
+        if hidden.bruto or hidden.retenido or hidden.pagado:
+            return hidden
+        summary = _bhe_summary_from_scan(html_scan)
+        if summary:
+            return summary
+        return _bhe_summary_from_read_html(path)
 
     if df is None:
-        text = path.read_text(encoding="latin-1", errors="ignore")
-        fallback = _fallback_from_html(text)
-        return fallback or HonorariosSummary(bruto=None, retenido=None, pagado=None)
+        return _fallback_from_html() or HonorariosSummary(bruto=None, retenido=None, pagado=None)
 
     cols = _resolve_columns(df)
     bruto_col = cols.get("neto") or _find_alt_column(df, ("brutos", "bruto"))
@@ -457,8 +478,7 @@ def _read_bhe_summary(path: Optional[Path]) -> HonorariosSummary:
 
     if not (bruto_col or retenido_col or pagado_col):
         # Algunas planillas .xls del SII son HTML disfrazado y pandas no falla.
-        text = path.read_text(encoding="latin-1", errors="ignore")
-        fallback = _fallback_from_html(text)
+        fallback = _fallback_from_html()
         if fallback:
             return fallback
 
@@ -468,21 +488,75 @@ def _read_bhe_summary(path: Optional[Path]) -> HonorariosSummary:
     return HonorariosSummary(bruto=bruto, retenido=retenido, pagado=pagado)
 
 
-def _extract_bhe_totals_row(text: str) -> Optional[HonorariosSummary]:
-    row_match = re.search(r"<tr[^>]*>.*?Totales.*?</tr>", text, flags=re.IGNORECASE | re.DOTALL)
-    if not row_match:
+def _scan_bhe_file(path: Path) -> BHEScan:
+    try:
+        with storage_io.mapped(path) as buf:
+            return scan_bhe_html(buf)
+    except Exception:
+        return BHEScan()
+
+
+def _bhe_hidden_summary(scan: BHEScan) -> HonorariosSummary:
+    return HonorariosSummary(
+        bruto=_to_int_money(scan.hidden.get("liquido1")),
+        retenido=_to_int_money(scan.hidden.get("liquido3")),
+        pagado=_to_int_money(scan.hidden.get("liquido4")),
+    )
+
+
+def _bhe_summary_from_scan(scan: BHEScan) -> Optional[HonorariosSummary]:
+    """
+    Prioridad: campos ocultos liquido1/3/4 completos -> fila 'Totales' -> suma de boletas vigentes.
+    """
+    hidden = _bhe_hidden_summary(scan)
+    if hidden.bruto is not None and hidden.retenido is not None and hidden.pagado is not None:
+        return hidden
+    if scan.totals and any(v is not None for v in scan.totals):
+        bruto, retenido, pagado = scan.totals
+        return HonorariosSummary(bruto=bruto, retenido=retenido, pagado=pagado)
+    sums = scan.boletas_totals()
+    if sums:
+        bruto, retenido, pagado = sums
+        return HonorariosSummary(bruto=bruto, retenido=retenido, pagado=pagado)
+    return None
+
+
+def _bhe_summary_from_read_html(path: Path) -> Optional[HonorariosSummary]:
+    """Último recurso (lento): pd.read_html sobre todas las tablas. Se cuenta en métricas/log."""
+    metrics.PARSE_FALLBACKS.inc(source="bhe", kind="read_html")
+    LOGGER.info("BHE %s: sin totales en el escaneo, usando pd.read_html", path.name)
+    try:
+        tables = pd.read_html(io.StringIO(storage_io.read_text(path, encoding="latin-1", errors="ignore")))
+    except Exception:
         return None
-    row = row_match.group(0)
-    pattern = r"<td[^>]*>\s*(?:<div[^>]*>)?\s*([0-9\.,]+)\s*(?:</div>)?\s*</td>"
-    nums = re.findall(pattern, row, flags=re.IGNORECASE | re.DOTALL)
-    if len(nums) < 3:
+    if not tables:
         return None
-    bruto = _to_int_money(nums[-3])
-    retenido = _to_int_money(nums[-2])
-    pagado = _to_int_money(nums[-1])
-    if bruto is None and retenido is None and pagado is None:
+    df_html = None
+    for tbl in tables:
+        tbl = _flatten_columns(tbl)
+        if _find_alt_column_relaxed(tbl, ("brutos", "bruto")) and _find_alt_column_relaxed(
+            tbl, ("retenido", "retencion", "retenciones")
+        ):
+            df_html = tbl
+            break
+    if df_html is None:
+        df_html = _flatten_columns(tables[1] if len(tables) > 1 else tables[0])
+    bruto_col = _find_alt_column_relaxed(df_html, ("brutos", "bruto"))
+    retenido_col = _find_alt_column_relaxed(df_html, ("retenido", "retencion", "retenciones"))
+    pagado_col = _find_alt_column_relaxed(df_html, ("pagado", "liquido", "liquidoapagar", "liquidoapago"))
+    if not (bruto_col or retenido_col or pagado_col):
         return None
-    return HonorariosSummary(bruto=bruto, retenido=retenido, pagado=pagado)
+
+    estado_col = _find_alt_column_relaxed(df_html, ("estado",))
+    if estado_col:
+        estado = df_html[estado_col].astype(str).str.strip().str.upper()
+        df_html = df_html[estado.isin(VIGENTE_STATES)]
+
+    return HonorariosSummary(
+        bruto=_sum_column(df_html, bruto_col),
+        retenido=_sum_column(df_html, retenido_col),
+        pagado=_sum_column(df_html, pagado_col),
+    )
 
 
 def _find_alt_column(df: pd.DataFrame, aliases: Iterable[str]) -> Optional[str]:
@@ -531,47 +605,13 @@ def _sum_column(df: pd.DataFrame, col: Optional[str]) -> Optional[int]:
     return total
 
 
-def _extract_hidden_value(text: str, name: str) -> Optional[str]:
-    pattern = rf'name=["\']{re.escape(name)}["\']\s+value=["\']([^"\']+)["\']'
-    match = re.search(pattern, text, flags=re.IGNORECASE)
-    return match.group(1) if match else None
-
-
+@timed("remanente_extract")
 def _extract_remanente(path: Optional[Path]) -> Optional[int]:
     if not path or not path.exists():
         return None
-    suffix = path.suffix.lower()
-    if suffix == ".json":
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-            value = data.get("codigo_77_remanente")
-            if value is None:
-                value = data.get("codigo_77")
-            return _to_int_money(value)
-        except Exception:
-            return None
-
-    if suffix == ".pdf":
-        try:
-            import pdfplumber  # optional
-        except Exception:
-            return None
-        try:
-            with pdfplumber.open(path) as pdf:
-                text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-        except Exception:
-            return None
-    else:
-        text = path.read_text(encoding="utf-8", errors="ignore")
-
-    for regex in (
-        r"remanente[^0-9]*([0-9\.\,]+)",
-        r"codigo\s*77[^0-9]*([0-9\.\,]+)",
-    ):
-        match = re.search(regex, text, flags=re.IGNORECASE)
-        if match:
-            return _to_int_money(match.group(1))
-    return None
+    # El texto de PDFs queda cacheado por (ruta, tamaño, mtime) en remanente_index.
+    codigo_77, _folio = extract_remanente_file(path)
+    return codigo_77
 
 
 def _format_money(value: Optional[int], *, blank_if_none: bool = False) -> str:
@@ -608,6 +648,7 @@ def _build_items(
     return items
 
 
+@timed("summary_build")
 def build_monthly_tax_summary(
     *,
     company_name: str,
@@ -620,12 +661,20 @@ def build_monthly_tax_summary(
     ppm_factor: Optional[float] = None,
     remanente_override: Optional[int] = None,
     impuesto_unico: Optional[int] = None,
+    dcv_summaries: Optional[Dict[str, Tuple[Dict[int, Dict[str, Optional[int]]], Dict[str, Optional[int]]]]] = None,
 ) -> Dict[str, Any]:
+    """
+    dcv_summaries: {"ventas"|"compras": (por código, totales)} ya calculados (p.ej. desde
+    rcv_dataset); la sección que venga ahí no se vuelve a leer desde el CSV.
+    """
     ventas_path_obj = Path(ventas_path)
     compras_path_obj = Path(compras_path)
+    dcv_summaries = dcv_summaries or {}
 
-    ventas_by_code, ventas_totals = _summarize_dcv(ventas_path_obj, period_year, period_month)
-    compras_by_code, compras_totals = _summarize_dcv(
+    ventas_by_code, ventas_totals = dcv_summaries.get("ventas") or _summarize_dcv(
+        ventas_path_obj, period_year, period_month
+    )
+    compras_by_code, compras_totals = dcv_summaries.get("compras") or _summarize_dcv(
         compras_path_obj,
         period_year,
         period_month,
@@ -764,7 +813,9 @@ def generate_monthly_tax_summary_pdf(
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     month_label = f"{MONTH_LABELS.get(period_month, str(period_month))} {period_year}"
-    _render_pdf(summary, out_path, month_label)
+    with span("pdf_render", file=out_path.name) as rec:
+        _render_pdf(summary, out_path, month_label)
+        rec["bytes"] = out_path.stat().st_size
 
     summary_json_path = out_path.with_suffix(".json")
     summary_json_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import argparse
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Profiling opcional por etapa (cProfile) enganchado a timing.span().
+# Activación:
+#   SII_PROFILE=summary_build,pdf_render   (o "all")   | --profile ... en los scripts
+#   SII_PROFILE_COLLAPSED=1                            | --profile-collapsed
+# Salida: <run>/logs/profiles/<etapa>_<empresa>_<periodo>_<n>.prof (+ .folded)
+PROFILES_DIRNAME = "profiles"
+FALLBACK_DIR = Path(os.getenv("SII_PROFILE_DIR", "profiles"))
+
+# Nombres de función aceptados como alias de la etapa que los envuelve.
+STAGE_ALIASES = {
+    "build_monthly_tax_summary": "summary_build",
+    "_render_pdf": "pdf_render",
+    "render_pdf": "pdf_render",
+    "_read_bhe_summary": "bhe_parse",
+    "_extract_remanente": "remanente_extract",
+}
+
+_TRUE = ("1", "true", "yes", "y")
+_STAGES: frozenset = frozenset()
+_ALL = False
+_COLLAPSED = False
+_SEQ = itertools.count(1)
+_LOCAL = threading.local()
+_SAFE_RE = re.compile(r"[^0-9A-Za-z_.-]+")
+
+
+# ----------------------------
+# Configuración
+# ----------------------------
+def configure(spec: Optional[str], *, collapsed: Optional[bool] = None) -> None:
+    """
+    spec: lista separada por comas de etapas (o alias de función), "all" para todas,
+    vacío/None para desactivar.
+    """
+    global _STAGES, _ALL, _COLLAPSED
+    names = [s.strip() for s in (spec or "").split(",") if s.strip()]
+    _ALL = any(n.lower() in ("all", "*") or n.lower() in _TRUE for n in names)
+    _STAGES = frozenset(STAGE_ALIASES.get(n, n) for n in names)
+    if collapsed is not None:
+        _COLLAPSED = collapsed
+
+
+def configure_from_env() -> None:
+    configure(
+        os.getenv("SII_PROFILE", ""),
+        collapsed=os.getenv("SII_PROFILE_COLLAPSED", "").strip().lower() in _TRUE,
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        default=None,
+        help="Etapas a perfilar con cProfile (ej: summary_build,pdf_render o all). Default: SII_PROFILE",
+    )
+    parser.add_argument(
+        "--profile-collapsed",
+        action="store_true",
+        help="Exportar además stacks colapsados (.folded) para flamegraph",
+    )
+
+
+def configure_from_args(args: argparse.Namespace) -> None:
+    """CLI sobre entorno: --profile reemplaza SII_PROFILE si viene."""
+    if getattr(args, "profile", None):
+        configure(args.profile, collapsed=bool(getattr(args, "profile_collapsed", False)) or None)
+    elif getattr(args, "profile_collapsed", False):
+        configure_collapsed(True)
+
+
+def configure_collapsed(enabled: bool) -> None:
+    global _COLLAPSED
+    _COLLAPSED = enabled
+
+
+def cli_passthrough(args: argparse.Namespace) -> List[str]:
+    """Flags para reenviar a un subproceso (scripts que lanzan otros scripts)."""
+    out: List[str] = []
+    if getattr(args, "profile", None):
+        out += ["--profile", args.profile]
+    if getattr(args, "profile_collapsed", False):
+        out.append("--profile-collapsed")
+    return out
+
+
+def is_enabled() -> bool:
+    return _ALL or bool(_STAGES)
+
+
+def wants(stage: str) -> bool:
+    return _ALL or stage in _STAGES
+
+
+# ----------------------------
+# Captura (usado por timing.span)
+# ----------------------------
+def start(stage: str) -> Optional[cProfile.Profile]:
+    """
+    Inicia un profiler para la etapa si corresponde. No anida: si el hilo ya
+    está perfilando una etapa externa, la interna queda incluida en esa.
+    """
+    if not wants(stage) or getattr(_LOCAL, "active", False):
+        return None
+    prof = cProfile.Profile()
+    _LOCAL.active = True
+    prof.enable()
+    return prof
+
+
+def finish(
+    prof: cProfile.Profile,
+    stage: str,
+    *,
+    log_dir: Optional[Path],
+    context: Dict[str, Any],
+) -> Optional[Path]:
+    prof.disable()
+    _LOCAL.active = False
+    try:
+        out_dir = (Path(log_dir) / PROFILES_DIRNAME) if log_dir else FALLBACK_DIR
+        out_dir.mkdir(parents=True, exist_ok=True)
+        parts = [stage, context.get("company"), context.get("period"), str(next(_SEQ))]
+        name = "_".join(_SAFE_RE.sub("-", str(p)) for p in parts if p)
+        out_path = out_dir / f"{name}.prof"
+        prof.dump_stats(str(out_path))
+        if _COLLAPSED:
+            write_collapsed(out_path)
+        return out_path
+    except Exception:
+        # Igual que timing: el profiling nunca debe botar la corrida.
+        return None
+
+
+# ----------------------------
+# Export para flamegraph
+# ----------------------------
+Func = Tuple[str, int, str]
+
+
+def _label(func: Func) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        label = name
+    else:
+        label = f"{Path(filename).name}:{name}:{lineno}"
+    return label.replace(";", ",").replace(" ", "_")
+
+
+def collapse_stats(stats: pstats.Stats, *, min_us: int = 1, max_depth: int = 200) -> List[str]:
+    """
+    Reconstruye stacks colapsados ("a;b;c <us>") desde el grafo de callers de pstats.
+    cProfile no guarda stacks completos: el tiempo de cada callee se reparte entre
+    los caminos en proporción al tiempo acumulado de cada arco (aproximación estándar).
+    """
+    raw: Dict[Func, Tuple[int, int, float, float, Dict[Func, Tuple]]] = stats.stats
+    callees: Dict[Func, Dict[Func, float]] = {}
+    for func, (_cc, _nc, _tt, _ct, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[func] = edge[3]
+
+    roots = [f for f, v in raw.items() if not any(c in raw for c in v[4])]
+    totals: Dict[str, float] = {}
+
+    def walk(func: Func, scale: float, stack: List[Func]) -> None:
+        _cc, _nc, tt, ct, _callers = raw[func]
+        path = stack + [func]
+        self_us = tt * scale * 1e6
+        if self_us >= min_us:
+            key = ";".join(_label(f) for f in path)
+            totals[key] = totals.get(key, 0.0) + self_us
+        if len(path) >= max_depth:
+            return
+        for child, edge_ct in callees.get(func, {}).items():
+            if child in path or child not in raw:
+                continue
+            child_ct = raw[child][3]
+            if child_ct <= 0 or edge_ct <= 0:
+                continue
+            child_scale = scale * edge_ct / child_ct
+            if child_ct * child_scale * 1e6 < min_us:
+                continue
+            walk(child, child_scale, path)
+
+    for root in roots:
+        walk(root, 1.0, [])
+    return [f"{k} {int(round(v))}" for k, v in sorted(totals.items()) if round(v) >= min_us]
+
+
+def write_collapsed(prof_path: Path, out_path: Optional[Path] = None) -> Path:
+    prof_path = Path(prof_path)
+    out_path = out_path or prof_path.with_suffix(".folded")
+    lines = collapse_stats(pstats.Stats(str(prof_path)))
+    out_path.write_text("\n".join(lines) + ("\n" if lines else ""), encoding="utf-8")
+    return out_path
+
+
+def find_profiles(storage_root: Path, company_id: Optional[str] = None) -> List[Path]:
+    companies = Path(storage_root) / "companies"
+    pattern = f"{company_id or '*'}/runs/*/logs/{PROFILES_DIRNAME}/*.prof"
+    return sorted(companies.glob(pattern))
+
+
+def top_functions(paths: Iterable[Path], limit: int = 25, sort: str = "cumulative") -> str:
+    """Tabla pstats combinada (texto) para inspección rápida sin herramientas externas."""
+    paths = [str(p) for p in paths]
+    if not paths:
+        return ""
+    buf = io.StringIO()
+    stats = pstats.Stats(paths[0], stream=buf)
+    for p in paths[1:]:
+        stats.add(p)
+    stats.sort_stats(sort).print_stats(limit)
+    return buf.getvalue()
+
+
+configure_from_env()
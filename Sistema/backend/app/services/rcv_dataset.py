@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import heapq
+import json
+import mmap
+import struct
+import sys
+import threading
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.monthly_tax_pdf import DcvRow, iter_dcv_rows, summarize_dcv_rows
+from backend.app.services.timing import span
+
+# Dataset columnar anual del RCV por empresa, particionado por sección y mes:
+#   companies/<id>/analytics/rcv_<año>/<seccion>_<MM>.col
+# Cada partición guarda las filas normalizadas del RCV del mes (iter_dcv_rows: montos con
+# signo, fecha AAAAMMDD, contraparte) en columnas tipadas contiguas y alineadas, con un
+# encabezado JSON que trae el offset de cada columna y la firma del CSV de origen.
+# Los lectores abren la partición con mmap y copian solo las columnas que usan (un
+# bloque contiguo por columna); un total anual por código lee 2 columnas de 12 archivos
+# en vez de parsear 12 CSV. No se entregan vistas sobre el mmap: una vista viva lo deja
+# abierto y en Windows un archivo mapeado no se puede reemplazar al reingestar el mes. El resumen mensual (por código/total) se reconstruye desde la
+# partición con summarize_dcv_rows, idéntico al que se calcula desde el CSV.
+# Un mes se reingesta solo si cambia su CSV (nombre, tamaño, mtime).
+DATASET_DIRNAME = "rcv_{year}"
+PARTITION_MAGIC = b"RCVP1\n"
+PARTITION_SUFFIX = ".col"
+SECTIONS = ("compras", "ventas")
+MONEY_FIELDS = ("neto", "iva", "total", "exento")
+NO_PARTY = 0xFFFFFFFF
+
+# Columnas (nombre, typecode). fecha 0 = sin fecha; flags marca qué montos venían en el CSV
+# (bit i = MONEY_FIELDS[i]) para distinguir 0 de ausente al reconstruir el resumen.
+COLUMNS = (
+    ("code", "H"),
+    ("fecha", "I"),
+    ("party", "I"),
+    ("flags", "B"),
+    ("neto", "q"),
+    ("iva", "q"),
+    ("total", "q"),
+    ("exento", "q"),
+)
+_ALIGN = 8
+
+_MEMO: Dict[Path, Tuple[Tuple, "Partition"]] = {}
+_MEMO_LOCK = threading.Lock()
+
+
+def _signature(path: Path) -> List:
+    st = Path(path).stat()
+    return [Path(path).name, st.st_size, st.st_mtime_ns]
+
+
+# ----------------------------
+# Escritura
+# ----------------------------
+def encode_partition(
+    rows: Iterable[DcvRow], *, year: int, month: int, section: str, source: Optional[List] = None
+) -> bytes:
+    cols = {name: array(code) for name, code in COLUMNS}
+    parties: List[List[Optional[str]]] = []
+    party_idx: Dict[str, int] = {}
+    for row in rows:
+        party = NO_PARTY
+        if row.rut:
+            party = party_idx.get(row.rut, -1)
+            if party < 0:
+                party = party_idx[row.rut] = len(parties)
+                parties.append([row.rut, row.razon_social])
+            elif row.razon_social and not parties[party][1]:
+                parties[party][1] = row.razon_social
+        flags = 0
+        for i, f in enumerate(MONEY_FIELDS):
+            value = getattr(row, f)
+            if value is not None:
+                flags |= 1 << i
+            cols[f].append(value or 0)
+        cols["code"].append(row.code)
+        cols["fecha"].append(row.fecha or 0)
+        cols["party"].append(party)
+        cols["flags"].append(flags)
+
+    layout = []
+    offset = 0
+    for name, code in COLUMNS:
+        size = len(cols[name]) * cols[name].itemsize
+        layout.append([name, code, offset])
+        offset += size + (-size % _ALIGN)
+    header = {
+        "year": int(year),
+        "month": int(month),
+        "section": section,
+        "rows": len(cols["code"]),
+        "byteorder": sys.byteorder,
+        "columns": layout,
+        "parties": parties,
+        "source": source,
+    }
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix = len(PARTITION_MAGIC) + 4 + len(head)
+    parts = [PARTITION_MAGIC, struct.pack("<I", len(head)), head, b"\0" * (-prefix % _ALIGN)]
+    for name, _code in COLUMNS:
+        data = cols[name].tobytes()
+        parts.append(data)
+        parts.append(b"\0" * (-len(data) % _ALIGN))
+    return b"".join(parts)
+
+
+# ----------------------------
+# Lectura (mmap)
+# ----------------------------
+class Partition:
+    """Partición abierta con mmap; column() copia solo la columna pedida."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(PARTITION_MAGIC)] != PARTITION_MAGIC:
+            self._mm.close()
+            raise ValueError(f"Partición RCV inválida: {path}")
+        pos = len(PARTITION_MAGIC)
+        (head_len,) = struct.unpack_from("<I", self._mm, pos)
+        pos += 4
+        self.header = json.loads(self._mm[pos:pos + head_len].decode("utf-8"))
+        self._base = pos + head_len + (-(pos + head_len) % _ALIGN)
+        if [(n, c) for n, c, _o in self.header["columns"]] != list(COLUMNS):
+            self._mm.close()
+            raise ValueError(f"Layout de columnas RCV desconocido: {path}")
+        self._offsets = {n: (c, o) for n, c, o in self.header["columns"]}
+        self._swap = self.header["byteorder"] != sys.byteorder
+        self.rows = int(self.header["rows"])
+        self.parties: List[Tuple[str, Optional[str]]] = [(r, n) for r, n in self.header["parties"]]
+
+    @property
+    def source(self) -> Optional[List]:
+        return self.header.get("source")
+
+    def column(self, name: str) -> Sequence[int]:
+        code, offset = self._offsets[name]
+        size = array(code).itemsize * self.rows
+        start = self._base + offset
+        col = array(code)
+        col.frombytes(self._mm[start:start + size])
+        if self._swap:
+            col.byteswap()
+        return col
+
+    def rows_iter(self) -> Iterator[DcvRow]:
+        cols = {name: self.column(name) for name, _c in COLUMNS}
+        for i in range(self.rows):
+            flags = cols["flags"][i]
+            party = cols["party"][i]
+            rut, nombre = self.parties[party] if party != NO_PARTY else (None, None)
+            money = {f: (cols[f][i] if flags & (1 << k) else None) for k, f in enumerate(MONEY_FIELDS)}
+            yield DcvRow(code=cols["code"][i], fecha=cols["fecha"][i] or None, rut=rut, razon_social=nombre, **money)
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+# ----------------------------
+# Ingesta
+# ----------------------------
+def dataset_dir(storage_root: Path, company_id: str, year: int) -> Path:
+    return Path(storage_root) / "companies" / company_id / "analytics" / DATASET_DIRNAME.format(year=int(year))
+
+
+def partition_path(storage_root: Path, company_id: str, section: str, year: int, month: int) -> Path:
+    return dataset_dir(storage_root, company_id, year) / f"{section}_{int(month):02d}{PARTITION_SUFFIX}"
+
+
+def open_partition(path: Path) -> Optional[Partition]:
+    """Partición memorizada por proceso (se reabre si el archivo cambió)."""
+    path = Path(path)
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    key = (st.st_size, st.st_mtime_ns)
+    with _MEMO_LOCK:
+        hit = _MEMO.get(path)
+        if hit and hit[0] == key:
+            return hit[1]
+    try:
+        part = Partition(path)
+    except (OSError, ValueError):
+        return None
+    with _MEMO_LOCK:
+        old = _MEMO.get(path)
+        _MEMO[path] = (key, part)
+    if old is not None:
+        old[1].close()
+    return part
+
+
+def _evict(path: Path) -> None:
+    """Cierra el mmap memorizado de `path` (antes de reemplazar o borrar el archivo)."""
+    with _MEMO_LOCK:
+        hit = _MEMO.pop(Path(path), None)
+    if hit is not None:
+        hit[1].close()
+
+
+def ingest_month(
+    storage_root: Path, company_id: str, section: str, year: int, month: int, source: Path
+) -> Partition:
+    """Escribe (o reutiliza si la firma coincide) la partición sección/mes desde su CSV."""
+    if section not in SECTIONS:
+        raise ValueError(f"Sección desconocida: {section}")
+    out = partition_path(storage_root, company_id, section, year, month)
+    sig = _signature(source)
+    current = open_partition(out)
+    if current is not None and current.source == sig:
+        return current
+    with span("csv_parse", source="rcv_dataset", file=Path(source).name) as rec:
+        data = encode_partition(
+            iter_dcv_rows(Path(source), year, month), year=year, month=month, section=section, source=sig
+        )
+        rec["bytes"] = len(data)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.name + ".tmp")
+    tmp.write_bytes(data)
+    _evict(out)
+    tmp.replace(out)
+    part = open_partition(out)
+    if part is None:
+        raise ValueError(f"No se pudo abrir la partición recién escrita: {out}")
+    return part
+
+
+def sync_year(
+    storage_root: Path,
+    company_id: str,
+    year: int,
+    *,
+    to_month: int = 12,
+    storage: Optional[CompanyStorage] = None,
+) -> List[Tuple[str, int]]:
+    """
+    Alinea el dataset con los RCV en disco (enero..to_month): ingesta lo nuevo o cambiado
+    y borra particiones cuyo CSV ya no existe. Retorna las particiones (re)escritas.
+    """
+    cs = storage or CompanyStorage(Path(storage_root), company_id)
+    cs.prefetch_year("dcv", year)
+    written: List[Tuple[str, int]] = []
+    for month in range(1, int(to_month) + 1):
+        for section in SECTIONS:
+            src = cs.ventas(year, month) if section == "ventas" else cs.compras(year, month)
+            out = partition_path(storage_root, company_id, section, year, month)
+            if src is None:
+                if out.exists():
+                    _evict(out)
+                    out.unlink()
+                continue
+            before = open_partition(out)
+            if before is not None and before.source == _signature(src):
+                continue
+            ingest_month(storage_root, company_id, section, year, month, src)
+            written.append((section, month))
+    return written
+
+
+# ----------------------------
+# Consultas
+# ----------------------------
+@dataclass
+class PartyTotal:
+    rut: str
+    razon_social: Optional[str]
+    total: int
+    documentos: int
+
+
+class RCVDataset:
+    """Consultas entre meses sobre las particiones de una empresa-año."""
+
+    def __init__(self, storage_root: Path, company_id: str, year: int) -> None:
+        self.storage_root = Path(storage_root)
+        self.company_id = company_id
+        self.year = int(year)
+
+    def partition(self, section: str, month: int) -> Optional[Partition]:
+        return open_partition(partition_path(self.storage_root, self.company_id, section, self.year, month))
+
+    def months(self, section: str) -> List[int]:
+        folder = dataset_dir(self.storage_root, self.company_id, self.year)
+        if not folder.exists():
+            return []
+        prefix = f"{section}_"
+        return sorted(
+            int(p.stem[len(prefix):]) for p in folder.glob(f"{prefix}[0-9][0-9]{PARTITION_SUFFIX}")
+        )
+
+    def _parts(self, section: str, to_month: Optional[int]) -> Iterator[Tuple[int, Partition]]:
+        for month in self.months(section):
+            if to_month is not None and month > int(to_month):
+                continue
+            part = self.partition(section, month)
+            if part is not None:
+                yield month, part
+
+    def dcv_summary(
+        self, section: str, month: int, *, include_exento_in_neto: Optional[bool] = None
+    ) -> Optional[Tuple[Dict[int, Dict[str, Optional[int]]], Dict[str, Optional[int]]]]:
+        """Lo mismo que el resumen mensual calcula desde el CSV (compras suma exento al neto)."""
+        part = self.partition(section, month)
+        if part is None:
+            return None
+        if include_exento_in_neto is None:
+            include_exento_in_neto = section == "compras"
+        with span("aggregation", source="rcv_dataset", rows=part.rows):
+            return summarize_dcv_rows(part.rows_iter(), include_exento_in_neto, label=part.path.name)
+
+    def monthly_totals(self, section: str, field: str = "total", to_month: Optional[int] = None) -> Dict[int, int]:
+        """Suma mensual de un monto (una columna por partición)."""
+        if field not in MONEY_FIELDS:
+            raise ValueError(f"Campo no soportado: {field}")
+        return {month: sum(part.column(field)) for month, part in self._parts(section, to_month)}
+
+    def totals_by_code(self, section: str, to_month: Optional[int] = None) -> Dict[int, Dict[str, int]]:
+        """Acumulado por código de documento de neto/iva/total/exento (sin reglas del resumen)."""
+        out: Dict[int, Dict[str, int]] = {}
+        for _month, part in self._parts(section, to_month):
+            codes = part.column("code")
+            cols = [(f, part.column(f)) for f in MONEY_FIELDS]
+            for i in range(part.rows):
+                bucket = out.get(codes[i])
+                if bucket is None:
+                    bucket = out[codes[i]] = {f: 0 for f in MONEY_FIELDS}
+                for f, col in cols:
+                    bucket[f] += col[i]
+        return out
+
+    def top_parties(self, section: str, n: int = 10, to_month: Optional[int] = None) -> List[PartyTotal]:
+        """
+        Proveedores/clientes con mayor total acumulado (NC ya vienen restando). Como en
+        rcv_topn, las filas sin monto total no cuentan como documento.
+        """
+        has_total = 1 << MONEY_FIELDS.index("total")
+        acc: Dict[str, List] = {}
+        for _month, part in self._parts(section, to_month):
+            party, total, flags = part.column("party"), part.column("total"), part.column("flags")
+            sums: Dict[int, List[int]] = {}
+            for i in range(part.rows):
+                p = party[i]
+                if p == NO_PARTY or not flags[i] & has_total:
+                    continue
+                cur = sums.get(p)
+                if cur is None:
+                    sums[p] = [total[i], 1]
+                else:
+                    cur[0] += total[i]
+                    cur[1] += 1
+            for p, (monto, docs) in sums.items():
+                rut, nombre = part.parties[p]
+                entry = acc.setdefault(rut, [nombre, 0, 0])
+                entry[0] = entry[0] or nombre
+                entry[1] += monto
+                entry[2] += docs
+        best = heapq.nlargest(n, acc.items(), key=lambda kv: (kv[1][1], kv[0]))
+        return [PartyTotal(rut=rut, razon_social=v[0], total=v[1], documentos=v[2]) for rut, v in best]
+
+    def iva_trend(self, to_month: Optional[int] = None) -> Dict[int, Dict[str, int]]:
+        """IVA débito (ventas) y crédito (compras) por mes, sin remanente."""
+        debito = self.monthly_totals("ventas", "iva", to_month)
+        credito = self.monthly_totals("compras", "iva", to_month)
+        return {
+            m: {"debito": debito.get(m, 0), "credito": credito.get(m, 0), "neto": debito.get(m, 0) - credito.get(m, 0)}
+            for m in sorted(set(debito) | set(credito))
+        }
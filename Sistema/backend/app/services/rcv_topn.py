@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import heapq
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backend.app.services import storage_io
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.mapped_csv import MappedCsv
+from backend.app.services.monthly_tax_pdf import NOTE_CREDITO_CODES
+from backend.app.services.timing import span
+
+# Top-N de proveedores (compras) y clientes (ventas) por RUT para las páginas
+# Compras/Ventas de sii_report_pdf (top5_anual / top5_mes).
+# Lee los RCV mensuales sobre el archivo mapeado (mapped_csv, sin pandas) y guarda totales por RUT y mes
+# en companies/<id>/analytics/topn_<seccion>_<año>.json; al llegar un mes nuevo solo
+# se lee ese archivo y el acumulado anual se ajusta con la diferencia.
+ANALYTICS_DIRNAME = "analytics"
+STATE_VERSION = 1
+SECTIONS = ("compras", "ventas")
+
+# Encabezados normalizados (minúsculas, solo [a-z0-9]).
+_RUT_COLS = ("rutproveedor", "rutcliente", "rut")
+_NAME_COLS = ("razonsocial",)
+_TIPO_COLS = ("tipodoc", "tipodocumento")
+_TOTAL_COLS = ("montototal", "total")
+
+
+@dataclass
+class TopEntry:
+    rut: str
+    razon_social: str
+    monto: int
+    documentos: int
+
+    def as_report_row(self) -> Dict[str, object]:
+        return {"razon_social": self.razon_social, "rut": self.rut, "monto": self.monto}
+
+
+@dataclass
+class TopNState:
+    section: str
+    year: int
+    # mes "MM" -> {"file", "sig", "totals": {rut: [monto, docs]}}
+    months: Dict[str, Dict] = field(default_factory=dict)
+    ytd: Dict[str, List[int]] = field(default_factory=dict)
+    names: Dict[str, str] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": STATE_VERSION,
+            "section": self.section,
+            "year": self.year,
+            "months": self.months,
+            "ytd": self.ytd,
+            "names": self.names,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TopNState":
+        return cls(
+            section=data["section"],
+            year=int(data["year"]),
+            months=data.get("months") or {},
+            ytd=data.get("ytd") or {},
+            names=data.get("names") or {},
+        )
+
+
+# ----------------------------
+# Lectura streaming de un RCV
+# ----------------------------
+def _norm(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", name.strip().lower())
+
+
+def _col(header: List[str], aliases: Tuple[str, ...]) -> Optional[int]:
+    normalized = [_norm(h) for h in header]
+    for alias in aliases:
+        if alias in normalized:
+            return normalized.index(alias)
+    return None
+
+
+def _int(value: str) -> Optional[int]:
+    digits = re.sub(r"[^\d]", "", value or "")
+    if not digits:
+        return None
+    return -int(digits) if value.strip().startswith("-") else int(digits)
+
+
+def scan_rcv_totals(path: Path) -> Tuple[Dict[str, List[int]], Dict[str, str]]:
+    """
+    ({rut: [monto_total, documentos]}, {rut: razon_social}) de un RCV mensual.
+    Las notas de crédito restan, igual que en el resumen mensual.
+    """
+    totals: Dict[str, List[int]] = {}
+    names: Dict[str, str] = {}
+    with span("csv_parse", source="topn", file=path.name) as rec:
+        rec["bytes"] = path.stat().st_size
+        with storage_io.mapped(path) as buf:
+            reader = MappedCsv(buf)
+            header = reader.header
+            rut_i, name_i = _col(header, _RUT_COLS), _col(header, _NAME_COLS)
+            tipo_i, total_i = _col(header, _TIPO_COLS), _col(header, _TOTAL_COLS)
+            if rut_i is None or total_i is None:
+                return totals, names
+            # Solo se decodifican estas columnas (el nombre/tipo pueden faltar: índice repetido).
+            columns = [rut_i, total_i, tipo_i if tipo_i is not None else rut_i, name_i if name_i is not None else rut_i]
+            rows = 0
+            for rut, total, tipo, name in reader.rows(columns, skip_short=True):
+                rut = rut.strip().upper()
+                monto = _int(total)
+                if not rut or monto is None:
+                    continue
+                rows += 1
+                if tipo_i is not None and _int(tipo) in NOTE_CREDITO_CODES and monto > 0:
+                    monto = -monto
+                acc = totals.get(rut)
+                if acc is None:
+                    totals[rut] = [monto, 1]
+                else:
+                    acc[0] += monto
+                    acc[1] += 1
+                if name_i is not None and rut not in names:
+                    names[rut] = name.strip()
+            rec["rows"] = rows
+    return totals, names
+
+
+# ----------------------------
+# Estado incremental
+# ----------------------------
+def pick_rcv(
+    storage_root: Path, company_id: str, section: str, year: int, month: int, *, storage: Optional[CompanyStorage] = None
+) -> Optional[Path]:
+    cs = storage or CompanyStorage(Path(storage_root), company_id)
+    return cs.ventas(year, month) if section == "ventas" else cs.compras(year, month)
+
+
+def state_path(storage_root: Path, company_id: str, section: str, year: int) -> Path:
+    return Path(storage_root) / "companies" / company_id / ANALYTICS_DIRNAME / f"topn_{section}_{year}.json"
+
+
+def load_state(storage_root: Path, company_id: str, section: str, year: int) -> TopNState:
+    path = state_path(storage_root, company_id, section, year)
+    if path.exists():
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == STATE_VERSION:
+                return TopNState.from_dict(data)
+        except Exception:
+            pass
+    return TopNState(section=section, year=int(year))
+
+
+def _merge(ytd: Dict[str, List[int]], totals: Dict[str, List[int]], sign: int) -> None:
+    for rut, (monto, docs) in totals.items():
+        acc = ytd.setdefault(rut, [0, 0])
+        acc[0] += sign * monto
+        acc[1] += sign * docs
+        if acc[1] <= 0 and acc[0] == 0:
+            ytd.pop(rut, None)
+
+
+def update_section(
+    storage_root: Path,
+    company_id: str,
+    section: str,
+    year: int,
+    *,
+    to_month: int = 12,
+    persist: bool = True,
+    storage: Optional[CompanyStorage] = None,
+) -> TopNState:
+    """
+    Sincroniza el estado con los RCV en disco hasta `to_month`. Solo se leen los meses
+    nuevos o cuyo archivo cambió (tamaño/mtime); el acumulado anual se ajusta restando
+    el mes anterior y sumando el nuevo.
+    """
+    if section not in SECTIONS:
+        raise ValueError(f"Sección desconocida: {section}")
+    state = load_state(storage_root, company_id, section, year)
+    cs = storage or CompanyStorage(Path(storage_root), company_id)
+    cs.prefetch_year("dcv", year)
+    changed = False
+    for month in range(1, int(to_month) + 1):
+        mm = f"{month:02d}"
+        path = pick_rcv(storage_root, company_id, section, year, month, storage=cs)
+        old = state.months.get(mm)
+        if path is None:
+            if old:
+                _merge(state.ytd, old["totals"], -1)
+                state.months.pop(mm, None)
+                changed = True
+            continue
+        st = path.stat()
+        sig = [st.st_size, st.st_mtime_ns]
+        if old and old.get("file") == path.name and old.get("sig") == sig:
+            continue
+        totals, names = scan_rcv_totals(path)
+        if old:
+            _merge(state.ytd, old["totals"], -1)
+        _merge(state.ytd, totals, 1)
+        for rut, name in names.items():
+            state.names.setdefault(rut, name)
+        state.months[mm] = {"file": path.name, "sig": sig, "totals": totals}
+        changed = True
+
+    if persist and changed:
+        out = state_path(storage_root, company_id, section, year)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(state.to_dict(), ensure_ascii=False), encoding="utf-8")
+    return state
+
+
+# ----------------------------
+# Consultas
+# ----------------------------
+def _top(totals: Iterable[Tuple[str, List[int]]], names: Dict[str, str], n: int) -> List[TopEntry]:
+    best = heapq.nlargest(n, totals, key=lambda kv: (kv[1][0], kv[0]))
+    return [TopEntry(rut=rut, razon_social=names.get(rut, ""), monto=v[0], documentos=v[1]) for rut, v in best]
+
+
+def top_month(state: TopNState, month: int, n: int = 5) -> List[TopEntry]:
+    entry = state.months.get(f"{int(month):02d}")
+    if not entry:
+        return []
+    return _top(entry["totals"].items(), state.names, n)
+
+
+def top_ytd(state: TopNState, to_month: Optional[int] = None, n: int = 5) -> List[TopEntry]:
+    """Top acumulado del año; con `to_month` menor al último mes cargado se suma enero..to_month."""
+    loaded = sorted(int(m) for m in state.months)
+    if to_month is None or not loaded or int(to_month) >= loaded[-1]:
+        return _top(state.ytd.items(), state.names, n)
+    acc: Dict[str, List[int]] = {}
+    for m in loaded:
+        if m <= int(to_month):
+            _merge(acc, state.months[f"{m:02d}"]["totals"], 1)
+    return _top(acc.items(), state.names, n)
+
+
+def monthly_totals(state: TopNState, to_month: int = 12) -> List[int]:
+    """Serie enero..to_month con el monto total del mes (base de los gráficos anuales)."""
+    out: List[int] = []
+    for m in range(1, int(to_month) + 1):
+        entry = state.months.get(f"{m:02d}")
+        out.append(sum(v[0] for v in entry["totals"].values()) if entry else 0)
+    return out
+
+
+def report_tops(storage_root: Path, company_id: str, year: int, month: int, n: int = 5) -> Dict[str, Dict[str, List[Dict]]]:
+    """Bloques {"compras": {...}, "ventas": {...}} con top5_anual/top5_mes para sii_report_pdf."""
+    out: Dict[str, Dict[str, List[Dict]]] = {}
+    for section in SECTIONS:
+        state = update_section(storage_root, company_id, section, year, to_month=month)
+        out[section] = {
+            "top5_anual": [e.as_report_row() for e in top_ytd(state, month, n)],
+            "top5_mes": [e.as_report_row() for e in top_month(state, month, n)],
+        }
+    return out
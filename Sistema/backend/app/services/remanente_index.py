@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backend.app.services import retention, storage_io
+from backend.app.services.f29_compacto import parse_compacto
+from backend.app.services.timing import span
+
+# Índice de remanente (código 77) por empresa, construido una vez desde
+# f29_remanente/<año>/<MM>/ (remanente_prev_*.json, F29_COMPACTO_*.html, PDFs, .txt).
+# Persistido en f29_remanente/index.json junto a la firma (tamaño, mtime) de cada
+# archivo: solo se vuelve a extraer lo que cambió y los PDF se leen una vez.
+INDEX_FILENAME = "index.json"
+INDEX_VERSION = 1
+
+# Prioridad por extensión como CompanyStorage.pick_latest (último por nombre),
+# salvo que entre HTML el compacto manda sobre RESULTADOS_*.html.
+SOURCE_PATTERNS = ("*.json", "*.html", "*.pdf", "*.txt")
+
+_TEXT_REGEXES = (
+    re.compile(r"remanente[^0-9]*([0-9\.\,]+)", re.IGNORECASE),
+    re.compile(r"codigo\s*77[^0-9]*([0-9\.\,]+)", re.IGNORECASE),
+)
+_FOLIO_RE = re.compile(r">\s*(\d{6,})\s*<")
+
+_MEMO: Dict[Path, Tuple[Tuple, "RemanenteIndex"]] = {}
+_MEMO_LOCK = threading.Lock()
+
+
+@dataclass
+class RemanenteEntry:
+    target_year: int
+    target_month: int
+    codigo_77: Optional[int]
+    folio: Optional[str]
+    source: str  # ruta relativa a f29_remanente/
+    kind: str  # json | compacto | html | pdf | txt
+
+
+# ----------------------------
+# Extracción por archivo
+# ----------------------------
+def _money(value: object) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value))
+    s = str(value).strip()
+    digits = re.sub(r"[^\d]", "", s)
+    if not digits:
+        return None
+    negative = "-" in s or (s.startswith("(") and s.endswith(")"))
+    return -int(digits) if negative else int(digits)
+
+
+@lru_cache(maxsize=256)
+def _pdf_text(path: str, size: int, mtime_ns: int) -> Optional[str]:
+    """Texto del PDF (pdfplumber, opcional). Cacheado por (ruta, tamaño, mtime)."""
+    try:
+        import pdfplumber  # optional
+    except Exception:
+        return None
+    try:
+        with pdfplumber.open(path) as pdf:
+            return "\n".join(page.extract_text() or "" for page in pdf.pages)
+    except Exception:
+        return None
+
+
+def pdf_text(path: Path) -> Optional[str]:
+    st = Path(path).stat()
+    return _pdf_text(str(path), st.st_size, st.st_mtime_ns)
+
+
+def _from_text(text: str) -> Optional[int]:
+    for regex in _TEXT_REGEXES:
+        match = regex.search(text)
+        if match:
+            return _money(match.group(1))
+    return None
+
+
+def _kind(path: Path) -> str:
+    suffix = storage_io.logical_suffix(path)
+    if suffix == ".json":
+        return "json"
+    if suffix == ".pdf":
+        return "pdf"
+    if suffix in (".html", ".htm") and "compacto" in path.name.lower():
+        return "compacto"
+    return "html" if suffix in (".html", ".htm") else "txt"
+
+
+def extract_from_file(path: Path) -> Tuple[Optional[int], Optional[str]]:
+    """(codigo_77, folio) de un artefacto de remanente. Nunca lanza."""
+    kind = _kind(path)
+    try:
+        if kind == "json":
+            data = json.loads(storage_io.read_text(path))
+            value = data.get("codigo_77_remanente")
+            if value is None:
+                value = data.get("codigo_77")
+            folio = data.get("folio")
+            return _money(value), str(folio) if folio else None
+        if kind == "pdf":
+            text = pdf_text(path)
+            return (_from_text(text) if text else None), None
+        text = storage_io.read_text(path, errors="ignore")
+    except Exception:
+        return None, None
+
+    folio_match = _FOLIO_RE.search(text) if kind != "txt" else None
+    folio = folio_match.group(1) if folio_match else None
+    if kind == "compacto":
+        form = parse_compacto(text)
+        if 77 in form.codes:
+            return form.codes[77], form.folio or folio
+    return _from_text(text), folio
+
+
+# ----------------------------
+# Índice
+# ----------------------------
+class RemanenteIndex:
+    def __init__(self, entries: Optional[Dict[str, RemanenteEntry]] = None) -> None:
+        self.entries: Dict[str, RemanenteEntry] = entries or {}
+
+    @staticmethod
+    def key(year: int, month: int) -> str:
+        return f"{int(year)}{int(month):02d}"
+
+    def get(self, year: int, month: int) -> Optional[RemanenteEntry]:
+        return self.entries.get(self.key(year, month))
+
+    def codigo_77(self, year: int, month: int) -> Optional[int]:
+        entry = self.get(year, month)
+        return entry.codigo_77 if entry else None
+
+    def year(self, year: int) -> Dict[int, Optional[int]]:
+        return {m: self.codigo_77(year, m) for m in range(1, 13) if self.get(year, m)}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _rem_root(storage_root: Path, company_id: str) -> Path:
+    return Path(storage_root) / "companies" / company_id / "f29_remanente"
+
+
+def index_path(storage_root: Path, company_id: str) -> Path:
+    return _rem_root(storage_root, company_id) / INDEX_FILENAME
+
+
+def _pick_source(month_dir: Path) -> Optional[Path]:
+    for pattern in SOURCE_PATTERNS:
+        matches = storage_io.glob(month_dir, pattern)
+        if pattern == "*.html":
+            # Los RESULTADOS_*.html solo listan folios; si hay compacto, ese manda.
+            compacto = [p for p in matches if "compacto" in p.name.lower()]
+            matches = compacto or matches
+        if matches:
+            return matches[-1]
+    return None
+
+
+def _sources(root: Path) -> Dict[str, Path]:
+    out: Dict[str, Path] = {}
+    if not root.exists():
+        return out
+    for ydir in sorted(p for p in root.iterdir() if p.is_dir() and p.name.isdigit()):
+        for mdir in sorted(p for p in ydir.iterdir() if p.is_dir() and p.name.isdigit()):
+            src = _pick_source(mdir)
+            if src:
+                out[RemanenteIndex.key(int(ydir.name), int(mdir.name))] = src
+    return out
+
+
+def _signature(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _read_index(path: Path) -> Dict[str, Dict]:
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    if data.get("version") != INDEX_VERSION:
+        return {}
+    return data.get("periods") or {}
+
+
+def load_index(storage_root: Path, company_id: str, *, rebuild: bool = False, persist: bool = True) -> RemanenteIndex:
+    """
+    Índice período objetivo -> RemanenteEntry de la empresa. Reutiliza memoria del
+    proceso e index.json; solo re-extrae los períodos cuyo archivo cambió.
+    """
+    root = _rem_root(storage_root, company_id)
+    out_path = root / INDEX_FILENAME
+    if root.exists():
+        for archive in root.glob("[0-9][0-9][0-9][0-9].zip"):
+            retention.ensure_year(storage_root, company_id, "f29_remanente", int(archive.stem))
+    sources = _sources(root)
+    signatures = {k: _signature(p) for k, p in sources.items()}
+    memo_key = tuple(sorted((k, str(sources[k]), tuple(s)) for k, s in signatures.items()))
+
+    if not rebuild:
+        with _MEMO_LOCK:
+            hit = _MEMO.get(out_path)
+        if hit and hit[0] == memo_key:
+            return hit[1]
+
+    previous = {} if rebuild else _read_index(out_path)
+    periods: Dict[str, Dict] = {}
+    changed = set(previous) != set(sources)
+    for key, path in sources.items():
+        rel = path.relative_to(root).as_posix()
+        old = previous.get(key)
+        if old and old.get("source") == rel and old.get("sig") == signatures[key]:
+            periods[key] = old
+            continue
+        with span("remanente_extract", source="remanente_index", file=path.name):
+            codigo_77, folio = extract_from_file(path)
+        periods[key] = {
+            "target_year": int(key[:4]),
+            "target_month": int(key[4:]),
+            "codigo_77": codigo_77,
+            "folio": folio,
+            "source": rel,
+            "kind": _kind(path),
+            "sig": signatures[key],
+        }
+        changed = True
+
+    if persist and changed and sources:
+        payload = {"version": INDEX_VERSION, "periods": dict(sorted(periods.items()))}
+        out_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    index = RemanenteIndex(
+        {k: RemanenteEntry(**{f: v for f, v in p.items() if f != "sig"}) for k, p in periods.items()}
+    )
+    with _MEMO_LOCK:
+        _MEMO[out_path] = (memo_key, index)
+    return index
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.app.services import chart_cache, rcv_dataset, rcv_topn, ytd_rollup
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.monthly_tax_pdf import MONTH_LABELS, build_monthly_tax_summary
+from backend.app.services.remanente_index import RemanenteIndex
+from backend.app.services.sii_report_pdf import build_tax_report_pdf
+from backend.app.services.timing import span
+
+# Reporte completo (4 páginas de sii_report_pdf) para una empresa-período.
+# Arma report_data en una sola pasada desde los datos ya parseados/cacheados:
+#   resumen    <- build_monthly_tax_summary (RCV del mes vía rcv_dataset + BHE + remanente del índice)
+#   top-N      <- rcv_topn (estado incremental por sección; se lee solo lo nuevo)
+#   gráficos   <- chart_cache (PNG cacheado por hash de la serie anual)
+#   honorarios <- el mismo resumen (no se vuelve a abrir el HTML BHE)
+#   acumulado  <- ytd_rollup (el resumen del mes se registra; el resto del año ya está)
+
+
+@dataclass
+class PeriodInputs:
+    ventas: Path
+    compras: Path
+    bhe: Optional[Path]
+    boletas: Optional[Path] = None
+
+    def files(self) -> Dict[str, Optional[Path]]:
+        return {"ventas": self.ventas, "compras": self.compras, "bhe": self.bhe, "boletas": self.boletas}
+
+
+# ----------------------------
+# Insumos
+# ----------------------------
+def resolve_inputs(
+    storage_root: Path, company_id: str, year: int, month: int, *, storage: Optional[CompanyStorage] = None
+) -> PeriodInputs:
+    cs = storage or CompanyStorage(Path(storage_root), company_id)
+    ventas = cs.ventas(year, month)
+    compras = cs.compras(year, month)
+    if not ventas or not compras:
+        raise FileNotFoundError(f"No se encontraron archivos DCV en {cs.month_dir('dcv', year, month)}")
+    return PeriodInputs(ventas=ventas, compras=compras, bhe=cs.bhe(year, month), boletas=cs.boletas(year, month))
+
+
+def razon_social(storage_root: Path, company_id: str) -> str:
+    return CompanyStorage(Path(storage_root), company_id).razon_social()
+
+
+def month_label(year: int, month: int) -> str:
+    return f"{MONTH_LABELS.get(month, str(month))} {year}"
+
+
+# ----------------------------
+# report_data
+# ----------------------------
+def _resumen_block(summary: Dict[str, Any]) -> Dict[str, Any]:
+    def items(section: str) -> List[Dict[str, Any]]:
+        return [
+            {"concepto": i["concepto"], "neto": i["neto"], "iva": i["iva"], "total": i["total"], "code": i.get("code")}
+            for i in summary[section]["items"]
+        ]
+
+    return {
+        "ventas_items": items("ventas"),
+        "compras_items": items("compras"),
+        "ppm": summary["ppm"],
+        "honorarios": summary["honorarios"],
+        "remanente": summary["compras"].get("remanente"),
+        "totales": summary["totales"],
+        "total_a_pagar": summary["totales"]["total_a_pagar"],
+    }
+
+
+def summarize_period(
+    storage_root: Path,
+    company_id: str,
+    year: int,
+    month: int,
+    *,
+    company_name: str,
+    ppm_factor: Optional[float] = None,
+    rem_index: Optional[RemanenteIndex] = None,
+    storage: Optional[CompanyStorage] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    (resumen del mes, firma de insumos). La firma es la que usa ytd_rollup para decidir
+    si un mes ya acumulado sigue vigente.
+    """
+    cs = storage or CompanyStorage(Path(storage_root), company_id)
+    inputs = resolve_inputs(storage_root, company_id, year, month, storage=cs)
+    rem_index = rem_index or cs.remanente_index()
+    rem_entry = rem_index.get(year, month)
+    remanente = rem_entry.codigo_77 if rem_entry else None
+    # Cada RCV se parsea una sola vez hacia el dataset columnar; el resumen sale de ahí.
+    dataset = rcv_dataset.RCVDataset(storage_root, company_id, year)
+    dcv_summaries = {}
+    for section, path in (("ventas", inputs.ventas), ("compras", inputs.compras)):
+        rcv_dataset.ingest_month(storage_root, company_id, section, year, month, path)
+        dcv_summaries[section] = dataset.dcv_summary(section, month)
+    summary = build_monthly_tax_summary(
+        company_name=company_name,
+        period_year=year,
+        period_month=month,
+        ventas_path=str(inputs.ventas),
+        compras_path=str(inputs.compras),
+        boletas_honorarios_path=str(inputs.bhe) if inputs.bhe else None,
+        remanente_override=remanente,
+        ppm_factor=ppm_factor,
+        dcv_summaries=dcv_summaries,
+    )
+    sources = ytd_rollup.sources_signature(inputs.files(), remanente=remanente, ppm_factor=ppm_factor)
+    return summary, sources
+
+
+def update_ytd(
+    storage_root: Path,
+    company_id: str,
+    year: int,
+    to_month: int,
+    *,
+    company_name: Optional[str] = None,
+    ppm_factor: Optional[float] = None,
+    storage: Optional[CompanyStorage] = None,
+) -> ytd_rollup.YTDState:
+    """
+    Sincroniza el acumulado enero..to_month. Solo se resumen los meses nuevos o cuyos
+    insumos cambiaron (firma distinta); el acumulado se ajusta con la diferencia.
+    """
+    storage_root = Path(storage_root)
+    cs = storage or CompanyStorage(storage_root, company_id)
+    cs.prefetch_year("dcv", year)
+    cs.prefetch_year("bhe", year)
+    name = company_name or cs.razon_social()
+    rem_index = cs.remanente_index()
+    state = ytd_rollup.load_state(storage_root, company_id, year)
+    changed = False
+    with span("aggregation", source="ytd_rollup") as rec:
+        summarized = 0
+        for month in range(1, int(to_month) + 1):
+            try:
+                inputs = resolve_inputs(storage_root, company_id, year, month, storage=cs)
+            except FileNotFoundError:
+                changed |= ytd_rollup.drop_month(state, month)
+                continue
+            entry = rem_index.get(year, month)
+            remanente = entry.codigo_77 if entry else None
+            sources = ytd_rollup.sources_signature(inputs.files(), remanente=remanente, ppm_factor=ppm_factor)
+            if ytd_rollup.is_current(state, month, sources):
+                continue
+            summary, sources = summarize_period(
+                storage_root, company_id, year, month,
+                company_name=name, ppm_factor=ppm_factor, rem_index=rem_index, storage=cs,
+            )
+            changed |= ytd_rollup.apply_month(state, month, ytd_rollup.rollup_from_summary(summary, sources))
+            summarized += 1
+        rec["months"] = summarized
+    if changed:
+        ytd_rollup.save_state(storage_root, company_id, state)
+    return state
+
+
+def build_report_data(
+    storage_root: Path,
+    company_id: str,
+    year: int,
+    month: int,
+    *,
+    company_name: Optional[str] = None,
+    top_n: int = 5,
+    ppm_factor: Optional[float] = None,
+    with_charts: bool = True,
+) -> Dict[str, Any]:
+    """
+    report_data consolidado para build_tax_report_pdf. Cada insumo se calcula una vez
+    y se comparte entre páginas (el estado top-N alimenta también el gráfico).
+    """
+    storage_root = Path(storage_root)
+    cs = CompanyStorage(storage_root, company_id)
+    name = company_name or cs.razon_social()
+    summary, sources = summarize_period(
+        storage_root, company_id, year, month, company_name=name, ppm_factor=ppm_factor, storage=cs
+    )
+    ytd_rollup.record_month(storage_root, company_id, summary, sources)
+
+    data: Dict[str, Any] = {
+        "company_id": company_id,
+        "period": {"year": year, "month": month},
+        "resumen": _resumen_block(summary),
+        "honorarios": summary["honorarios"],
+    }
+    with span("aggregation", source="report_topn"):
+        for section in rcv_topn.SECTIONS:
+            state = rcv_topn.update_section(storage_root, company_id, section, year, to_month=month, storage=cs)
+            block: Dict[str, Any] = {
+                "top5_anual": [e.as_report_row() for e in rcv_topn.top_ytd(state, month, top_n)],
+                "top5_mes": [e.as_report_row() for e in rcv_topn.top_month(state, month, top_n)],
+                "serie_mensual": rcv_topn.monthly_totals(state, month),
+            }
+            if with_charts:
+                chart = chart_cache.monthly_chart(storage_root, company_id, section, year, block["serie_mensual"])
+                block["chart_path"] = str(chart)
+            data[section] = block
+    ytd_state = update_ytd(storage_root, company_id, year, month, company_name=name, ppm_factor=ppm_factor, storage=cs)
+    data["ytd"] = ytd_rollup.ytd_block(ytd_state, month)
+    return data
+
+
+def generate_full_report(
+    storage_root: Path,
+    company_id: str,
+    year: int,
+    month: int,
+    *,
+    company_name: Optional[str] = None,
+    top_n: int = 5,
+    ppm_factor: Optional[float] = None,
+) -> Path:
+    """Calcula report_data y renderiza el PDF completo en companies/<id>/Resumen/."""
+    storage_root = Path(storage_root)
+    name = company_name or razon_social(storage_root, company_id)
+    data = build_report_data(
+        storage_root, company_id, year, month, company_name=name, top_n=top_n, ppm_factor=ppm_factor
+    )
+    with span("pdf_render", source="full_report") as rec:
+        pdf_path = build_tax_report_pdf(
+            company_id=company_id,
+            razon_social=name,
+            year=year,
+            month=month,
+            month_label=month_label(year, month),
+            report_data=data,
+            storage_root=storage_root,
+        )
+        rec["file"] = pdf_path.name
+        rec["bytes"] = pdf_path.stat().st_size
+    return pdf_path
@@ -0,0 +1,433 @@
+from __future__ import annotations
+
+import json
+import re
+import shutil
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.app.services import storage_io
+
+# Retención y compactación de storage/companies/<id>.
+# Cada tipo de artefacto tiene una política (antigüedad máxima en días y, para las corridas,
+# cuántas conservar siempre). plan() solo arma la lista de acciones; apply() la ejecuta.
+#   run_downloads  runs/<uuid>/downloads/*           se borran (las fuentes viven en dcv/bhe/...)
+#   run_logs       runs/<uuid>/ completo             se borra, conservando las últimas keep_last
+#   evidence       evidence/*, <fuente>/**/*.png     se borran y se limpia su ruta en el manifest
+#   report_data    Resumen/report_data_*.json        se borran (el PDF queda)
+#   superseded     dcv/<año>/<MM> re-descargas       se borran las que el selector ya no usa
+#   compact        <fuente>/<año>/<MM>/              el mes se agrega al archivo anual <fuente>/<año>.zip
+#                                                    (desactivado por defecto: activar con compact=<días>)
+# Al compactar, las rutas del manifest del mes pasan a "<fuente>/<año>.zip!<año>/<MM>/<archivo>"
+# (siguen siendo verdaderas para _already, así que no se re-descarga) y la entrada original
+# queda dentro del zip (_manifest/<MM>.json) para restore_year(). Los lectores
+# (CompanyStorage, bhe_store, remanente_index) llaman ensure_year() antes de leer un año:
+# si está compactado se restaura completo, así un mes archivado nunca se lee como vacío.
+POLICY_FILENAME = "retention.json"
+ARCHIVE_MANIFEST_DIR = "_manifest"
+COMPACT_SOURCES = {"dcv": "dcv", "bhe": "bhe", "f29_remanente": "remanente"}
+EVIDENCE_SOURCES = ("dcv", "bhe", "f29_remanente")
+_DAY = 86400.0
+_RESTORE_LOCK = threading.Lock()
+
+
+@dataclass
+class Policy:
+    max_age_days: Optional[int]
+    keep_last: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_days is not None and self.max_age_days >= 0
+
+
+DEFAULT_POLICIES: Dict[str, Policy] = {
+    "run_downloads": Policy(max_age_days=14),
+    "run_logs": Policy(max_age_days=180, keep_last=20),
+    "evidence": Policy(max_age_days=30),
+    "report_data": Policy(max_age_days=90),
+    "superseded": Policy(max_age_days=7),
+    "compact": Policy(max_age_days=None),
+}
+
+
+@dataclass
+class Action:
+    kind: str
+    company_id: str
+    path: Path
+    bytes: int = 0
+    detail: str = ""
+
+
+@dataclass
+class RetentionReport:
+    actions: List[Action] = field(default_factory=list)
+    applied: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def bytes_by_kind(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for a in self.actions:
+            out[a.kind] = out.get(a.kind, 0) + a.bytes
+        return out
+
+
+# ----------------------------
+# Políticas
+# ----------------------------
+def load_policies(storage_root: Path, overrides: Optional[Dict[str, Optional[int]]] = None) -> Dict[str, Policy]:
+    """
+    DEFAULT_POLICIES + <storage>/retention.json ({"run_logs": {"max_age_days": 365, "keep_last": 50}})
+    + overrides {tipo: días} (None o negativo desactiva el tipo).
+    """
+    policies = {k: Policy(v.max_age_days, v.keep_last) for k, v in DEFAULT_POLICIES.items()}
+    cfg_path = Path(storage_root) / POLICY_FILENAME
+    if cfg_path.exists():
+        try:
+            cfg = json.loads(cfg_path.read_text(encoding="utf-8"))
+        except Exception:
+            cfg = {}
+        for kind, values in (cfg or {}).items():
+            if kind in policies and isinstance(values, dict):
+                policies[kind] = Policy(
+                    max_age_days=values.get("max_age_days", policies[kind].max_age_days),
+                    keep_last=int(values.get("keep_last", policies[kind].keep_last)),
+                )
+    for kind, days in (overrides or {}).items():
+        if kind not in policies:
+            raise ValueError(f"Tipo de artefacto desconocido: {kind}")
+        policies[kind] = Policy(max_age_days=days, keep_last=policies[kind].keep_last)
+    return policies
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def _age_days(path: Path, now: float) -> float:
+    try:
+        return (now - path.stat().st_mtime) / _DAY
+    except OSError:
+        return 0.0
+
+
+def _size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _basename(value: str) -> str:
+    """Nombre lógico (sin .gz/.zst) de una ruta del manifest (guardadas con separador de Windows)."""
+    return storage_io.logical_path(Path(re.split(r"[\\/]", value)[-1])).name
+
+
+def _manifest_path(company_dir: Path, source: str) -> Path:
+    return company_dir / source / "manifest.json"
+
+
+def _load_json(path: Path) -> Dict:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _save_json(path: Path, data: Dict) -> None:
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _rewrite_manifest(
+    company_dir: Path, source: str, year: str, month: str, fn: Callable[[str], Optional[str]]
+) -> None:
+    """Aplica fn a cada ruta (string) de la entrada <año>/<MM> del manifest de la fuente."""
+    mp = _manifest_path(company_dir, source)
+    data = _load_json(mp)
+    entry = data.get(COMPACT_SOURCES.get(source, source), {}).get(year, {}).get(month)
+    if not isinstance(entry, dict):
+        return
+    changed = False
+    for key, value in list(entry.items()):
+        if isinstance(value, str):
+            new = fn(value)
+            if new != value:
+                entry[key] = new
+                changed = True
+    if changed:
+        _save_json(mp, data)
+
+
+def _year_month_of(path: Path, source_dir: Path) -> Optional[Tuple[str, str]]:
+    try:
+        parts = path.relative_to(source_dir).parts
+    except ValueError:
+        return None
+    if len(parts) >= 3 and parts[0].isdigit() and parts[1].isdigit():
+        return parts[0], parts[1]
+    return None
+
+
+# ----------------------------
+# Plan
+# ----------------------------
+def _plan_runs(company_id: str, company_dir: Path, policies: Dict[str, Policy], now: float) -> List[Action]:
+    runs_dir = company_dir / "runs"
+    if not runs_dir.is_dir():
+        return []
+    runs = sorted((p for p in runs_dir.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True)
+    actions: List[Action] = []
+    logs = policies["run_logs"]
+    removed = set()
+    if logs.enabled:
+        for run in runs[logs.keep_last:]:
+            if _age_days(run, now) > logs.max_age_days:
+                actions.append(Action("run_logs", company_id, run, _size(run)))
+                removed.add(run)
+    dl = policies["run_downloads"]
+    if dl.enabled:
+        for run in runs:
+            downloads = run / "downloads"
+            if run in removed or not downloads.is_dir():
+                continue
+            for f in downloads.iterdir():
+                if _age_days(f, now) > dl.max_age_days:
+                    actions.append(Action("run_downloads", company_id, f, _size(f)))
+    return actions
+
+
+def _plan_evidence(company_id: str, company_dir: Path, policy: Policy, now: float) -> List[Action]:
+    if not policy.enabled:
+        return []
+    candidates: List[Path] = []
+    ev = company_dir / "evidence"
+    if ev.is_dir():
+        candidates.extend(p for p in ev.rglob("*") if p.is_file())
+    for source in EVIDENCE_SOURCES:
+        src = company_dir / source
+        if src.is_dir():
+            candidates.extend(src.rglob("*.png"))
+    return [
+        Action("evidence", company_id, p, _size(p))
+        for p in sorted(candidates)
+        if _age_days(p, now) > policy.max_age_days
+    ]
+
+
+def _plan_report_data(company_id: str, company_dir: Path, policy: Policy, now: float) -> List[Action]:
+    if not policy.enabled:
+        return []
+    out_dir = company_dir / "Resumen"
+    if not out_dir.is_dir():
+        return []
+    return [
+        Action("report_data", company_id, p, _size(p))
+        for p in sorted(out_dir.glob("report_data_*.json"))
+        if _age_days(p, now) > policy.max_age_days
+    ]
+
+
+# Mismos selectores que rcv_topn/report_builder: se usa el último de cada patrón.
+_DCV_PATTERNS = ("RCV_COMPRA_*.csv", "RCV_VENTA_*.csv", "COMPRAS_*.csv", "VENTAS_2*.csv", "VENTAS_BOLETAS_RESUMEN_*.csv")
+
+
+def _plan_superseded(company_id: str, company_dir: Path, policy: Policy, now: float) -> List[Action]:
+    if not policy.enabled:
+        return []
+    dcv = company_dir / "dcv"
+    if not dcv.is_dir():
+        return []
+    actions: List[Action] = []
+    for mdir in sorted(dcv.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]")):
+        for pattern in _DCV_PATTERNS:
+            matches = storage_io.glob(mdir, pattern)
+            for old in matches[:-1]:
+                if _age_days(old, now) > policy.max_age_days:
+                    actions.append(Action("superseded", company_id, old, _size(old), detail=matches[-1].name))
+    return actions
+
+
+def _plan_compact(company_id: str, company_dir: Path, policy: Policy, today: date) -> List[Action]:
+    """Meses cuyo fin es anterior a hoy - max_age_days."""
+    if not policy.enabled:
+        return []
+    cutoff = today - timedelta(days=policy.max_age_days)
+    actions: List[Action] = []
+    for source in COMPACT_SOURCES:
+        src = company_dir / source
+        if not src.is_dir():
+            continue
+        for mdir in sorted(src.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]")):
+            year, month = int(mdir.parent.name), int(mdir.name)
+            if not mdir.is_dir() or not 1 <= month <= 12:
+                continue
+            month_end = date(year + (month == 12), month % 12 + 1, 1)
+            if month_end <= cutoff:
+                actions.append(Action("compact", company_id, mdir, _size(mdir), detail=f"-> {source}/{year}.zip"))
+    return actions
+
+
+def plan(
+    storage_root: Path,
+    company_ids: Optional[Iterable[str]] = None,
+    policies: Optional[Dict[str, Policy]] = None,
+    *,
+    now: Optional[float] = None,
+) -> RetentionReport:
+    storage_root = Path(storage_root)
+    policies = policies or load_policies(storage_root)
+    now = now if now is not None else time.time()
+    today = date.fromtimestamp(now)
+    base = storage_root / "companies"
+    ids = list(company_ids) if company_ids else sorted(p.name for p in base.iterdir() if p.is_dir()) if base.exists() else []
+    report = RetentionReport()
+    for cid in ids:
+        company_dir = base / cid
+        if not company_dir.is_dir():
+            continue
+        report.actions.extend(_plan_runs(cid, company_dir, policies, now))
+        report.actions.extend(_plan_evidence(cid, company_dir, policies["evidence"], now))
+        report.actions.extend(_plan_report_data(cid, company_dir, policies["report_data"], now))
+        report.actions.extend(_plan_superseded(cid, company_dir, policies["superseded"], now))
+        report.actions.extend(_plan_compact(cid, company_dir, policies["compact"], today))
+    return report
+
+
+# ----------------------------
+# Ejecución
+# ----------------------------
+def _remove(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def _forget_file(company_dir: Path, path: Path, replacement: Optional[Path] = None) -> None:
+    """
+    Ajusta el manifest que referencia un archivo borrado: apunta a `replacement` (re-descarga
+    vigente) o queda en None (evidencia).
+    """
+    name = storage_io.logical_path(path).name
+    for source in COMPACT_SOURCES:
+        ym = _year_month_of(path, company_dir / source)
+        if ym:
+            def fix(v: str) -> Optional[str]:
+                if _basename(v) != name:
+                    return v
+                if replacement is None:
+                    return None
+                folder = v[: len(v) - len(re.split(r"[\\/]", v)[-1])]
+                return folder + storage_io.logical_path(replacement).name
+
+            _rewrite_manifest(company_dir, source, ym[0], ym[1], fix)
+            return
+    if path.parent.name == "Resumen":
+        mp = path.parent / "manifest.json"
+        data = _load_json(mp)
+        if data.get("data_path") and _basename(str(data["data_path"])) == path.name:
+            data["data_path"] = None
+            _save_json(mp, data)
+
+
+def compact_month(storage_root: Path, company_id: str, source: str, year: int, month: int) -> Path:
+    """
+    Agrega <fuente>/<año>/<MM>/ al archivo anual <fuente>/<año>.zip, reescribe las rutas
+    del manifest de ese mes hacia el zip y borra el directorio. La entrada original del
+    manifest queda en el zip (_manifest/<MM>.json). Los .gz/.zst se guardan sin recomprimir.
+    """
+    company_dir = Path(storage_root) / "companies" / company_id
+    src = company_dir / source
+    ydir = src / str(year)
+    mdir = ydir / f"{int(month):02d}"
+    mm = mdir.name
+    zip_path = src / f"{year}.zip"
+    manifest = _load_json(_manifest_path(company_dir, source))
+    original = manifest.get(COMPACT_SOURCES[source], {}).get(str(year), {}).get(mm)
+
+    names: Dict[str, str] = {}
+    with zipfile.ZipFile(zip_path, "a") as zf:
+        existing = set(zf.namelist())
+        for path in sorted(p for p in mdir.rglob("*") if p.is_file()):
+            arcname = path.relative_to(src).as_posix()
+            if arcname not in existing:
+                compress_type = zipfile.ZIP_STORED if storage_io.codec_of(path) else zipfile.ZIP_DEFLATED
+                zf.write(path, arcname, compress_type=compress_type)
+            names[storage_io.logical_path(path).name] = arcname
+        meta_name = f"{ARCHIVE_MANIFEST_DIR}/{mm}.json"
+        if original is not None and meta_name not in existing:
+            zf.writestr(meta_name, json.dumps(original, ensure_ascii=False))
+
+    zip_ref = f"{source}/{zip_path.name}"
+    _rewrite_manifest(
+        company_dir, source, str(year), mm,
+        lambda v: f"{zip_ref}!{names[_basename(v)]}" if _basename(v) in names else v,
+    )
+    shutil.rmtree(mdir)
+    if not any(ydir.iterdir()):
+        ydir.rmdir()
+    return zip_path
+
+
+def restore_year(storage_root: Path, company_id: str, source: str, year: int) -> Path:
+    """Inverso de compact_month para todo el año: extrae el zip y devuelve las entradas del manifest."""
+    company_dir = Path(storage_root) / "companies" / company_id
+    src = company_dir / source
+    zip_path = src / f"{year}.zip"
+    if not zip_path.exists():
+        raise FileNotFoundError(f"No existe archivo compactado: {zip_path}")
+    original: Dict[str, Dict] = {}
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.filename.startswith(ARCHIVE_MANIFEST_DIR + "/"):
+                original[Path(info.filename).stem] = json.loads(zf.read(info))
+            else:
+                zf.extract(info, src)
+    if original:
+        mp = _manifest_path(company_dir, source)
+        data = _load_json(mp)
+        data.setdefault(COMPACT_SOURCES[source], {}).setdefault(str(year), {}).update(original)
+        _save_json(mp, data)
+    zip_path.unlink()
+    return src / str(year)
+
+
+def archive_path(storage_root: Path, company_id: str, source: str, year: int) -> Path:
+    return Path(storage_root) / "companies" / company_id / source / f"{int(year)}.zip"
+
+
+def ensure_year(storage_root: Path, company_id: str, source: str, year: int) -> bool:
+    """Restaura <fuente>/<año>.zip (si existe) antes de leer el año. True si restauró."""
+    if source not in COMPACT_SOURCES or not archive_path(storage_root, company_id, source, year).exists():
+        return False
+    with _RESTORE_LOCK:
+        if not archive_path(storage_root, company_id, source, year).exists():
+            return False
+        restore_year(storage_root, company_id, source, year)
+    return True
+
+
+def apply(storage_root: Path, report: RetentionReport) -> RetentionReport:
+    storage_root = Path(storage_root)
+    for action in report.actions:
+        company_dir = storage_root / "companies" / action.company_id
+        try:
+            if action.kind == "compact":
+                ydir = action.path.parent
+                compact_month(storage_root, action.company_id, ydir.parent.name, int(ydir.name), int(action.path.name))
+            else:
+                _remove(action.path)
+                if action.kind == "superseded":
+                    _forget_file(company_dir, action.path, action.path.with_name(action.detail))
+                elif action.kind in ("evidence", "report_data"):
+                    _forget_file(company_dir, action.path)
+            report.applied += 1
+        except Exception as exc:
+            report.errors.append(f"{action.kind} {action.path}: {type(exc).__name__}: {exc}")
+    return report
@@ -18,6 +18,8 @@ from playwright.sync_api import (
     TimeoutError as PlaywrightTimeoutError,
 )
 
+from backend.app.services.timing import span
+
 # Carga variables desde .env aunque el script se ejecute desde otra carpeta
 def _load_dotenv_from_ancestors() -> Optional[Path]:
     candidates = [Path.cwd(), *Path(__file__).resolve().parents]
@@ -279,13 +281,15 @@ def login_and_save_state(
         try:
             # 1) Entrada
             effective_start_url = start_url or DEFAULT_START_URL
-            page.goto(effective_start_url, wait_until="domcontentloaded")
+            with span("navigation", source="auth"):
+                page.goto(effective_start_url, wait_until="domcontentloaded")
 
             # 2) Login (selectores tolerantes)
-            _perform_login(page, rut_norm, clave)
+            with span("login", source="auth"):
+                _perform_login(page, rut_norm, clave)
 
-            # Espera post-login
-            page.wait_for_load_state("networkidle")
+                # Espera post-login
+                page.wait_for_load_state("networkidle")
 
             # (Opcional) evidencia post-login antes del modal
             if evidence:
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import os
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Optional
@@ -8,8 +9,13 @@ from urllib.parse import urlencode
 
 from playwright.sync_api import Page
 
+from backend.app.services import blob_store, storage_io
+from backend.app.services.timing import span
+
 MONTHS = {i: f"{i:02d}" for i in range(1, 13)}
-BHE_MENU_URL = "https://loa.sii.cl/cgi_IMT/TMBCOC_MenuConsultasContribRec.cgi"
+# Base del cgi (override por entorno, ej: servidor mock local)
+BHE_CGI_BASE = os.getenv("SII_BHE_CGI_BASE", "https://loa.sii.cl/cgi_IMT").rstrip("/")
+BHE_MENU_URL = f"{BHE_CGI_BASE}/TMBCOC_MenuConsultasContribRec.cgi"
 
 
 @dataclass
@@ -65,7 +71,7 @@ def _month_dir(storage_dir: Path, company_id: str, year: int, month: int) -> Pat
 # URL builder (la que tú diste)
 # ----------------------------
 def bhe_url(rut_sin_dv: str, year: int, month: int, dv_arrastre: int = 2, pagina: int = 0) -> str:
-    base = "https://loa.sii.cl/cgi_IMT/TMBCOC_InformeMensualBheRec.cgi"
+    base = f"{BHE_CGI_BASE}/TMBCOC_InformeMensualBheRec.cgi"
     qs = {
         "cbanoinformemensual": str(year),
         "cbmesinformemensual": MONTHS[month],
@@ -86,8 +92,9 @@ def _open_bhe_report_from_menu(page: Page, year: int, month: int) -> None:
     Navega al menú de BHE y consulta el informe mensual.
     Esto asegura la redirección/session requerida por el SII.
     """
-    page.goto(BHE_MENU_URL, wait_until="domcontentloaded")
-    page.wait_for_timeout(500)
+    with span("navigation", source="bhe"):
+        page.goto(BHE_MENU_URL, wait_until="domcontentloaded")
+        page.wait_for_timeout(500)
 
     month_sel = page.locator("select[name='cbmesinformemensual']").first
     year_sel = page.locator("select[name='cbanoinformemensual']").first
@@ -101,8 +108,9 @@ def _open_bhe_report_from_menu(page: Page, year: int, month: int) -> None:
         "#cmdconsultar1, input#cmdconsultar1, input[name='cmdconsultar1'], input[type='button'][value*='consultar' i]"
     ).first
     btn.wait_for(state="visible", timeout=15000)
-    btn.click()
-    page.wait_for_timeout(800)
+    with span("consult", source="bhe"):
+        btn.click()
+        page.wait_for_timeout(800)
 
 
 # ----------------------------
@@ -130,7 +138,10 @@ def _click_planilla_and_download_xls(page: Page, out_dir: Path, year: int, month
         suggested += ".xls"
 
     save_path = out_dir / suggested
+    blob_store.detach(save_path)
     dl.save_as(str(save_path))
+    if blob_store.ENABLED:
+        blob_store.adopt(save_path)
     return save_path
 
 
@@ -163,15 +174,18 @@ def fetch_bhe_month(
 
     # URL directa (requiere sesión activa)
     url = bhe_url(rut_sin_dv=rut_sin_dv, year=year, month=month, dv_arrastre=1)
-    page.goto(url, wait_until="domcontentloaded")
-    page.wait_for_timeout(500)
+    with span("navigation", source="bhe"):
+        page.goto(url, wait_until="domcontentloaded")
+        page.wait_for_timeout(500)
 
     art = BHEArtifact(year=year, month=month)
 
     # HTML (fuente única)
     try:
         html_path = out_dir / f"BHE_{year}{MONTHS[month]}.html"
-        html_path.write_text(page.content(), encoding="utf-8")
+        html = page.content()
+        with span("file_write", source="bhe", file=html_path.name, bytes=len(html)):
+            html_path = storage_io.write_text(html_path, html)
         art.saved_html = html_path
     except Exception:
         art.saved_html = None
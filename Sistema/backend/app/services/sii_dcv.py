@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import csv
+import io
 import json
 import os
 import re
@@ -12,7 +13,10 @@ from urllib.parse import unquote_to_bytes
 
 from playwright.sync_api import Page, TimeoutError as PWTimeoutError
 
-DCV_URL = "https://www4.sii.cl/consdcvinternetui/#/index"
+from backend.app.services import storage_io
+from backend.app.services.timing import span
+
+DCV_URL = os.getenv("SII_DCV_URL", "https://www4.sii.cl/consdcvinternetui/#/index")
 MONTHS = {i: f"{i:02d}" for i in range(1, 13)}
 
 # Códigos comunes en DCV (ampliable)
@@ -97,8 +101,9 @@ def _click(page: Page, selectors: List[str], timeout_ms: int = 10000) -> None:
 
 
 def _goto_dcv(page: Page) -> None:
-    page.goto(DCV_URL, wait_until="domcontentloaded")
-    page.wait_for_timeout(800)
+    with span("navigation", source="dcv"):
+        page.goto(DCV_URL, wait_until="domcontentloaded")
+        page.wait_for_timeout(800)
 
 
 def _select_period(page: Page, year: int, month: int) -> None:
@@ -129,19 +134,20 @@ def _select_period(page: Page, year: int, month: int) -> None:
 
 
 def _consult(page: Page) -> None:
-    _click(
-        page,
-        [
-            "button:has-text('Consultar')",
-            "input[type='button'][value*='Consultar' i]",
-            "input[type='submit'][value*='Consultar' i]",
-        ],
-    )
-    try:
-        # SPA del SII puede quedar en "networkidle" tardísimo; espera algo útil.
-        page.wait_for_selector("button:has-text('Descargar Detalles')", timeout=12000)
-    except Exception:
-        page.wait_for_timeout(1500)
+    with span("consult", source="dcv"):
+        _click(
+            page,
+            [
+                "button:has-text('Consultar')",
+                "input[type='button'][value*='Consultar' i]",
+                "input[type='submit'][value*='Consultar' i]",
+            ],
+        )
+        try:
+            # SPA del SII puede quedar en "networkidle" tardísimo; espera algo útil.
+            page.wait_for_selector("button:has-text('Descargar Detalles')", timeout=12000)
+        except Exception:
+            page.wait_for_timeout(1500)
 
 
 def _ensure_section_loaded(page: Page, section: str) -> None:
@@ -229,7 +235,8 @@ def _download_from_data_anchor_matching(
         )
 
     try:
-        page.wait_for_function(_finder_js(), timeout=20000)
+        with span("anchor_wait", source="dcv", match="/".join(req)):
+            page.wait_for_function(_finder_js(), timeout=20000)
     except PWTimeoutError as exc:
         raise DCVDownloadError(
             f"No apareció el anchor de descarga con: {required_substrings}"
@@ -262,7 +269,8 @@ def _download_from_data_anchor_matching(
 
     save_dir.mkdir(parents=True, exist_ok=True)
     path = save_dir / dl_name
-    path.write_bytes(raw)
+    with span("file_write", source="dcv", file=dl_name, bytes=len(raw)):
+        path = storage_io.write_bytes(path, raw)
 
     if DEBUG:
         print(f"[DCV] Guardado: {path.name} ({path.stat().st_size} bytes)")
@@ -280,7 +288,8 @@ def _download_from_data_anchor(page: Page, save_dir: Path) -> Path:
     """
     anchor = page.locator("a[download][href^='data:text/csv']").first
     try:
-        anchor.wait_for(state="attached", timeout=20000)
+        with span("anchor_wait", source="dcv"):
+            anchor.wait_for(state="attached", timeout=20000)
     except PWTimeoutError as exc:
         raise DCVDownloadError("No apareció el anchor de descarga (data:text/csv).") from exc
 
@@ -295,7 +304,8 @@ def _download_from_data_anchor(page: Page, save_dir: Path) -> Path:
 
     save_dir.mkdir(parents=True, exist_ok=True)
     path = save_dir / dl_name
-    path.write_bytes(raw)
+    with span("file_write", source="dcv", file=dl_name, bytes=len(raw)):
+        path = storage_io.write_bytes(path, raw)
 
     if DEBUG:
         print(f"[DCV] Guardado: {path.name} ({path.stat().st_size} bytes)")
@@ -357,12 +367,13 @@ def save_boletas_summary_line(page: Page, save_path: Path) -> Optional[Path]:
             print("[DCV] No se encontró fila de boletas; se omite la captura.")
         return None
 
-    save_path.parent.mkdir(parents=True, exist_ok=True)
-    with save_path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.writer(f)
-        if header:
-            w.writerow(header)
-        w.writerow(boleta_row)
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if header:
+        w.writerow(header)
+    w.writerow(boleta_row)
+    with span("file_write", source="dcv", file=save_path.name):
+        save_path = storage_io.write_text(save_path, buf.getvalue())
 
     if DEBUG:
         print(f"[DCV] Boletas resumen guardado: {save_path.name}")
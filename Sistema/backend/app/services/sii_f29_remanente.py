@@ -1,19 +1,23 @@
 from __future__ import annotations
 
 import json
+import os
 import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from playwright.sync_api import Page
 
+from backend.app.services import f29_compacto, storage_io
+from backend.app.services.timing import span
+
 MONTH_LABELS = {
     1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
     7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
 }
 
-F29_RFI_URL = "https://www4.sii.cl/rfiInternet/consulta/index.html#rfiSelFormularioPeriodo"
+F29_RFI_URL = os.getenv("SII_F29_RFI_URL", "https://www4.sii.cl/rfiInternet/consulta/index.html#rfiSelFormularioPeriodo")
 
 
 @dataclass
@@ -138,63 +142,17 @@ def _open_compacto_popup(page: Page) -> Page:
         page.wait_for_load_state("domcontentloaded", timeout=30000)
         return page
 
-def _compacto_has_codigo_77(compacto_page: Page) -> bool:
-    frame = compacto_page.frame_locator("#printingFrame")
-    # si no existe iframe todavía, fallará el wait_for -> lo capturamos arriba
-    loc = frame.locator("td.celda-codigo", has_text=re.compile(r"^\s*77\s*$"))
-    if loc.count() > 0:
-        return True
-    loc2 = frame.locator("td", has_text=re.compile(r"^\s*77\s*$"))
-    return loc2.count() > 0
-
-def _scroll_to_codigo_77_in_compacto(compacto_page: Page) -> None:
-    frame = compacto_page.frame_locator("#printingFrame")
-
-    # Esperar el iframe/render inicial
-    # (el locator interno fuerza el acceso al frame)
-    target = frame.locator("td.celda-codigo", has_text=re.compile(r"^\s*77\s*$")).first
-    if target.count() == 0:
-        target = frame.locator("td", has_text=re.compile(r"^\s*77\s*$")).first
-
-    # Si no existe, no hacemos scroll (remanente no presente)
-    if target.count() == 0:
-        return
-
-    target.wait_for(state="visible", timeout=30000)
-    target.scroll_into_view_if_needed(timeout=30000)
-    compacto_page.wait_for_timeout(700)
-
-def _extract_codigo_77_from_compacto(compacto_page: Page) -> Optional[int]:
-    frame = compacto_page.frame_locator("#printingFrame")
-
-    codigo_cell = frame.locator("td.celda-codigo", has_text=re.compile(r"^\s*77\s*$")).first
-    if codigo_cell.count() == 0:
-        codigo_cell = frame.locator("td", has_text=re.compile(r"^\s*77\s*$")).first
-
-    if codigo_cell.count() == 0:
-        return None
-
-    row = codigo_cell.locator("xpath=ancestor::tr[1]")
-
-    # Monto suele estar en tabla_td_fixed_b_right
-    value_cell = row.locator("td.tabla_td_fixed_b_right").first
-    txt = None
-    if value_cell.count() > 0:
-        try:
-            txt = (value_cell.inner_text() or "").strip()
-        except Exception:
-            txt = None
-
-    # fallback: último td
-    if not txt:
-        try:
-            tds = row.locator("td")
-            if tds.count() > 0:
-                txt = (tds.nth(tds.count() - 1).inner_text() or "").strip()
-        except Exception:
-            txt = None
-
-    return _to_int_money(txt or "")
+def _printing_frame_html(compacto_page: Page) -> str:
+    """HTML del iframe #printingFrame (ahí están los códigos); si no, el de la página."""
+    try:
+        handle = compacto_page.locator("#printingFrame").first.element_handle(timeout=30000)
+        frame = handle.content_frame() if handle else None
+        if frame is not None:
+            frame.wait_for_load_state("domcontentloaded", timeout=30000)
+            return frame.content()
+    except Exception:
+        pass
+    return compacto_page.content()
 
 
 # ----------------------------
@@ -220,8 +178,9 @@ def fetch_remanente_prev_month(
     out_dir = _out_dir(storage_dir, company_id, target_year, target_month)
 
     # 0) Entrar a la consulta
-    page.goto(F29_RFI_URL, wait_until="domcontentloaded")
-    page.wait_for_timeout(1200)
+    with span("navigation", source="f29"):
+        page.goto(F29_RFI_URL, wait_until="domcontentloaded")
+        page.wait_for_timeout(1200)
 
     # 1) Seleccionar Formulario 29 / Año / Mes por LABEL visible
     # Orden observado (por tus capturas):
@@ -233,14 +192,17 @@ def fetch_remanente_prev_month(
     _select_by_label(page, "select.gwt-ListBox >> nth=2", MONTH_LABELS[prev_month])
 
     # 2) Buscar
-    _click(page, "button:has-text('Buscar Datos Ingresados')", timeout_ms=25000)
-    _wait_results_loaded(page)
+    with span("consult", source="f29"):
+        _click(page, "button:has-text('Buscar Datos Ingresados')", timeout_ms=25000)
+        _wait_results_loaded(page)
 
     # Evidencia resultados
     saved_html_results = None
     try:
         saved_html_results = out_dir / f"RESULTADOS_{prev_year}{prev_month:02d}.html"
-        saved_html_results.write_text(page.content(), encoding="utf-8")
+        html = page.content()
+        with span("file_write", source="f29", file=saved_html_results.name, bytes=len(html)):
+            saved_html_results = storage_io.write_text(saved_html_results, html)
     except Exception:
         pass
 
@@ -256,19 +218,22 @@ def fetch_remanente_prev_month(
         compacto_page = _open_compacto_popup(page)
         compacto_url = compacto_page.url
 
-        # 4) Esperar que cargue printingFrame (o al menos el DOM del compacto)
-        compacto_page.wait_for_timeout(1500)
-
-        # Guardar HTML compacto (útil para auditoría y ajustes futuros)
+        # 4) Un solo content() del #printingFrame; los códigos se leen localmente
+        html = ""
         try:
+            html = _printing_frame_html(compacto_page)
             saved_html_compacto = out_dir / f"F29_COMPACTO_{prev_year}{prev_month:02d}.html"
-            saved_html_compacto.write_text(compacto_page.content(), encoding="utf-8")
+            with span("file_write", source="f29", file=saved_html_compacto.name, bytes=len(html)):
+                saved_html_compacto = storage_io.write_text(saved_html_compacto, html)
         except Exception:
-            pass
+            saved_html_compacto = None
 
-        # 5) Scroll al código 77 (si existe) y extracción
-        _scroll_to_codigo_77_in_compacto(compacto_page)
-        codigo_77 = _extract_codigo_77_from_compacto(compacto_page)
+        # 5) Formulario completo -> store por período; el remanente es el código 77
+        with span("remanente_extract", source="f29"):
+            form = f29_compacto.parse_compacto(html)
+            codigo_77 = form.get(77)
+        if form.codes:
+            f29_compacto.save_form(storage_dir, company_id, prev_year, prev_month, form, html_path=saved_html_compacto)
 
         # Si se abrió popup, lo cerramos para no acumular pestañas
         try:
@@ -315,3 +280,181 @@ def fetch_remanente_prev_month(
         saved_html_compacto=saved_html_compacto,
         compacto_url=compacto_url,
     )
+
+
+# ----------------------------
+# Modo cadena: cada F29 declarado se abre una sola vez
+# ----------------------------
+def _is_rfi_response(resp) -> bool:
+    try:
+        return "rfiInternet" in resp.url and resp.request.resource_type in ("xhr", "fetch")
+    except Exception:
+        return False
+
+
+def _search_filed_period(page: Page, year: int, month: int, *, navigate: bool) -> None:
+    """
+    Selecciona F29/año/mes y busca. Tras la primera búsqueda la app GWT queda
+    cargada: las siguientes solo cambian los ListBox y esperan la respuesta RPC.
+    """
+    if navigate:
+        with span("navigation", source="f29"):
+            page.goto(F29_RFI_URL, wait_until="domcontentloaded")
+            page.wait_for_timeout(1200)
+        _select_by_label(page, "select.gwt-ListBox >> nth=0", "Formulario 29")
+    _select_by_label(page, "select.gwt-ListBox >> nth=1", str(year))
+    _select_by_label(page, "select.gwt-ListBox >> nth=2", MONTH_LABELS[month])
+
+    with span("consult", source="f29"):
+        if navigate:
+            _click(page, "button:has-text('Buscar Datos Ingresados')", timeout_ms=25000)
+        else:
+            try:
+                with page.expect_response(_is_rfi_response, timeout=25000):
+                    _click(page, "button:has-text('Buscar Datos Ingresados')", timeout_ms=25000)
+            except Exception:
+                page.wait_for_timeout(1500)
+        _wait_results_loaded(page)
+
+
+def _scrape_filed_f29(
+    page: Page,
+    storage_dir: Path,
+    company_id: str,
+    year: int,
+    month: int,
+    out_dir: Path,
+    *,
+    navigate: bool,
+) -> Dict:
+    """
+    Busca y abre un F29 declarado. "search_loaded" indica si `page` sigue en la búsqueda
+    GWT (la siguiente consulta puede reutilizarla); no lo está si el compacto se abrió en
+    la misma página en vez de un popup.
+    """
+    _search_filed_period(page, year, month, navigate=navigate)
+    folio = _find_folio_link(page)
+    codes: Dict[int, Optional[int]] = {}
+    html_path = None
+    search_loaded = True
+    if folio:
+        _open_folio_options(page)
+        compacto_page = _open_compacto_popup(page)
+        search_loaded = compacto_page is not page
+        try:
+            html = _printing_frame_html(compacto_page)
+            html_path = out_dir / f"F29_COMPACTO_{year}{month:02d}.html"
+            with span("file_write", source="f29", file=html_path.name, bytes=len(html)):
+                html_path = storage_io.write_text(html_path, html)
+            with span("remanente_extract", source="f29_chain"):
+                form = f29_compacto.parse_compacto(html)
+            codes = form.codes
+            if codes:
+                f29_compacto.save_form(storage_dir, company_id, year, month, form, html_path=html_path)
+        finally:
+            try:
+                if compacto_page is not page:
+                    compacto_page.close()
+            except Exception:
+                pass
+    return {"folio": folio, "codes": codes, "html_path": html_path, "search_loaded": search_loaded}
+
+
+def _filed(entry: Optional[Dict]) -> bool:
+    return bool(entry) and bool(entry.get("folio") or entry.get("codes"))
+
+
+def fetch_remanente_chain(
+    page: Page,
+    storage_dir: Path,
+    company_id: str,
+    target_year: int,
+    target_months: List[int],
+    *,
+    force: bool = False,
+) -> List[RemanenteResult]:
+    """
+    Variante en bloque de fetch_remanente_prev_month: abre una vez cada F29 declarado
+    que falte en la caché (f29_cache.json), guarda sus códigos de la cadena IVA y
+    deriva el remanente de todos los meses objetivo desde esa caché. `force` ignora el
+    manifest y la caché y vuelve a abrir cada F29.
+    Escribe el mismo JSON/manifest por mes objetivo que el modo por mes.
+    """
+    storage_dir = Path(storage_dir)
+    manifest = _load_manifest(storage_dir, company_id)
+    cache = f29_compacto.load_cache(storage_dir, company_id)
+
+    # Un mes cuyo remanente quedó en None (F29 anterior aún sin declarar) se vuelve a
+    # derivar; los períodos declarados siguen en caché y no se reabren.
+    targets = [
+        m for m in target_months
+        if force or not _already(manifest, target_year, m)
+        or manifest["remanente"][str(target_year)][f"{m:02d}"].get("codigo_77") is None
+    ]
+    if not targets:
+        return []
+
+    navigate = True
+    for m in targets:
+        py, pm = _prev_period(target_year, m)
+        if not force:
+            if _filed(f29_compacto.get_period(cache, py, pm)):
+                continue
+            stored = f29_compacto.load_form(storage_dir, company_id, py, pm)
+            if stored is not None:
+                # Ya parseado (modo por mes u offline): no hace falta abrir el SII.
+                f29_compacto.put_period(cache, py, pm, folio=stored.folio, codes=stored.codes, html_path=None)
+                continue
+        out_dir = _out_dir(storage_dir, company_id, target_year, m)
+        scraped = _scrape_filed_f29(page, storage_dir, company_id, py, pm, out_dir, navigate=navigate)
+        navigate = not scraped["search_loaded"]
+        # Un período sin folio ni códigos aún no está declarado: no se cachea, para que
+        # la próxima corrida lo vuelva a consultar.
+        if _filed(scraped):
+            f29_compacto.put_period(
+                cache, py, pm, folio=scraped["folio"], codes=scraped["codes"], html_path=scraped["html_path"]
+            )
+        else:
+            f29_compacto.drop_period(cache, py, pm)
+        f29_compacto.save_cache(storage_dir, company_id, cache)
+
+    results: List[RemanenteResult] = []
+    for m in targets:
+        py, pm = _prev_period(target_year, m)
+        value, folio, origin = f29_compacto.derive_remanente(cache, target_year, m)
+        filed = f29_compacto.get_period(cache, py, pm) or {}
+        html_compacto = filed.get("html")
+        out_dir = _out_dir(storage_dir, company_id, target_year, m)
+        payload = {
+            "target_period": {"year": target_year, "month": m},
+            "prev_period": {"year": py, "month": pm},
+            "folio": folio,
+            "codigo_77_remanente": value,
+            "source": "f29_cache",
+            "derived_from": origin,
+            "results_url": None,
+            "compacto_url": None,
+            "evidence": {"html_results": None, "html_compacto": html_compacto},
+        }
+        saved_json = out_dir / f"remanente_prev_{py}{pm:02d}_para_{target_year}{m:02d}.json"
+        saved_json.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        _mark(manifest, target_year, m, {
+            "prev": f"{py}{pm:02d}",
+            "folio": folio,
+            "codigo_77": value,
+            "json": str(saved_json),
+        })
+        results.append(
+            RemanenteResult(
+                target_year=target_year,
+                target_month=m,
+                prev_year=py,
+                prev_month=pm,
+                folio=folio,
+                codigo_77=value,
+                saved_json=saved_json,
+                saved_html_compacto=Path(html_compacto) if html_compacto else None,
+            )
+        )
+    _save_manifest(storage_dir, company_id, manifest)
+    return results
@@ -0,0 +1,542 @@
+from __future__ import annotations
+
+import csv
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from backend.app.services import storage_io
+from backend.app.services.sii_auth import company_id_from_rut, company_id_legacy_from_rut, normalize_rut
+
+# Servidor local que imita las pantallas del SII que usan los scrapers
+# (login, DCV SPA, BHE cgi, rfiInternet F29 + popup compacto) sirviendo
+# artefactos ya grabados en un storage (real o sintético).
+# Uso: apuntar SII_AUTH_URL / SII_DCV_URL / SII_BHE_CGI_BASE / SII_F29_RFI_URL a este servidor.
+
+SESSION_COOKIE = "mock_sii_rut"
+ERROR_HTML = (
+    "<html><head><title>SII</title></head><body>"
+    "<h3>No ha sido posible completar su solicitud.</h3></body></html>"
+)
+MONTH_LABELS = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
+    7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre",
+}
+
+
+@dataclass
+class MockConfig:
+    data_dir: Path
+    company_id: Optional[str] = None  # empresa por defecto si no hay cookie de sesión
+    latency_ms: int = 0
+    jitter_ms: int = 0
+    error_rate: float = 0.0
+    error_status: int = 503
+    show_update_modal: bool = True
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockStats:
+    started_at: float = field(default_factory=time.time)
+    requests: int = 0
+    errors_injected: int = 0
+    bytes_sent: int = 0
+    by_route: Dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, route: str, nbytes: int, injected: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += nbytes
+            self.by_route[route] = self.by_route.get(route, 0) + 1
+            if injected:
+                self.errors_injected += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            elapsed = max(time.time() - self.started_at, 1e-9)
+            return {
+                "requests": self.requests,
+                "errors_injected": self.errors_injected,
+                "bytes_sent": self.bytes_sent,
+                "elapsed_s": round(elapsed, 3),
+                "requests_per_s": round(self.requests / elapsed, 3),
+                "by_route": dict(sorted(self.by_route.items())),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self.requests = self.errors_injected = self.bytes_sent = 0
+            self.by_route = {}
+
+
+# ----------------------------
+# Acceso a artefactos grabados
+# ----------------------------
+class RecordedData:
+    def __init__(self, data_dir: Path) -> None:
+        self.companies_dir = Path(data_dir) / "companies"
+
+    def company_ids(self) -> List[str]:
+        if not self.companies_dir.exists():
+            return []
+        return sorted(p.name for p in self.companies_dir.iterdir() if p.is_dir())
+
+    def resolve(self, rut: Optional[str]) -> Optional[str]:
+        """RUT (con o sin DV) -> company_id existente en el storage."""
+        if not rut:
+            return None
+        rut = normalize_rut(rut)
+        for cid in (company_id_from_rut(rut), company_id_legacy_from_rut(rut)):
+            if cid and (self.companies_dir / cid).is_dir():
+                return cid
+        num = company_id_legacy_from_rut(rut)
+        for cid in self.company_ids():
+            if cid.split("-", 1)[0] == num:
+                return cid
+        return None
+
+    def profile(self, company_id: str) -> Dict:
+        path = self.companies_dir / company_id / "profile.json"
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            return {"company_id": company_id, "rut": company_id, "razon_social": None}
+
+    def _month_dir(self, company_id: str, source: str, year: int, month: int) -> Path:
+        return self.companies_dir / company_id / source / str(year) / f"{month:02d}"
+
+    def dcv_csv(self, company_id: str, section: str, year: int, month: int) -> Tuple[str, bytes]:
+        prefix = "RCV_COMPRA_REGISTRO_" if section == "compra" else "RCV_VENTA_"
+        d = self._month_dir(company_id, "dcv", year, month)
+        # storage_io: los CSV grabados pueden estar comprimidos (23_compress_storage.py);
+        # se sirven descomprimidos y con su nombre lógico.
+        files = storage_io.glob(d, f"{prefix}*.csv") if d.exists() else []
+        if files:
+            return storage_io.logical_path(files[0]).name, storage_io.read_bytes(files[0])
+        return f"{prefix}{company_id}_{year}{month:02d}.csv", b""
+
+    def boletas_rows(self, company_id: str, year: int, month: int) -> List[List[str]]:
+        path = storage_io.resolve(
+            self._month_dir(company_id, "dcv", year, month) / f"VENTAS_BOLETAS_RESUMEN_{year}{month:02d}.csv"
+        )
+        if not path.exists():
+            return []
+        with storage_io.open_text(path, encoding="utf-8", newline="") as f:
+            return [row for row in csv.reader(f) if row]
+
+    def bhe_html(self, company_id: str, year: int, month: int) -> Optional[bytes]:
+        path = storage_io.resolve(self._month_dir(company_id, "bhe", year, month) / f"BHE_{year}{month:02d}.html")
+        return storage_io.read_bytes(path) if path.exists() else None
+
+    def remanente_for_prev(self, company_id: str, prev_year: int, prev_month: int) -> Dict:
+        """Lee el JSON grabado cuyo período anterior es (prev_year, prev_month)."""
+        ty, tm = (prev_year + 1, 1) if prev_month == 12 else (prev_year, prev_month + 1)
+        d = self._month_dir(company_id, "f29_remanente", ty, tm)
+        files = sorted(d.glob(f"remanente_prev_{prev_year}{prev_month:02d}_para_*.json")) if d.exists() else []
+        if not files:
+            return {}
+        try:
+            return json.loads(files[0].read_text(encoding="utf-8"))
+        except Exception:
+            return {}
+
+
+# ----------------------------
+# Páginas
+# ----------------------------
+def _page(title: str, body: str, script: str = "") -> str:
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>{title}</title>"
+        "<style>.hidden{display:none}</style></head><body>"
+        f"{body}"
+        + (f"<script>{script}</script>" if script else "")
+        + "</body></html>"
+    )
+
+
+def login_page() -> str:
+    body = (
+        '<form method="post" action="/login">'
+        '<label>RUT</label><input type="text" id="rutcntr" name="rut" placeholder="Ej: 12345678-9">'
+        '<label>Clave</label><input type="password" id="clave" name="clave">'
+        '<button type="submit" id="bt_ingresar">Ingresar</button>'
+        "</form>"
+    )
+    return _page("SII | Autenticación", body)
+
+
+def mi_sii_page(razon_social: str, rut: str, show_modal: bool) -> str:
+    modal = ""
+    if show_modal:
+        modal = (
+            '<div id="myModal" class="modal-dialog" role="dialog"><div class="modal-content">'
+            "<p>Antes de continuar, actualice sus datos.</p>"
+            '<button id="btnActualizarMasTarde" '
+            "onclick=\"document.getElementById('myModal').style.display='none'\">"
+            "ACTUALIZAR MÁS TARDE</button></div></div>"
+        )
+    body = (
+        f"{modal}<h2>Mi SII</h2>"
+        "<p>Nombre o razón social</p>"
+        f'<p id="nameCntrInfo2" class="info2">{razon_social}</p>'
+        f'<p class="info2">{rut}</p>'
+    )
+    return _page("Mi SII", body)
+
+
+DCV_SCRIPT = r"""
+const $ = (id) => document.getElementById(id);
+let periodo = null;
+function table(rows) {
+  const t = document.createElement('table');
+  rows.forEach((r, i) => {
+    const tr = document.createElement('tr');
+    r.forEach(c => { const td = document.createElement(i === 0 ? 'th' : 'td'); td.textContent = c; tr.appendChild(td); });
+    t.appendChild(tr);
+  });
+  return t;
+}
+function showTab(name) {
+  $('secCompra').className = name === 'compra' ? '' : 'hidden';
+  $('secVenta').className = name === 'venta' ? '' : 'hidden';
+  window.currentTab = name;
+}
+async function consultar() {
+  const mes = $('periodoMes').value, anho = $('periodoAnho').value;
+  const res = await fetch('/consdcvinternetui/api/resumen?year=' + anho + '&month=' + mes);
+  if (!res.ok) { $('msg').textContent = 'No ha sido posible completar su solicitud.'; return; }
+  const data = await res.json();
+  periodo = { year: anho, month: mes };
+  $('tblCompra').replaceChildren(table(data.compra));
+  $('tblVenta').replaceChildren(table(data.venta));
+  $('resultado').className = '';
+  showTab('compra');
+}
+async function descargarDetalles() {
+  const section = window.currentTab || 'compra';
+  const res = await fetch('/consdcvinternetui/api/detalle?section=' + section + '&year=' + periodo.year + '&month=' + periodo.month);
+  if (!res.ok) { $('msg').textContent = 'No ha sido posible completar su solicitud.'; return; }
+  const name = res.headers.get('X-Filename') || ('RCV_' + section + '.csv');
+  const buf = new Uint8Array(await res.arrayBuffer());
+  let enc = '';
+  for (let i = 0; i < buf.length; i++) enc += '%' + buf[i].toString(16).padStart(2, '0');
+  const a = document.createElement('a');
+  a.setAttribute('download', name);
+  a.setAttribute('href', 'data:text/csv;charset=utf-8,' + enc);
+  a.textContent = name;
+  document.body.appendChild(a);
+}
+$('tabCompra').addEventListener('click', (e) => { e.preventDefault(); showTab('compra'); });
+$('tabVenta').addEventListener('click', (e) => { e.preventDefault(); showTab('venta'); });
+"""
+
+
+def dcv_page(years: List[int]) -> str:
+    months = "".join(f'<option value="{m:02d}">{m:02d}</option>' for m in range(1, 13))
+    year_opts = "".join(f'<option value="{y}">{y}</option>' for y in years)
+    body = (
+        '<form onsubmit="return false">'
+        f'<select id="periodoMes" class="form-control">{months}</select>'
+        f'<select id="periodoAnho" ng-model="periodoAnho" class="form-control">{year_opts}</select>'
+        '<button type="button" onclick="consultar()">Consultar</button>'
+        '</form><div id="msg"></div>'
+        '<div id="resultado" class="hidden">'
+        '<ul><li><a id="tabCompra" role="tab" href="#compra">COMPRA</a></li>'
+        '<li><a id="tabVenta" role="tab" href="#venta">VENTA</a></li></ul>'
+        '<button type="button" onclick="descargarDetalles()">Descargar Detalles</button>'
+        '<div id="secCompra"><h4>RESUMEN REGISTRO DE COMPRAS</h4><div id="tblCompra"></div></div>'
+        '<div id="secVenta" class="hidden"><h4>RESUMEN REGISTRO DE VENTAS</h4><div id="tblVenta"></div></div>'
+        "</div>"
+    )
+    return _page("Registro de Compras y Ventas", body, DCV_SCRIPT)
+
+
+def bhe_menu_page(years: List[int]) -> str:
+    months = "".join(f'<option value="{m:02d}">{m:02d}</option>' for m in range(1, 13))
+    year_opts = "".join(f'<option value="{y}">{y}</option>' for y in years)
+    script = (
+        "function consultar(){var f=document.forms['formulario'];"
+        "location.href='TMBCOC_InformeMensualBheRec.cgi?cbanoinformemensual='+f.cbanoinformemensual.value"
+        "+'&cbmesinformemensual='+f.cbmesinformemensual.value+'&dv_arrastre=1&pagina_solicitada=0&rut_arrastre=';}"
+    )
+    body = (
+        '<form name="formulario">'
+        f'<select name="cbmesinformemensual">{months}</select>'
+        f'<select name="cbanoinformemensual">{year_opts}</select>'
+        '<input type="button" id="cmdconsultar1" name="cmdconsultar1" value="Consultar" onclick="consultar()">'
+        "</form>"
+    )
+    return _page("Boletas de honorarios recibidas", body, script)
+
+
+F29_SCRIPT = r"""
+const sel = document.querySelectorAll('select.gwt-ListBox');
+let folio = null;
+async function buscar() {
+  const year = sel[1].value, month = sel[2].selectedIndex + 1;
+  const res = await fetch('/rfiInternet/api/folio?year=' + year + '&month=' + month);
+  const box = document.getElementById('resultados');
+  if (!res.ok) { box.textContent = 'No ha sido posible completar su solicitud.'; return; }
+  const data = await res.json();
+  folio = data.folio;
+  let html = '<div>RESULTADOS DE LA BÚSQUEDA</div><table><tr><th>Folio</th><th>Período</th></tr>';
+  if (folio) html += '<tr><td><a href="javascript:void(0)" onclick="opciones()">' + folio + '</a></td><td>' + year + '-' + month + '</td></tr>';
+  html += '</table><div id="opciones" class="hidden"><button type="button" onclick="compacto(' + year + ',' + month + ')">Formulario Compacto</button></div>';
+  box.innerHTML = html;
+}
+function opciones() { document.getElementById('opciones').className = ''; }
+function compacto(year, month) {
+  window.open('/rfiInternet/compacto.html?folio=' + folio + '&year=' + year + '&month=' + month, '_blank');
+}
+"""
+
+
+def f29_page(years: List[int]) -> str:
+    year_opts = "".join(f"<option>{y}</option>" for y in years)
+    month_opts = "".join(f"<option>{label}</option>" for label in MONTH_LABELS.values())
+    body = (
+        '<select class="gwt-ListBox"><option>Formulario 22</option><option selected>Formulario 29</option></select>'
+        f'<select class="gwt-ListBox">{year_opts}</select>'
+        f'<select class="gwt-ListBox">{month_opts}</select>'
+        '<button type="button" class="gwt-Button" onclick="buscar()">Buscar Datos Ingresados</button>'
+        '<div id="resultados"></div>'
+    )
+    return _page("Consulta Integral F29", body, F29_SCRIPT)
+
+
+def f29_compacto_page(query: str) -> str:
+    body = f'<iframe id="printingFrame" src="/rfiInternet/compacto_frame.html?{query}" width="900" height="700"></iframe>'
+    return _page("Formulario Compacto", body)
+
+
+def f29_compacto_frame(folio: str, codes: Dict[int, Optional[int]]) -> str:
+    rows = "".join(
+        '<tr><td class="celda-glosa">Código</td>'
+        f'<td class="celda-codigo">{code}</td>'
+        f'<td class="tabla_td_fixed_b_right">{"" if value is None else f"{value:,}".replace(",", ".")}</td></tr>'
+        for code, value in sorted(codes.items())
+    )
+    return _page("F29", f"<p>Folio {folio}</p><table>{rows}</table>")
+
+
+# ----------------------------
+# Handler
+# ----------------------------
+class _MockHandler(BaseHTTPRequestHandler):
+    server: "MockSIIServer"
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+    # -- infraestructura --
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _html(self, html: str, status: int = 200, charset: str = "utf-8", headers: Optional[Dict[str, str]] = None) -> int:
+        body = html.encode(charset, errors="replace")
+        self._send(status, body, f"text/html; charset={charset}", headers)
+        return len(body)
+
+    def _json(self, payload: Dict, status: int = 200) -> int:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8")
+        return len(body)
+
+    def _cookie_rut(self) -> Optional[str]:
+        raw = self.headers.get("Cookie") or ""
+        for part in raw.split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == SESSION_COOKIE and value:
+                return value
+        return None
+
+    def _company(self, rut: Optional[str] = None) -> Optional[str]:
+        data = self.server.data
+        return data.resolve(rut or self._cookie_rut()) or self.server.config.company_id or next(
+            iter(data.company_ids()), None
+        )
+
+    def _maybe_inject(self, route: str) -> bool:
+        cfg = self.server.config
+        delay = cfg.latency_ms + (self.server.rng_uniform(0, cfg.jitter_ms) if cfg.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if route.startswith("/__mock") or cfg.error_rate <= 0:
+            return False
+        return self.server.rng_uniform(0, 1) < cfg.error_rate
+
+    # -- dispatch --
+    def do_HEAD(self) -> None:
+        self.do_GET()
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str) -> None:
+        parts = urlsplit(self.path)
+        route = parts.path
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        injected = self._maybe_inject(route)
+        if injected:
+            nbytes = self._html(ERROR_HTML, status=self.server.config.error_status)
+            self.server.stats.record(route, nbytes, True)
+            return
+        try:
+            nbytes = self._route(method, route, query, parts.query)
+        except Exception as exc:
+            nbytes = self._html(f"<html><body>mock error: {exc}</body></html>", status=500)
+        self.server.stats.record(route, nbytes, False)
+
+    def _route(self, method: str, route: str, q: Dict[str, str], raw_query: str) -> int:
+        cfg = self.server.config
+        data = self.server.data
+        years = self.server.years()
+
+        if route == "/__mock/stats":
+            return self._json(self.server.stats.snapshot())
+        if route == "/__mock/reset":
+            self.server.stats.reset()
+            return self._json({"ok": True})
+
+        # Login
+        if route in ("/", "/login") and method == "GET":
+            return self._html(login_page())
+        if route == "/login" and method == "POST":
+            length = int(self.headers.get("Content-Length") or 0)
+            form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8", errors="ignore")).items()}
+            rut = normalize_rut(form.get("rut", ""))
+            if not rut or not form.get("clave"):
+                return self._html(login_page(), status=401)
+            self.send_response(302)
+            self.send_header("Location", "/mi-sii")
+            self.send_header("Set-Cookie", f"{SESSION_COOKIE}={quote(rut)}; Path=/")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return 0
+        if route == "/mi-sii":
+            cid = self._company()
+            profile = data.profile(cid) if cid else {}
+            return self._html(
+                mi_sii_page(profile.get("razon_social") or "", profile.get("rut") or "", cfg.show_update_modal)
+            )
+
+        # DCV
+        if route.startswith("/consdcvinternetui") and "/api/" not in route:
+            return self._html(dcv_page(years))
+        if route == "/consdcvinternetui/api/resumen":
+            cid = self._company()
+            year, month = int(q.get("year", 0)), int(q.get("month", 0))
+            compra = [["Tipo Documento", "Total Documentos", "Monto Exento", "Monto Neto", "Monto IVA", "Monto Total"]]
+            venta = [list(compra[0])]
+            boletas = data.boletas_rows(cid, year, month) if cid else []
+            venta.extend(r for r in boletas if any("BOLETA" in c.upper() for c in r))
+            return self._json({"compra": compra, "venta": venta})
+        if route == "/consdcvinternetui/api/detalle":
+            cid = self._company()
+            section = "venta" if q.get("section") == "venta" else "compra"
+            name, raw = data.dcv_csv(cid, section, int(q.get("year", 0)), int(q.get("month", 0)))
+            self._send(200, raw, "text/csv", {"X-Filename": name})
+            return len(raw)
+
+        # BHE
+        if route.endswith("/TMBCOC_MenuConsultasContribRec.cgi"):
+            return self._html(bhe_menu_page(years), charset="iso-8859-1")
+        if route.endswith("/TMBCOC_InformeMensualBheRec.cgi"):
+            cid = self._company(q.get("rut_arrastre") or None)
+            year = int(q.get("cbanoinformemensual", 0))
+            month = int(q.get("cbmesinformemensual", 0))
+            raw = data.bhe_html(cid, year, month) if cid else None
+            if raw is None:
+                return self._html(ERROR_HTML, charset="iso-8859-1")
+            self._send(200, raw, "text/html; charset=iso-8859-1")
+            return len(raw)
+
+        # F29 rfiInternet
+        if route == "/rfiInternet/consulta/index.html":
+            return self._html(f29_page(years))
+        if route == "/rfiInternet/api/folio":
+            cid = self._company()
+            payload = data.remanente_for_prev(cid, int(q.get("year", 0)), int(q.get("month", 0))) if cid else {}
+            return self._json({"folio": payload.get("folio")})
+        if route == "/rfiInternet/compacto.html":
+            return self._html(f29_compacto_page(raw_query))
+        if route == "/rfiInternet/compacto_frame.html":
+            cid = self._company()
+            payload = data.remanente_for_prev(cid, int(q.get("year", 0)), int(q.get("month", 0))) if cid else {}
+            codes: Dict[int, Optional[int]] = {1: None, 3: None, 7: None}
+            if payload.get("codigo_77_remanente") is not None:
+                codes[77] = int(payload["codigo_77_remanente"])
+            return self._html(f29_compacto_frame(q.get("folio") or "", codes))
+
+        return self._html(ERROR_HTML, status=404)
+
+
+class MockSIIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: MockConfig, addr: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((addr, int(port)), _MockHandler)
+        self.config = config
+        self.data = RecordedData(config.data_dir)
+        self.stats = MockStats()
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+
+    def rng_uniform(self, a: float, b: float) -> float:
+        with self._rng_lock:
+            return self._rng.uniform(a, b)
+
+    def years(self) -> List[int]:
+        years = set()
+        for cid in self.data.company_ids():
+            for source in ("dcv", "bhe", "f29_remanente"):
+                d = self.data.companies_dir / cid / source
+                if d.exists():
+                    years.update(int(p.name) for p in d.iterdir() if p.is_dir() and p.name.isdigit())
+        years.add(time.localtime().tm_year)
+        # F29 consulta el período anterior: enero necesita el año previo.
+        years.add(min(years) - 1)
+        return sorted(years, reverse=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Variables de entorno para que los scrapers apunten a este servidor."""
+        base = self.base_url
+        return {
+            "SII_AUTH_URL": f"{base}/",
+            "SII_DCV_URL": f"{base}/consdcvinternetui/#/index",
+            "SII_BHE_CGI_BASE": f"{base}/cgi_IMT",
+            "SII_F29_RFI_URL": f"{base}/rfiInternet/consulta/index.html#rfiSelFormularioPeriodo",
+        }
+
+
+def start_mock_server(config: MockConfig, addr: str = "127.0.0.1", port: int = 0) -> MockSIIServer:
+    """Levanta el servidor en un hilo daemon y lo retorna (port=0 -> puerto libre)."""
+    server = MockSIIServer(config, addr, port)
+    thread = threading.Thread(target=server.serve_forever, name="sii-mock", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import json
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Generador de datos SII sintéticos (mismo layout que storage/companies/<id>/...).
+# Sirve para benchmarks y para el servidor mock: no requiere acceso al SII.
+
+MONTHS = {i: f"{i:02d}" for i in range(1, 13)}
+
+COMPRA_HEADER = [
+    "Nro", "Tipo Doc", "Tipo Compra", "RUT Proveedor", "Razon Social", "Folio", "Fecha Docto",
+    "Fecha Recepcion", "Fecha Acuse", "Monto Exento", "Monto Neto", "Monto IVA Recuperable",
+    "Monto Iva No Recuperable", "Codigo IVA No Rec.", "Monto Total", "Monto Neto Activo Fijo",
+    "IVA Activo Fijo", "IVA uso Comun", "Impto. Sin Derecho a Credito", "IVA No Retenido",
+    "Tabacos Puros", "Tabacos Cigarrillos", "Tabacos Elaborados", "NCE o NDE sobre Fact. de Compra",
+    "Codigo Otro Impuesto", "Valor Otro Impuesto", "Tasa Otro Impuesto",
+]
+
+VENTA_HEADER = [
+    "Nro", "Tipo Doc", "Tipo Venta", "Rut cliente", "Razon Social", "Folio", "Fecha Docto",
+    "Fecha Recepcion", "Fecha Acuse Recibo", "Fecha Reclamo", "Monto Exento", "Monto Neto", "Monto IVA",
+    "Monto total", "IVA Retenido Total", "IVA Retenido Parcial", "IVA no retenido", "IVA propio",
+    "IVA Terceros", "RUT Emisor Liquid. Factura", "Neto Comision Liquid. Factura",
+    "Exento Comision Liquid. Factura", "IVA Comision Liquid. Factura", "IVA fuera de plazo",
+    "Tipo Docto. Referencia", "Folio Docto. Referencia", "Num. Ident. Receptor Extranjero",
+    "Nacionalidad Receptor Extranjero", "Credito empresa constructora", "Impto. Zona Franca (Ley 18211)",
+    "Garantia Dep. Envases", "Indicador Venta sin Costo", "Indicador Servicio Periodico",
+    "Monto No facturable", "Total Monto Periodo", "Venta Pasajes Transporte Nacional",
+    "Venta Pasajes Transporte Internacional", "Numero Interno", "Codigo Sucursal",
+    "NCE o NDE sobre Fact. de Compra", "Codigo Otro Imp.", "Valor Otro Imp.", "Tasa Otro Imp.",
+]
+
+BOLETAS_HEADER = ["Tipo Documento", "Total Documentos", "Monto Exento", "Monto Neto", "Monto IVA", "Monto Total"]
+
+# Distribución aproximada observada en las empresas de muestra.
+COMPRA_CODES = ((33, 0.86), (34, 0.09), (61, 0.03), (56, 0.02))
+VENTA_CODES = ((33, 0.93), (34, 0.01), (61, 0.05), (56, 0.01))
+
+_NAME_A = ("COMERCIAL", "SERVICIOS", "INVERSIONES", "DISTRIBUIDORA", "CONSTRUCTORA", "TRANSPORTES", "INGENIERIA")
+_NAME_B = ("ANDES", "PACIFICO", "AUSTRAL", "LOS LAGOS", "DEL NORTE", "SANTA ROSA", "LA FLORIDA", "VALLE CENTRAL")
+_NAME_C = ("SPA", "LIMITADA", "S.A.", "EIRL")
+_PERSON_FIRST = ("MARIA", "JUAN", "CAROLINA", "PEDRO", "ANDREA", "FRANCISCO", "CAMILA", "JOSE")
+_PERSON_LAST = ("GONZALEZ", "MUNOZ", "ROJAS", "DIAZ", "PEREZ", "SOTO", "CONTRERAS", "SILVA")
+
+
+@dataclass
+class SyntheticConfig:
+    year: int = 2025
+    to_month: int = 12
+    compras_rows: int = 200
+    ventas_rows: int = 600
+    bhe_rows: int = 12
+    suppliers: int = 150
+    customers: int = 400
+    with_boletas: bool = True
+    seed: int = 1234
+
+
+@dataclass
+class SyntheticCompany:
+    company_id: str
+    razon_social: str
+    files: List[Path]
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def rut_dv(num: int) -> str:
+    """Dígito verificador módulo 11."""
+    total, factor = 0, 2
+    for digit in reversed(str(num)):
+        total += int(digit) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - (total % 11)
+    return {11: "0", 10: "K"}.get(dv, str(dv))
+
+
+def _rut(rng: random.Random, low: int = 60000000, high: int = 99999999) -> str:
+    num = rng.randint(low, high)
+    return f"{num}-{rut_dv(num)}"
+
+
+def _company_name(rng: random.Random) -> str:
+    return f"{rng.choice(_NAME_A)} {rng.choice(_NAME_B)} {rng.choice(_NAME_C)}"
+
+
+def _person_name(rng: random.Random) -> str:
+    return f"{rng.choice(_PERSON_FIRST)} {rng.choice(_PERSON_LAST)} {rng.choice(_PERSON_LAST)}"
+
+
+def _pick_code(rng: random.Random, table: Tuple[Tuple[int, float], ...]) -> int:
+    x = rng.random()
+    acc = 0.0
+    for code, weight in table:
+        acc += weight
+        if x <= acc:
+            return code
+    return table[0][0]
+
+
+def _miles(n: int) -> str:
+    return f"{int(n):,}".replace(",", ".")
+
+
+def _date(year: int, month: int, rng: random.Random) -> str:
+    return f"{rng.randint(1, 28):02d}/{month:02d}/{year}"
+
+
+def _amounts(rng: random.Random, code: int, scale: int) -> Tuple[int, int, int, int]:
+    """(exento, neto, iva, total) en CLP enteros."""
+    base = int(rng.lognormvariate(11.0, 1.1)) % scale + 1000
+    if code == 34:
+        return base, 0, 0, base
+    iva = int(round(base * 0.19))
+    return 0, base, iva, base + iva
+
+
+def _write_csv_with_trailing_column(path: Path, header: List[str], rows: List[List[str]]) -> None:
+    """
+    Replica el quirk del SII: cada fila de datos trae un ';' extra al final
+    (una columna más que el header).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", newline="") as f:
+        f.write(";".join(header) + "\n")
+        for row in rows:
+            f.write(";".join(row) + ";\n")
+
+
+# ----------------------------
+# Artefactos por mes
+# ----------------------------
+def _compras_rows(rng: random.Random, cfg: SyntheticConfig, month: int, suppliers: List[Tuple[str, str]]) -> List[List[str]]:
+    rows: List[List[str]] = []
+    for i in range(1, cfg.compras_rows + 1):
+        code = _pick_code(rng, COMPRA_CODES)
+        rut, name = rng.choice(suppliers)
+        exento, neto, iva, total = _amounts(rng, code, 5_000_000)
+        fecha = _date(cfg.year, month, rng)
+        row = [
+            str(i), str(code), "Del Giro", rut, name, str(rng.randint(1, 9_999_999)), fecha,
+            f"{fecha} {rng.randint(8, 20):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}", "",
+            str(exento), str(neto), str(iva), "", "", str(total), "", "", "", "", "0", "", "", "", "0",
+        ]
+        row += ["28", str(int(neto * 0.02)), "0"] if rng.random() < 0.05 else ["", "", ""]
+        rows.append(row)
+    return rows
+
+
+def _ventas_rows(rng: random.Random, cfg: SyntheticConfig, month: int, customers: List[Tuple[str, str]]) -> List[List[str]]:
+    rows: List[List[str]] = []
+    folio = rng.randint(1000, 90000)
+    for i in range(1, cfg.ventas_rows + 1):
+        code = _pick_code(rng, VENTA_CODES)
+        rut, name = rng.choice(customers)
+        exento, neto, iva, total = _amounts(rng, code, 8_000_000)
+        fecha = _date(cfg.year, month, rng)
+        folio += 1
+        ref_tipo, ref_folio = ("33", str(folio - rng.randint(1, 500))) if code in (61, 56) else ("0", "")
+        row = [
+            str(i), str(code), "Del Giro", rut, name, str(folio), fecha,
+            f"{fecha} {rng.randint(8, 20):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}", "", "",
+            str(exento), str(neto), str(iva), str(total), "0", "0", "0", "0", "0", "-", "0", "0", "0", "0",
+            ref_tipo, ref_folio, "", "", "0", "", "0", str(rng.choice((0, 1, 2))), "0", "0", "0", "", "", "",
+            "0", "", "", "", "",
+        ]
+        rows.append(row)
+    return rows
+
+
+def _boletas_line(rng: random.Random) -> List[str]:
+    docs = rng.randint(1, 300)
+    neto = sum(rng.randint(2000, 40000) for _ in range(docs))
+    iva = int(round(neto * 0.19))
+    return [
+        "Total Oper. del mes Boleta Electr. (39) RESUMEN",
+        str(docs),
+        "0",
+        _miles(neto),
+        _miles(iva),
+        _miles(neto + iva),
+    ]
+
+
+def _bhe_html(
+    rng: random.Random,
+    cfg: SyntheticConfig,
+    month: int,
+    company_rut: str,
+    razon_social: str,
+    issuers: List[Tuple[str, str]],
+) -> str:
+    """
+    HTML con el mismo esqueleto que page.content() del informe mensual BHE:
+    filas por boleta (estado VIG/ANU), fila 'Totales*' y campos ocultos liquido1..4.
+    """
+    rows: List[str] = []
+    suma_bruto = suma_ret = suma_liq = 0
+    for i in range(1, cfg.bhe_rows + 1):
+        rut, name = rng.choice(issuers)
+        bruto = rng.randint(50_000, 3_000_000)
+        retenido = int(round(bruto * 0.145))
+        liquido = bruto - retenido
+        vigente = rng.random() > 0.05
+        estado = "VIG" if vigente else "ANU"
+        if vigente:
+            suma_bruto += bruto
+            suma_ret += retenido
+            suma_liq += liquido
+        rows.append(
+            '<tr align="left" class="reporte"><td><a href="javascript:ObtenerBoletaPdf(\'0\', \'0\');">'
+            '<img src="/IMT/img/pdf.gif" border="0"></a></td>'
+            f"<td>{rng.randint(1, 9999)}</td>"
+            f'<td><a href="javascript:void(0);">{estado}</a></td>'
+            f"<td>{_date(cfg.year, month, rng)}</td>"
+            f"<td><nobr>{rut}</nobr></td>"
+            f"<td>{name} &nbsp;</td>"
+            '<td><div align="center">NO</div></td>'
+            f'<td align="right">{_miles(bruto)}</td>'
+            f'<td align="right">{_miles(retenido)}</td>'
+            f'<td align="right">{_miles(liquido)}</td>'
+            f'<td align="center"><input type="button" value="  IR  " name="chkObservar_{i}" class="reporte"></td></tr>'
+        )
+    rut_num, dv = company_rut.split("-", 1)
+    return (
+        '<!DOCTYPE html PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN"><html><head>'
+        '<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">'
+        "<title>INFORME MENSUAL DE BOLETAS RECIBIDAS </title></head><body>"
+        f"<table><tbody><tr><td>Contribuyente:</td><td><b> {razon_social}</b></td></tr>"
+        f"<tr><td>RUT:</td><td><b> {company_rut}</b></td></tr></tbody></table>"
+        '<form name="formulario" method="post" action="">'
+        '<table width="900" border="1" cellspacing="0" cellpadding="1"><tbody>'
+        '<tr align="left" bgcolor="#CCCCCC" class="reporte"><td>Ver</td><td>N°</td><td>Estado</td><td>Fecha</td>'
+        "<td>Rut</td><td>Nombre o Razón Social</td><td>Soc. Prof.</td><td>Brutos</td><td>Retenido</td>"
+        "<td>Pagado</td><td>Boleta</td></tr>"
+        f'<input type="hidden" name="CantidadFilas" value="{cfg.bhe_rows}">'
+        + "".join(rows)
+        + '<tr align="left" class="reporte"> <td colspan="7" bgcolor="#CCCCCC"> <strong>Totales*&nbsp;:</strong></td>'
+        f' <td align="right">    {_miles(suma_bruto)}</td> <td align="right"> {_miles(suma_ret)}</td>'
+        f' <td align="right"> {_miles(suma_liq)}</td> <td colspan="7" bgcolor="#CCCCCC"> </td> </tr> </tbody></table>'
+        '</form> <form name="formulario1" method="post" action="">'
+        f'<input type="hidden" name="rut_arrastre" value="{rut_num}"><input type="hidden" name="dv_arrastre" value="{dv}">'
+        f'<input type="hidden" name="cbanoinformemensual" value="{cfg.year}">'
+        f'<input type="hidden" name="cbmesinformemensual" value="{MONTHS[month]}">'
+        f'<input type="hidden" name="liquido1" value="{suma_bruto}">'
+        '<input type="hidden" name="liquido2" value="0">'
+        f'<input type="hidden" name="liquido3" value="{suma_ret}">'
+        f'<input type="hidden" name="liquido4" value="{suma_liq}">'
+        "</form></body></html>"
+    )
+
+
+def _remanente_payload(rng: random.Random, year: int, month: int) -> Dict:
+    prev_year, prev_month = (year - 1, 12) if month == 1 else (year, month - 1)
+    has_folio = rng.random() < 0.8
+    return {
+        "target_period": {"year": year, "month": month},
+        "prev_period": {"year": prev_year, "month": prev_month},
+        "folio": str(rng.randint(1_000_000_000, 9_999_999_999)) if has_folio else None,
+        "codigo_77_remanente": rng.randint(0, 5_000_000) if has_folio and rng.random() < 0.5 else None,
+        "results_url": "https://www4.sii.cl/rfiInternet/consulta/index.html#rfiSelFormularioPeriodo",
+        "compacto_url": None,
+        "evidence": {"html_results": None, "html_compacto": None},
+    }
+
+
+# ----------------------------
+# API pública
+# ----------------------------
+def generate_company(
+    storage_root: Path,
+    cfg: SyntheticConfig,
+    *,
+    company_rut: Optional[str] = None,
+    rng: Optional[random.Random] = None,
+) -> SyntheticCompany:
+    """
+    Escribe DCV (compras/ventas/boletas), BHE y remanente para 1..cfg.to_month,
+    además de manifests y profile.json, con la misma estructura que dejan los scrapers.
+    """
+    rng = rng or random.Random(cfg.seed)
+    company_rut = company_rut or _rut(rng, 76000000, 79999999)
+    company_id = company_rut
+    razon_social = _company_name(rng)
+    company_dir = Path(storage_root) / "companies" / company_id
+
+    suppliers = [(_rut(rng), _company_name(rng)) for _ in range(max(1, cfg.suppliers))]
+    customers = [(_rut(rng), _company_name(rng)) for _ in range(max(1, cfg.customers))]
+    issuers = [(_rut(rng, 5000000, 25000000), _person_name(rng)) for _ in range(max(1, cfg.bhe_rows // 2 or 1))]
+
+    files: List[Path] = []
+    manifests: Dict[str, Dict] = {"dcv": {"dcv": {}}, "bhe": {"bhe": {}}, "f29_remanente": {"remanente": {}}}
+    y = str(cfg.year)
+
+    for month in range(1, cfg.to_month + 1):
+        mm = MONTHS[month]
+        tag = f"{cfg.year}{mm}"
+
+        dcv_dir = company_dir / "dcv" / y / mm
+        compras = dcv_dir / f"RCV_COMPRA_REGISTRO_{company_id}_{tag}.csv"
+        ventas = dcv_dir / f"RCV_VENTA_{company_id}_{tag}.csv"
+        _write_csv_with_trailing_column(compras, COMPRA_HEADER, _compras_rows(rng, cfg, month, suppliers))
+        _write_csv_with_trailing_column(ventas, VENTA_HEADER, _ventas_rows(rng, cfg, month, customers))
+        entry = {"compras": str(compras), "ventas_detalles": str(ventas)}
+        files += [compras, ventas]
+        if cfg.with_boletas:
+            boletas = dcv_dir / f"VENTAS_BOLETAS_RESUMEN_{tag}.csv"
+            boletas.write_text(",".join(BOLETAS_HEADER) + "\n" + ",".join(_boletas_line(rng)) + "\n", encoding="utf-8")
+            entry["ventas_boletas_linea"] = str(boletas)
+            files.append(boletas)
+        manifests["dcv"]["dcv"].setdefault(y, {})[mm] = entry
+
+        bhe_dir = company_dir / "bhe" / y / mm
+        bhe_dir.mkdir(parents=True, exist_ok=True)
+        bhe = bhe_dir / f"BHE_{tag}.html"
+        bhe.write_text(_bhe_html(rng, cfg, month, company_rut, razon_social, issuers), encoding="utf-8")
+        manifests["bhe"]["bhe"].setdefault(y, {})[mm] = {"url": None, "html": str(bhe), "xls": None, "png": None}
+        files.append(bhe)
+
+        rem_dir = company_dir / "f29_remanente" / y / mm
+        rem_dir.mkdir(parents=True, exist_ok=True)
+        payload = _remanente_payload(rng, cfg.year, month)
+        prev = f"{payload['prev_period']['year']}{payload['prev_period']['month']:02d}"
+        rem = rem_dir / f"remanente_prev_{prev}_para_{tag}.json"
+        rem.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        manifests["f29_remanente"]["remanente"].setdefault(y, {})[mm] = {
+            "prev": prev,
+            "folio": payload["folio"],
+            "codigo_77": payload["codigo_77_remanente"],
+            "json": str(rem),
+        }
+        files.append(rem)
+
+    for source, data in manifests.items():
+        mp = company_dir / source / "manifest.json"
+        mp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    profile = {
+        "company_id": company_id,
+        "rut": company_rut,
+        "razon_social": razon_social,
+        "captured_at": None,
+        "source_url": "synthetic",
+        "password": None,
+    }
+    (company_dir / "profile.json").write_text(json.dumps(profile, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    return SyntheticCompany(company_id=company_id, razon_social=razon_social, files=files)
+
+
+def generate_fleet(storage_root: Path, companies: int, cfg: SyntheticConfig) -> List[SyntheticCompany]:
+    rng = random.Random(cfg.seed)
+    return [generate_company(storage_root, cfg, rng=rng) for _ in range(max(1, companies))]
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import gzip
+import io
+import logging
+import mmap
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Union
+
+from backend.app.services import blob_store
+
+LOGGER = logging.getLogger(__name__)
+
+# Compresión transparente de la evidencia cruda (RCV CSV, BHE/RESULTADOS/F29_COMPACTO HTML).
+# SII_STORAGE_COMPRESSION=gzip|zstd activa la escritura comprimida: X.csv se guarda como
+# X.csv.gz (o .zst) y la variante sin comprimir se elimina. Los lectores trabajan con el
+# nombre lógico (sin la extensión del códec): glob() empareja los patrones de siempre contra
+# ese nombre y open_text()/read_bytes() descomprimen según la extensión real.
+# zstd usa el paquete opcional `zstandard`; si no está instalado se usa gzip.
+# gzip se escribe con mtime=0: mismo contenido -> mismos bytes (deduplicable por blob_store).
+CODEC_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+_SUFFIX_CODECS = {v: k for k, v in CODEC_SUFFIXES.items()}
+COMPRESSIBLE_SUFFIXES = (".csv", ".html", ".htm", ".txt")
+DEFAULT_LEVELS = {"gzip": 5, "zstd": 3}
+
+
+def _configured_codec() -> Optional[str]:
+    value = os.getenv("SII_STORAGE_COMPRESSION", "").strip().lower()
+    if value in ("", "0", "no", "none", "off"):
+        return None
+    if value in ("gz", "gzip"):
+        return "gzip"
+    if value in ("zst", "zstd"):
+        if _zstd() is None:
+            LOGGER.warning("SII_STORAGE_COMPRESSION=zstd sin el paquete zstandard; usando gzip")
+            return "gzip"
+        return "zstd"
+    LOGGER.warning("SII_STORAGE_COMPRESSION=%s no reconocido; sin compresión", value)
+    return None
+
+
+def _zstd():
+    try:
+        import zstandard  # optional
+    except Exception:
+        return None
+    return zstandard
+
+
+CODEC = _configured_codec()
+LEVEL = int(os.getenv("SII_STORAGE_COMPRESSION_LEVEL", "0") or 0) or DEFAULT_LEVELS.get(CODEC or "", 0)
+
+
+@dataclass
+class CompressStats:
+    files: int = 0
+    compressed: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+
+# ----------------------------
+# Nombres
+# ----------------------------
+def codec_of(path: Path) -> Optional[str]:
+    return _SUFFIX_CODECS.get(Path(path).suffix.lower())
+
+
+def logical_path(path: Path) -> Path:
+    """Ruta sin la extensión del códec (X.csv.gz -> X.csv)."""
+    path = Path(path)
+    return path.with_suffix("") if codec_of(path) else path
+
+
+def logical_suffix(path: Path) -> str:
+    return logical_path(path).suffix.lower()
+
+
+def variants(path: Path) -> List[Path]:
+    """Todas las formas en disco posibles de una ruta lógica (plana primero)."""
+    base = logical_path(path)
+    return [base] + [base.with_name(base.name + s) for s in CODEC_SUFFIXES.values()]
+
+
+def resolve(path: Path) -> Path:
+    """
+    Archivo real para una ruta lógica (o ya real). Si no existe ninguna variante se
+    devuelve la ruta tal cual (el llamador decide qué hacer con el archivo ausente).
+    """
+    path = Path(path)
+    if path.exists():
+        return path
+    for candidate in variants(path):
+        if candidate.exists():
+            return candidate
+    return path
+
+
+def glob(folder: Path, pattern: str) -> List[Path]:
+    """
+    folder.glob(pattern) aplicado al nombre lógico: "RCV_VENTA_*.csv" encuentra también
+    RCV_VENTA_x.csv.gz. Si conviven varias variantes de un mismo archivo gana la más
+    reciente. Se devuelven rutas reales ordenadas por nombre lógico (sin ocultos).
+    """
+    folder = Path(folder)
+    best: Dict[str, Path] = {}
+    for pat in [pattern] + [pattern + s for s in CODEC_SUFFIXES.values()]:
+        for path in folder.glob(pat):
+            if path.name.startswith("."):
+                continue  # temporales de escritura (blob_store)
+            key = logical_path(path).name
+            cur = best.get(key)
+            if cur is None or path.stat().st_mtime_ns > cur.stat().st_mtime_ns:
+                best[key] = path
+    return [best[k] for k in sorted(best)]
+
+
+# ----------------------------
+# Lectura
+# ----------------------------
+def decompress(data: bytes, codec: Optional[str]) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("Archivo .zst y el paquete zstandard no está instalado")
+        return zstd.ZstdDecompressor().decompress(data, max_output_size=1 << 31)
+    return data
+
+
+def read_bytes(path: Path) -> bytes:
+    path = resolve(path)
+    return decompress(path.read_bytes(), codec_of(path))
+
+
+def read_text(path: Path, encoding: str = "utf-8", errors: str = "strict") -> str:
+    return read_bytes(path).decode(encoding, errors)
+
+
+def open_text(path: Path, encoding: str = "utf-8", errors: str = "strict", newline: Optional[str] = None) -> IO[str]:
+    """Como Path.open("r") pero descomprimiendo en streaming (.gz/.zst)."""
+    path = resolve(path)
+    codec = codec_of(path)
+    if codec == "gzip":
+        return gzip.open(path, "rt", encoding=encoding, errors=errors, newline=newline)
+    if codec == "zstd":
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("Archivo .zst y el paquete zstandard no está instalado")
+        raw = zstd.ZstdDecompressor().stream_reader(path.open("rb"), closefd=True)
+        return io.TextIOWrapper(io.BufferedReader(raw), encoding=encoding, errors=errors, newline=newline)
+    return path.open("r", encoding=encoding, errors=errors, newline=newline)
+
+
+@contextmanager
+def mapped(path: Path) -> Iterator[Union[mmap.mmap, bytes]]:
+    """
+    Bytes del archivo sin pasar por text IO: mmap de solo lectura para archivos planos
+    (el SO pagina a medida que se recorre, sin copiar el archivo completo a la heap).
+    Los .gz/.zst no se pueden mapear y se entregan descomprimidos. El buffer solo es
+    válido dentro del with.
+    """
+    path = resolve(path)
+    if codec_of(path):
+        yield read_bytes(path)
+        return
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(buf, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            buf.madvise(mmap.MADV_SEQUENTIAL)
+        try:
+            yield buf
+        finally:
+            buf.close()
+
+
+def open_binary(path: Path) -> IO[bytes]:
+    """Stream binario descomprimido; para pandas (read_excel) cuando el archivo viene comprimido."""
+    path = resolve(path)
+    if codec_of(path):
+        return io.BytesIO(read_bytes(path))
+    return path.open("rb")
+
+
+# ----------------------------
+# Escritura
+# ----------------------------
+def compress(data: bytes, codec: str, level: Optional[int] = None) -> bytes:
+    level = level or DEFAULT_LEVELS[codec]
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    zstd = _zstd()
+    if zstd is None:
+        raise RuntimeError("zstandard no está instalado")
+    return zstd.ZstdCompressor(level=level).compress(data)
+
+
+def _drop_other_variants(target: Path) -> None:
+    for other in variants(target):
+        if other != target and other.exists():
+            other.unlink()
+
+
+def write_bytes(path: Path, data: bytes, *, codec: Optional[str] = None) -> Path:
+    """
+    Escribe un artefacto crudo en su ruta lógica. Con compresión activa (o `codec`) y un
+    tipo comprimible, se guarda como <ruta>.gz/.zst. Retorna la ruta real escrita.
+    """
+    path = logical_path(path)
+    codec = codec or CODEC
+    target = path
+    if codec and path.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+        data = compress(data, codec, LEVEL if codec == CODEC else None)
+        target = path.with_name(path.name + CODEC_SUFFIXES[codec])
+    blob_store.write_bytes(target, data)
+    _drop_other_variants(target)
+    return target
+
+
+def write_text(path: Path, text: str, encoding: str = "utf-8", *, codec: Optional[str] = None) -> Path:
+    return write_bytes(path, text.encode(encoding), codec=codec)
+
+
+# ----------------------------
+# Conversión de lo existente
+# ----------------------------
+def compress_tree(
+    storage_root: Path, codec: str, company_ids: Optional[Iterable[str]] = None, *, decompress_back: bool = False
+) -> CompressStats:
+    """
+    Comprime (o con decompress_back, descomprime) los archivos crudos ya guardados.
+    Se conserva el mtime original (fecha de descarga).
+    """
+    stats = CompressStats()
+    for path in blob_store.iter_raw_files(storage_root, company_ids):
+        if logical_suffix(path) not in COMPRESSIBLE_SUFFIXES:
+            continue
+        stats.files += 1
+        current = codec_of(path)
+        wanted = None if decompress_back else codec
+        if current == wanted:
+            continue
+        st = path.stat()
+        data = read_bytes(path)
+        out = write_bytes(logical_path(path), data, codec=wanted) if wanted else _write_plain(path, data)
+        os.utime(out, ns=(st.st_atime_ns, st.st_mtime_ns))
+        stats.compressed += 1
+        stats.bytes_before += st.st_size
+        stats.bytes_after += out.stat().st_size
+    return stats
+
+
+def _write_plain(path: Path, data: bytes) -> Path:
+    target = logical_path(path)
+    blob_store.write_bytes(target, data)
+    _drop_other_variants(target)
+    return target
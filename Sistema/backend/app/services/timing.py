@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from backend.app.services import metrics, profiling
+
+TIMINGS_FILENAME = "timings.jsonl"
+
+# Etapas instrumentadas (referencia para el resumen; span() acepta cualquier nombre).
+STAGES = (
+    "login",
+    "navigation",
+    "consult",
+    "anchor_wait",
+    "file_write",
+    "summary_build",
+    "csv_parse",
+    "aggregation",
+    "bhe_parse",
+    "remanente_extract",
+    "pdf_render",
+    "chart_render",
+    "xlsx_write",
+)
+
+_LOCK = threading.Lock()
+_SINK: Optional[Path] = None
+_CONTEXT: ContextVar[Dict[str, Any]] = ContextVar("sii_timing_context", default={})
+
+
+# ----------------------------
+# Configuración de la corrida
+# ----------------------------
+def start_run(log_dir: Path, **context: Any) -> Path:
+    """
+    Activa el registro de spans en <log_dir>/timings.jsonl.
+    `context` (ej: company=...) se agrega a todos los registros de la corrida.
+    """
+    global _SINK
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    _SINK = log_dir / TIMINGS_FILENAME
+    if context:
+        _CONTEXT.set({**_CONTEXT.get(), **context})
+    return _SINK
+
+
+def stop_run() -> None:
+    global _SINK
+    _SINK = None
+
+
+def is_enabled() -> bool:
+    return _SINK is not None
+
+
+@contextmanager
+def bind(**fields: Any) -> Iterator[None]:
+    """
+    Agrega campos (company, period, source...) a los spans emitidos dentro del bloque.
+    """
+    token = _CONTEXT.set({**_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _CONTEXT.reset(token)
+
+
+def period_label(year: int, month: int) -> str:
+    return f"{int(year)}-{int(month):02d}"
+
+
+# ----------------------------
+# Spans
+# ----------------------------
+@contextmanager
+def span(stage: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Mide la duración de una etapa. El dict entregado permite completar campos
+    durante la ejecución (ej: rec["bytes"] = len(raw)).
+    Si no hay corrida activa, solo mide (no escribe nada). Si el registro de
+    métricas está habilitado, el span también alimenta los histogramas/contadores.
+    Si la etapa está seleccionada en profiling (SII_PROFILE / --profile), se
+    captura con cProfile y se vuelca a <logs>/profiles/.
+    """
+    record: Dict[str, Any] = dict(fields)
+    outcome = "ok"
+    prof = profiling.start(stage) if profiling.is_enabled() else None
+    t0 = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - t0
+        if prof is not None:
+            sink = _SINK
+            profiling.finish(
+                prof,
+                stage,
+                log_dir=sink.parent if sink is not None else None,
+                context={**_CONTEXT.get(), **record},
+            )
+        if _SINK is not None:
+            _emit(stage, duration, outcome, record)
+        if metrics.is_enabled():
+            source = record.get("source") or _CONTEXT.get().get("source")
+            metrics.observe_stage(stage, duration, outcome, source, record.get("bytes"))
+
+
+def timed(stage: str, **fields: Any) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorador equivalente a `with span(stage)` sobre toda la función."""
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(stage, **fields):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _emit(stage: str, duration: float, outcome: str, record: Dict[str, Any]) -> None:
+    payload: Dict[str, Any] = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        **_CONTEXT.get(),
+        "stage": stage,
+        "duration_ms": round(duration * 1000.0, 3),
+        "bytes": None,
+        "outcome": outcome,
+    }
+    payload.update(record)
+    line = json.dumps(payload, ensure_ascii=False, default=str)
+    sink = _SINK
+    if sink is None:
+        return
+    try:
+        with _LOCK:
+            with sink.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except Exception:
+        # La instrumentación nunca debe botar la corrida.
+        pass
+
+
+# ----------------------------
+# Resumen (p50/p95 por etapa)
+# ----------------------------
+def find_timing_files(storage_root: Path, company_id: Optional[str] = None) -> List[Path]:
+    companies = Path(storage_root) / "companies"
+    pattern = f"{company_id}/runs/*/logs/{TIMINGS_FILENAME}" if company_id else f"*/runs/*/logs/{TIMINGS_FILENAME}"
+    return sorted(companies.glob(pattern))
+
+
+def iter_records(paths: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        try:
+            with Path(path).open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano (suficiente para reportes operativos)."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100.0 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    durations: Dict[str, List[float]] = {}
+    bytes_total: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    for rec in records:
+        stage = rec.get("stage")
+        duration = rec.get("duration_ms")
+        if not stage or duration is None:
+            continue
+        durations.setdefault(stage, []).append(float(duration))
+        if rec.get("bytes"):
+            bytes_total[stage] = bytes_total.get(stage, 0) + int(rec["bytes"])
+        if rec.get("outcome") == "error":
+            errors[stage] = errors.get(stage, 0) + 1
+
+    out: Dict[str, Dict[str, Any]] = {}
+    for stage, values in durations.items():
+        values.sort()
+        out[stage] = {
+            "count": len(values),
+            "errors": errors.get(stage, 0),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "max_ms": round(values[-1], 3),
+            "total_ms": round(sum(values), 3),
+            "bytes": bytes_total.get(stage, 0),
+        }
+    return out
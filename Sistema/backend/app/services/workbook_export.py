@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from backend.app.services import bhe_store, rcv_topn, storage_io
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.monthly_tax_pdf import MONTH_LABELS
+from backend.app.services.report_builder import update_ytd
+from backend.app.services.timing import span
+from backend.app.services.ytd_rollup import BY_CODE_FIELDS, ytd_totals
+
+# Planilla consolidada (equivalente local de Planilla_<job>.xlsx / macro de excel.txt):
+#   Resumen     <- ytd_rollup (agregados mensuales ya calculados) + top-N de rcv_topn
+#   RCV Compra  <- RCV_COMPRA de enero..mes, fila a fila desde el CSV (con columna Periodo)
+#   RCV Venta   <- RCV_VENTA, igual que compras
+#   BH          <- bhe_store (boletas ya parseadas, sin volver a abrir el HTML)
+# Se escribe con openpyxl en modo write-only: cada fila se serializa al agregarla, así que
+# la memoria no crece con el número de filas. Varias empresas se exportan en paralelo en
+# procesos separados (openpyxl es CPU-bound).
+WORKBOOK_PREFIX = "Planilla"
+SHEET_RESUMEN = "Resumen"
+SHEET_COMPRAS = "RCV Compra"
+SHEET_VENTAS = "RCV Venta"
+SHEET_BH = "BH"
+
+# Columnas del RCV que se escriben como número (encabezado normalizado a [a-z0-9]).
+_RCV_NUMERIC = re.compile(r"^(monto|iva|tipodoc|folio|nro|tasa|valor|impto|codigo)")
+_RESUMEN_METRICS = (
+    ("Ventas neto", "ventas_neto"),
+    ("Ventas IVA", "ventas_iva"),
+    ("Ventas total", "ventas_total"),
+    ("Compras neto", "compras_neto"),
+    ("Compras IVA", "compras_iva"),
+    ("Compras total", "compras_total"),
+    ("Remanente (saldo del último mes)", "remanente"),
+    ("IVA debito", "iva_debito"),
+    ("IVA credito", "iva_credito"),
+    ("IVA determinado", "iva_pagar_determinado"),
+    ("PPM base", "ppm_base"),
+    ("PPM", "ppm_pagado"),
+    ("Honorarios bruto", "honorarios_bruto"),
+    ("Retencion honorarios", "honorarios_retenido"),
+    ("Total a pagar", "total_a_pagar"),
+)
+
+
+@dataclass
+class ExportResult:
+    company_id: str
+    path: Optional[Path]
+    rows: Dict[str, int]
+    error: Optional[str] = None
+
+
+def workbook_path(storage_root: Path, company_id: str, year: int, to_month: int) -> Path:
+    return (
+        Path(storage_root)
+        / "companies"
+        / company_id
+        / "Resumen"
+        / f"{WORKBOOK_PREFIX}_{company_id}_{int(year)}_{int(to_month):02d}.xlsx"
+    )
+
+
+# ----------------------------
+# Filas (generadores)
+# ----------------------------
+def _norm(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", name.strip().lower())
+
+
+def _number(value: str) -> Any:
+    text = value.strip()
+    if re.fullmatch(r"-?\d+", text):
+        return int(text)
+    return text
+
+
+def iter_rcv_rows(
+    storage_root: Path,
+    company_id: str,
+    section: str,
+    year: int,
+    to_month: int,
+    *,
+    storage: Optional[CompanyStorage] = None,
+) -> Iterator[List[Any]]:
+    """
+    Encabezado + filas de los RCV enero..to_month de una sección, leídos en streaming.
+    La primera columna es el período (AAAAMM); la columna vacía final del SII se descarta.
+    """
+    cs = storage or CompanyStorage(Path(storage_root), company_id)
+    header: Optional[List[str]] = None
+    for month in range(1, int(to_month) + 1):
+        path = rcv_topn.pick_rcv(storage_root, company_id, section, year, month, storage=cs)
+        if path is None:
+            continue
+        periodo = int(f"{year}{month:02d}")
+        with span("csv_parse", source="workbook", file=path.name) as rec:
+            rec["bytes"] = path.stat().st_size
+            rows = 0
+            with storage_io.open_text(path, encoding="utf-8", errors="ignore", newline="") as f:
+                first = f.readline()
+                delim = ";" if ";" in first else ","
+                file_header = next(csv.reader([first], delimiter=delim), [])
+                while file_header and not file_header[-1].strip():
+                    file_header.pop()
+                width = len(file_header)
+                numeric = [bool(_RCV_NUMERIC.match(_norm(h))) for h in file_header]
+                if header is None:
+                    header = ["Periodo"] + [h.strip() for h in file_header]
+                    yield header
+                for row in csv.reader(f, delimiter=delim):
+                    if not any(c.strip() for c in row):
+                        continue
+                    row = row[:width] + [""] * (width - len(row))
+                    yield [periodo] + [_number(c) if numeric[i] else c for i, c in enumerate(row)]
+                    rows += 1
+            rec["rows"] = rows
+
+
+def iter_bh_rows(storage_root: Path, company_id: str, year: int, to_month: int) -> Iterator[List[Any]]:
+    yield ["Periodo", "N° Boleta", "Estado", "Fecha", "Rut", "Nombre", "Brutos", "Retenido", "Pagado"]
+    store = bhe_store.load_year(storage_root, company_id, year)
+    for month in store.months():
+        if month > int(to_month):
+            continue
+        periodo = int(f"{year}{month:02d}")
+        for b in store.boletas(month):
+            yield [periodo, b.numero, b.estado, b.fecha, b.rut, b.nombre, b.bruto, b.retenido, b.pagado]
+
+
+def iter_resumen_rows(
+    storage_root: Path,
+    company_id: str,
+    year: int,
+    to_month: int,
+    *,
+    top_n: int = 10,
+    storage: Optional[CompanyStorage] = None,
+) -> Iterator[List[Any]]:
+    cs = storage or CompanyStorage(Path(storage_root), company_id)
+    name = cs.razon_social()
+    state = update_ytd(storage_root, company_id, year, to_month, company_name=name, storage=cs)
+    months = [m for m in range(1, int(to_month) + 1)]
+    yield [name]
+    yield [f"DESDE ENERO A {MONTH_LABELS.get(int(to_month), str(to_month))} {year}"]
+    yield []
+    yield ["Concepto"] + [MONTH_LABELS.get(m, str(m)).title() for m in months] + ["Acumulado"]
+    totals = ytd_totals(state, to_month)
+    for label, key in _RESUMEN_METRICS:
+        row: List[Any] = [label]
+        for m in months:
+            entry = state.months.get(f"{m:02d}")
+            row.append(entry.metrics.get(key) if entry else None)
+        row.append(totals.metrics.get(key, 0))
+        yield row
+
+    for section in ("ventas", "compras"):
+        yield []
+        yield [f"{section.title()} por tipo de documento (acumulado)"] + [f.title() for f in BY_CODE_FIELDS]
+        for code, values in sorted(totals.by_code.get(section, {}).items(), key=lambda kv: int(kv[0])):
+            yield [int(code)] + list(values)
+
+    for section in rcv_topn.SECTIONS:
+        top_state = rcv_topn.update_section(storage_root, company_id, section, year, to_month=to_month, storage=cs)
+        yield []
+        yield [f"Top {top_n} {'proveedores' if section == 'compras' else 'clientes'} (acumulado)", "Rut", "Monto", "Documentos"]
+        for e in rcv_topn.top_ytd(top_state, to_month, top_n):
+            yield [e.razon_social, e.rut, e.monto, e.documentos]
+
+
+# ----------------------------
+# Escritura
+# ----------------------------
+def _write_sheet(wb: Any, title: str, rows: Iterable[Sequence[Any]], *, header_row: int = 1) -> int:
+    """Agrega una hoja write-only; la fila `header_row` va en negrita. Retorna filas de datos."""
+    ws = wb.create_sheet(title=title)
+    bold = Font(bold=True)
+    count = 0
+    for i, row in enumerate(rows, start=1):
+        if i == header_row:
+            cells = []
+            for value in row:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.font = bold
+                cells.append(cell)
+            ws.append(cells)
+            continue
+        ws.append(list(row))
+        count += 1
+    return count
+
+
+def export_company_workbook(
+    storage_root: Path,
+    company_id: str,
+    year: int,
+    to_month: int,
+    *,
+    out_path: Optional[Path] = None,
+    top_n: int = 10,
+) -> ExportResult:
+    """Escribe la planilla consolidada enero..to_month de una empresa (write-only, streaming)."""
+    storage_root = Path(storage_root)
+    out = Path(out_path) if out_path else workbook_path(storage_root, company_id, year, to_month)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    cs = CompanyStorage(storage_root, company_id)
+    rows: Dict[str, int] = {}
+    with span("xlsx_write", file=out.name) as rec:
+        wb = Workbook(write_only=True)
+        rows[SHEET_RESUMEN] = _write_sheet(
+            wb,
+            SHEET_RESUMEN,
+            iter_resumen_rows(storage_root, company_id, year, to_month, top_n=top_n, storage=cs),
+            header_row=4,
+        )
+        for title, section in ((SHEET_COMPRAS, "compras"), (SHEET_VENTAS, "ventas")):
+            rows[title] = _write_sheet(
+                wb, title, iter_rcv_rows(storage_root, company_id, section, year, to_month, storage=cs)
+            )
+        rows[SHEET_BH] = _write_sheet(wb, SHEET_BH, iter_bh_rows(storage_root, company_id, year, to_month))
+        tmp = out.with_name(out.name + ".tmp")
+        wb.save(tmp)
+        tmp.replace(out)
+        rec["rows"] = sum(rows.values())
+        rec["bytes"] = out.stat().st_size
+    return ExportResult(company_id=company_id, path=out, rows=rows)
+
+
+def _export_worker(storage_root: str, company_id: str, year: int, to_month: int, top_n: int) -> ExportResult:
+    try:
+        return export_company_workbook(Path(storage_root), company_id, year, to_month, top_n=top_n)
+    except Exception as exc:
+        return ExportResult(company_id=company_id, path=None, rows={}, error=f"{type(exc).__name__}: {exc}")
+
+
+def list_companies(storage_root: Path) -> List[str]:
+    base = Path(storage_root) / "companies"
+    if not base.exists():
+        return []
+    return sorted(p.name for p in base.iterdir() if p.is_dir() and (p / "dcv").exists())
+
+
+def export_many(
+    storage_root: Path,
+    company_ids: Sequence[str],
+    year: int,
+    to_month: int,
+    *,
+    workers: Optional[int] = None,
+    top_n: int = 10,
+) -> List[ExportResult]:
+    """
+    Exporta varias empresas; con workers > 1 cada empresa va en su propio proceso.
+    Un error en una empresa queda en su ExportResult y no detiene a las demás.
+    """
+    workers = workers if workers is not None else min(len(company_ids), os.cpu_count() or 1)
+    if workers <= 1 or len(company_ids) <= 1:
+        return [_export_worker(str(storage_root), cid, year, to_month, top_n) for cid in company_ids]
+    results: List[ExportResult] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_export_worker, str(storage_root), cid, year, to_month, top_n) for cid in company_ids]
+        for fut in as_completed(futures):
+            results.append(fut.result())
+    order = {cid: i for i, cid in enumerate(company_ids)}
+    return sorted(results, key=lambda r: order.get(r.company_id, 0))
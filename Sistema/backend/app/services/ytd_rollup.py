@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import json
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Acumulados "DESDE ENERO A <mes>" por empresa y año.
+# Cada mes resumido (build_monthly_tax_summary) se reduce a agregados planos: neto/iva/total
+# por código de documento, débito/crédito IVA, base y pago PPM, honorarios y remanente
+# (este último es un saldo: ver BALANCE_METRICS).
+# El estado vive en companies/<id>/analytics/ytd_<año>.json con los agregados de cada mes,
+# la firma de sus insumos y el acumulado anual. Agregar o corregir un mes ajusta el
+# acumulado con la diferencia (nuevo - anterior); nunca se vuelve a sumar el año completo.
+ANALYTICS_DIRNAME = "analytics"
+STATE_VERSION = 1
+
+# Métricas escalares por mes (claves estables del JSON).
+METRICS = (
+    "ventas_neto",
+    "ventas_iva",
+    "ventas_total",
+    "compras_neto",
+    "compras_iva",
+    "compras_total",
+    "iva_debito",
+    "iva_credito",
+    "iva_pagar_determinado",
+    "ppm_base",
+    "ppm_pagado",
+    "honorarios_bruto",
+    "honorarios_retenido",
+    "honorarios_pagado",
+    "remanente",
+    "impuesto_unico",
+    "total_a_pagar",
+)
+# Saldos (no flujos): su "acumulado" es el valor del último mes incluido, no la suma.
+# El remanente es el crédito fiscal arrastrado, así que sumarlo mes a mes lo contaría
+# varias veces.
+BALANCE_METRICS = ("remanente",)
+BY_CODE_SECTIONS = ("ventas", "compras")
+BY_CODE_FIELDS = ("neto", "iva", "total")
+
+_LOCK = threading.Lock()
+
+
+@dataclass
+class MonthRollup:
+    metrics: Dict[str, int]
+    # sección -> código -> [neto, iva, total]
+    by_code: Dict[str, Dict[str, List[int]]]
+    sources: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"metrics": self.metrics, "by_code": self.by_code, "sources": self.sources}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MonthRollup":
+        return cls(
+            metrics={k: int(v) for k, v in (data.get("metrics") or {}).items()},
+            by_code={s: {c: [int(x) for x in v] for c, v in (data.get("by_code") or {}).get(s, {}).items()} for s in BY_CODE_SECTIONS},
+            sources=data.get("sources") or {},
+        )
+
+
+@dataclass
+class YTDState:
+    year: int
+    months: Dict[str, MonthRollup] = field(default_factory=dict)
+    ytd: MonthRollup = field(default_factory=lambda: MonthRollup(metrics={}, by_code={s: {} for s in BY_CODE_SECTIONS}))
+
+    def to_dict(self) -> Dict[str, Any]:
+        ytd = self.ytd.to_dict()
+        ytd.pop("sources", None)
+        return {
+            "version": STATE_VERSION,
+            "year": self.year,
+            "months": {mm: r.to_dict() for mm, r in sorted(self.months.items())},
+            "ytd": ytd,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "YTDState":
+        state = cls(
+            year=int(data["year"]),
+            months={mm: MonthRollup.from_dict(r) for mm, r in (data.get("months") or {}).items()},
+            ytd=MonthRollup.from_dict(data.get("ytd") or {}),
+        )
+        # Estados guardados antes de BALANCE_METRICS traen el remanente sumado.
+        _set_balances(state.ytd, state)
+        return state
+
+    def loaded_months(self) -> List[int]:
+        return sorted(int(mm) for mm in self.months)
+
+
+# ----------------------------
+# Resumen -> agregados
+# ----------------------------
+def _i(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def rollup_from_summary(summary: Dict[str, Any], sources: Optional[Dict[str, Any]] = None) -> MonthRollup:
+    """Reduce el dict de build_monthly_tax_summary a los agregados que se acumulan."""
+    ventas_total = summary["ventas"].get("total") or {}
+    compras_total = summary["compras"].get("total") or {}
+    totales = summary.get("totales") or {}
+    ppm = summary.get("ppm") or {}
+    hon = summary.get("honorarios") or {}
+    metrics = {
+        "ventas_neto": _i(ventas_total.get("neto")),
+        "ventas_iva": _i(ventas_total.get("iva")),
+        "ventas_total": _i(ventas_total.get("total")),
+        "compras_neto": _i(compras_total.get("neto")),
+        "compras_iva": _i(compras_total.get("iva")),
+        "compras_total": _i(compras_total.get("total")),
+        "iva_debito": _i(totales.get("iva_debito")),
+        "iva_credito": _i(totales.get("iva_credito")),
+        "iva_pagar_determinado": _i(totales.get("iva_pagar_determinado")),
+        "ppm_base": _i(ppm.get("base")),
+        "ppm_pagado": _i(ppm.get("pagado")),
+        "honorarios_bruto": _i(hon.get("bruto")),
+        "honorarios_retenido": _i(hon.get("retenido")),
+        "honorarios_pagado": _i(hon.get("pagado")),
+        "remanente": _i(summary["compras"].get("remanente")),
+        "impuesto_unico": _i(summary.get("impuesto_unico")),
+        "total_a_pagar": _i(totales.get("total_a_pagar")),
+    }
+    by_code: Dict[str, Dict[str, List[int]]] = {}
+    for section in BY_CODE_SECTIONS:
+        codes: Dict[str, List[int]] = {}
+        for item in summary[section].get("items") or []:
+            if item.get("code") is None:
+                continue
+            codes[str(item["code"])] = [_i(item.get(f)) for f in BY_CODE_FIELDS]
+        by_code[section] = codes
+    return MonthRollup(metrics=metrics, by_code=by_code, sources=dict(sources or {}))
+
+
+def _apply(acc: MonthRollup, delta: MonthRollup, sign: int) -> None:
+    for key, value in delta.metrics.items():
+        if key in BALANCE_METRICS:
+            continue
+        acc.metrics[key] = acc.metrics.get(key, 0) + sign * value
+    for section, codes in delta.by_code.items():
+        target = acc.by_code.setdefault(section, {})
+        for code, values in codes.items():
+            cur = target.setdefault(code, [0] * len(BY_CODE_FIELDS))
+            for i, v in enumerate(values):
+                cur[i] += sign * v
+            if not any(cur):
+                target.pop(code, None)
+
+
+def _set_balances(acc: MonthRollup, state: "YTDState", to_month: Optional[int] = None) -> None:
+    """Saldos del acumulado = valor del último mes cargado (<= to_month)."""
+    months = [m for m in state.loaded_months() if to_month is None or m <= int(to_month)]
+    for key in BALANCE_METRICS:
+        if months:
+            acc.metrics[key] = state.months[f"{months[-1]:02d}"].metrics.get(key, 0)
+        else:
+            acc.metrics.pop(key, None)
+
+
+# ----------------------------
+# Firmas de insumos
+# ----------------------------
+def file_signature(path: Optional[Path]) -> Optional[List[Any]]:
+    if path is None:
+        return None
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return None
+    return [Path(path).name, st.st_size, st.st_mtime_ns]
+
+
+def sources_signature(files: Dict[str, Optional[Path]], **extra: Any) -> Dict[str, Any]:
+    """Firma de los insumos de un mes: archivos (nombre, tamaño, mtime) + valores externos."""
+    sig: Dict[str, Any] = {name: file_signature(p) for name, p in sorted(files.items())}
+    sig.update({k: v for k, v in sorted(extra.items())})
+    return sig
+
+
+# ----------------------------
+# Estado persistido
+# ----------------------------
+def state_path(storage_root: Path, company_id: str, year: int) -> Path:
+    return Path(storage_root) / "companies" / company_id / ANALYTICS_DIRNAME / f"ytd_{int(year)}.json"
+
+
+def load_state(storage_root: Path, company_id: str, year: int) -> YTDState:
+    path = state_path(storage_root, company_id, year)
+    if path.exists():
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == STATE_VERSION:
+                return YTDState.from_dict(data)
+        except Exception:
+            pass
+    return YTDState(year=int(year))
+
+
+def save_state(storage_root: Path, company_id: str, state: YTDState) -> Path:
+    out = state_path(storage_root, company_id, state.year)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(state.to_dict(), ensure_ascii=False), encoding="utf-8")
+    tmp.replace(out)
+    return out
+
+
+def is_current(state: YTDState, month: int, sources: Dict[str, Any]) -> bool:
+    entry = state.months.get(f"{int(month):02d}")
+    return entry is not None and entry.sources == sources
+
+
+def apply_month(state: YTDState, month: int, rollup: MonthRollup) -> bool:
+    """
+    Reemplaza el mes en el estado y ajusta el acumulado con la diferencia.
+    Retorna False si el mes ya tenía exactamente los mismos agregados y firma.
+    """
+    mm = f"{int(month):02d}"
+    old = state.months.get(mm)
+    if old is not None:
+        if old.to_dict() == rollup.to_dict():
+            return False
+        _apply(state.ytd, old, -1)
+    _apply(state.ytd, rollup, 1)
+    state.months[mm] = rollup
+    _set_balances(state.ytd, state)
+    return True
+
+
+def drop_month(state: YTDState, month: int) -> bool:
+    old = state.months.pop(f"{int(month):02d}", None)
+    if old is None:
+        return False
+    _apply(state.ytd, old, -1)
+    _set_balances(state.ytd, state)
+    return True
+
+
+def record_month(
+    storage_root: Path,
+    company_id: str,
+    summary: Dict[str, Any],
+    sources: Optional[Dict[str, Any]] = None,
+) -> YTDState:
+    """Registra un mes ya resumido (año/mes tomados de summary["period"]) y persiste si cambió."""
+    year = int(summary["period"]["year"])
+    month = int(summary["period"]["month"])
+    with _LOCK:
+        state = load_state(storage_root, company_id, year)
+        if apply_month(state, month, rollup_from_summary(summary, sources)):
+            save_state(storage_root, company_id, state)
+    return state
+
+
+# ----------------------------
+# Consultas
+# ----------------------------
+def ytd_totals(state: YTDState, to_month: Optional[int] = None) -> MonthRollup:
+    """
+    Acumulado enero..to_month. Si to_month cubre todos los meses cargados se devuelve el
+    acumulado persistido; si no, se suman solo los meses pedidos (a lo más 12 entradas).
+    Los saldos (BALANCE_METRICS) toman el valor del último mes incluido.
+    """
+    loaded = state.loaded_months()
+    if to_month is None or not loaded or int(to_month) >= loaded[-1]:
+        return state.ytd
+    acc = MonthRollup(metrics={}, by_code={s: {} for s in BY_CODE_SECTIONS})
+    for m in loaded:
+        if m <= int(to_month):
+            _apply(acc, state.months[f"{m:02d}"], 1)
+    _set_balances(acc, state, to_month)
+    return acc
+
+
+def missing_months(state: YTDState, to_month: int) -> List[int]:
+    return [m for m in range(1, int(to_month) + 1) if f"{m:02d}" not in state.months]
+
+
+def ytd_block(state: YTDState, to_month: int) -> Dict[str, Any]:
+    """Bloque serializable para reportes: acumulado, meses incluidos y faltantes."""
+    totals = ytd_totals(state, to_month)
+    months: List[Tuple[int, Dict[str, int]]] = [
+        (m, state.months[f"{m:02d}"].metrics) for m in state.loaded_months() if m <= int(to_month)
+    ]
+    return {
+        "year": state.year,
+        "to_month": int(to_month),
+        "totales": dict(totals.metrics),
+        "por_codigo": {s: dict(v) for s, v in totals.by_code.items()},
+        "meses": {f"{m:02d}": dict(metrics) for m, metrics in months},
+        "faltantes": missing_months(state, to_month),
+    }
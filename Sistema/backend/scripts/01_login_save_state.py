@@ -4,7 +4,10 @@ from __future__ import annotations
 import argparse
 from pathlib import Path
 
-from backend.app.services.sii_auth import login_and_save_state
+from backend.app.services import metrics, profiling
+from backend.app.services.sii_auth import company_id_from_rut, login_and_save_state
+from backend.app.services.sii_download import make_run_dir
+from backend.app.services.timing import start_run
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -31,13 +34,19 @@ def build_parser() -> argparse.ArgumentParser:
         help="URL inicial (default: SII_AUTH_URL del .env, o https://www.sii.cl/)",
     )
 
+    profiling.add_arguments(p)
     return p
 
 
 def main() -> None:
     args = build_parser().parse_args()
+    profiling.configure_from_args(args)
 
     storage_root = Path(args.storage_dir)
+    company_id = company_id_from_rut(args.rut)
+    run_dir = make_run_dir(storage_root, company_id)
+    start_run(run_dir / "logs", company=company_id)
+    metrics.start_from_env()
 
     # Resolución modo headless/ headed
     headless = True
@@ -3,8 +3,10 @@ from pathlib import Path
 
 from playwright.sync_api import sync_playwright
 
-from backend.app.services.sii_auth import company_id_from_rut, company_id_legacy_from_rut
+from backend.app.services import metrics, profiling
+from backend.app.services.company_storage import CompanyStorage
 from backend.app.services.sii_download import make_run_dir, download_file
+from backend.app.services.timing import start_run
 
 def main():
     parser = argparse.ArgumentParser()
@@ -14,24 +16,22 @@ def main():
     parser.add_argument("--click-selector", required=True, help="Selector CSS del botón/link que dispara la descarga")
     parser.add_argument("--headless", action="store_true")
     parser.add_argument("--storage-dir", default="storage")
+    profiling.add_arguments(parser)
     args = parser.parse_args()
+    profiling.configure_from_args(args)
 
-    company_id = company_id_from_rut(args.rut)
-    legacy_company_id = company_id_legacy_from_rut(args.rut)
+    company = CompanyStorage.for_rut(Path(args.storage_dir), args.rut)
+    company_id = company.company_id
 
-    if args.state_path:
-        state_path = Path(args.state_path)
-    else:
-        state_path = Path(args.storage_dir) / "companies" / company_id / "playwright_state" / "state.json"
-        legacy_state_path = Path(args.storage_dir) / "companies" / legacy_company_id / "playwright_state" / "state.json"
-        if not state_path.exists() and legacy_state_path.exists():
-            state_path = legacy_state_path
+    state_path = Path(args.state_path) if args.state_path else company.state_path()
 
     if not state_path.exists():
         raise SystemExit(f"No existe state: {state_path}. Ejecute primero 01_login_save_state.py")
 
     base_dir = Path(args.storage_dir)
     run_dir = make_run_dir(base_dir, company_id)
+    start_run(run_dir / "logs", company=company_id)
+    metrics.start_from_env()
 
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=args.headless)
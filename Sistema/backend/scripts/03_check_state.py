@@ -2,7 +2,7 @@ import argparse
 from pathlib import Path
 from playwright.sync_api import sync_playwright
 
-from backend.app.services.sii_auth import company_id_from_rut, company_id_legacy_from_rut
+from backend.app.services.company_storage import CompanyStorage
 
 def main():
     p = argparse.ArgumentParser()
@@ -11,12 +11,7 @@ def main():
     p.add_argument("--headless", action="store_true")
     args = p.parse_args()
 
-    company_id = company_id_from_rut(args.rut)
-    legacy_company_id = company_id_legacy_from_rut(args.rut)
-    state_path = Path(args.storage_dir) / "companies" / company_id / "playwright_state" / "state.json"
-    legacy_state_path = Path(args.storage_dir) / "companies" / legacy_company_id / "playwright_state" / "state.json"
-    if not state_path.exists() and legacy_state_path.exists():
-        state_path = legacy_state_path
+    state_path = CompanyStorage.for_rut(Path(args.storage_dir), args.rut).state_path()
     if not state_path.exists():
         raise SystemExit(f"No existe state: {state_path}")
 
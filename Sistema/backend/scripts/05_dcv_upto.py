@@ -3,8 +3,12 @@ import json
 from pathlib import Path
 from playwright.sync_api import sync_playwright
 
-from backend.app.services.sii_auth import company_id_from_rut, company_id_legacy_from_rut
+from backend.app.services import metrics, profiling
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.rcv_dataset import sync_year
 from backend.app.services.sii_dcv import download_month_all
+from backend.app.services.sii_download import make_run_dir
+from backend.app.services.timing import bind, period_label, start_run
 
 def _load_manifest(path: Path) -> dict:
     if not path.exists():
@@ -34,25 +38,28 @@ def main():
     p.add_argument("--to-month", type=int, required=True, help="1-12 (ej: 2 = Febrero)")
     p.add_argument("--storage-dir", default="storage")
     p.add_argument("--headless", action="store_true")
+    profiling.add_arguments(p)
     args = p.parse_args()
+    profiling.configure_from_args(args)
 
     if not (1 <= args.to_month <= 12):
         raise SystemExit("--to-month debe estar entre 1 y 12")
 
     storage_dir = Path(args.storage_dir)
-    company_id = company_id_from_rut(args.rut)
-    legacy_company_id = company_id_legacy_from_rut(args.rut)
-    state_path = storage_dir / "companies" / company_id / "playwright_state" / "state.json"
-    legacy_state_path = storage_dir / "companies" / legacy_company_id / "playwright_state" / "state.json"
-
-    if not state_path.exists() and legacy_state_path.exists():
-        state_path = legacy_state_path
+    company = CompanyStorage.for_rut(storage_dir, args.rut)
+    company_id = company.company_id
+    state_path = company.state_path()
 
     if not state_path.exists():
         raise SystemExit(f"No existe state.json en: {state_path}")
 
     missing_months = _missing_months(storage_dir, company_id, args.year, args.to_month)
     if missing_months:
+        run_dir = make_run_dir(storage_dir, company_id)
+        start_run(run_dir / "logs", company=company_id)
+        metrics.start_from_env()
+        metrics.QUEUE_DEPTH.set(len(missing_months), source="dcv")
+
         with sync_playwright() as pw:
             browser = pw.chromium.launch(headless=args.headless)
             context = browser.new_context(storage_state=str(state_path), accept_downloads=True)
@@ -60,13 +67,17 @@ def main():
 
             nuevos = []
             for m in missing_months:
-                artifacts = download_month_all(page, storage_dir, company_id, args.year, m)
+                with bind(period=period_label(args.year, m)):
+                    artifacts = download_month_all(page, storage_dir, company_id, args.year, m)
+                metrics.QUEUE_DEPTH.dec(source="dcv")
                 nuevos.extend([a.saved_path for a in artifacts])
 
             if nuevos:
                 print("[OK] Archivos nuevos generados:")
                 for f in nuevos:
                     print(" -", f)
+                written = sync_year(storage_dir, company_id, args.year, to_month=args.to_month, storage=company)
+                print(f"[OK] Dataset RCV: {len(written)} particiones actualizadas.")
             else:
                 print("[OK] No hubo archivos nuevos (manifest ya cubría el rango).")
 
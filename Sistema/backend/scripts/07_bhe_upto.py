@@ -4,12 +4,12 @@ from pathlib import Path
 
 from playwright.sync_api import sync_playwright
 
-from backend.app.services.sii_auth import (
-    company_id_from_rut,
-    company_id_legacy_from_rut,
-    normalize_rut,
-)
+from backend.app.services import metrics, profiling
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.sii_auth import normalize_rut
 from backend.app.services.sii_bhe import fetch_bhe_month
+from backend.app.services.sii_download import make_run_dir
+from backend.app.services.timing import bind, period_label, start_run
 
 def _load_manifest(path: Path) -> dict:
     if not path.exists():
@@ -45,18 +45,17 @@ def main():
     p.add_argument("--download-xls", action="store_true", help="Descargar también la planilla XLS (no recomendado).")
     p.add_argument("--evidence", action="store_true", help="Guardar PNG como evidencia (opcional).")
 
+    profiling.add_arguments(p)
     args = p.parse_args()
+    profiling.configure_from_args(args)
 
     if not (1 <= args.to_month <= 12):
         raise SystemExit("--to-month debe estar entre 1 y 12")
 
     storage_dir = Path(args.storage_dir)
-    company_id = company_id_from_rut(args.rut)
-    legacy_company_id = company_id_legacy_from_rut(args.rut)
-    state_path = storage_dir / "companies" / company_id / "playwright_state" / "state.json"
-    legacy_state_path = storage_dir / "companies" / legacy_company_id / "playwright_state" / "state.json"
-    if not state_path.exists() and legacy_state_path.exists():
-        state_path = legacy_state_path
+    company = CompanyStorage.for_rut(storage_dir, args.rut)
+    company_id = company.company_id
+    state_path = company.state_path()
     if not state_path.exists():
         raise SystemExit(f"No existe state.json en: {state_path}")
 
@@ -65,6 +64,11 @@ def main():
 
     missing_months = _missing_months(storage_dir, company_id, args.year, args.to_month)
     if missing_months:
+        run_dir = make_run_dir(storage_dir, company_id)
+        start_run(run_dir / "logs", company=company_id)
+        metrics.start_from_env()
+        metrics.QUEUE_DEPTH.set(len(missing_months), source="bhe")
+
         with sync_playwright() as pw:
             browser = pw.chromium.launch(headless=args.headless)
             context = browser.new_context(storage_state=str(state_path), accept_downloads=True)
@@ -72,16 +76,18 @@ def main():
 
             nuevos = []
             for m in missing_months:
-                art = fetch_bhe_month(
-                    page=page,
-                    storage_dir=storage_dir,
-                    company_id=company_id,
-                    rut_sin_dv=rut_sin_dv,
-                    year=args.year,
-                    month=m,
-                    evidence=args.evidence,
-                    download_xls=args.download_xls,
-                )
+                with bind(period=period_label(args.year, m)):
+                    art = fetch_bhe_month(
+                        page=page,
+                        storage_dir=storage_dir,
+                        company_id=company_id,
+                        rut_sin_dv=rut_sin_dv,
+                        year=args.year,
+                        month=m,
+                        evidence=args.evidence,
+                        download_xls=args.download_xls,
+                    )
+                metrics.QUEUE_DEPTH.dec(source="bhe")
                 if art:
                     nuevos.append(art)
 
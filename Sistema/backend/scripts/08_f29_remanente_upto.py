@@ -2,8 +2,11 @@ import argparse
 from pathlib import Path
 from playwright.sync_api import sync_playwright
 
-from backend.app.services.sii_auth import company_id_from_rut, company_id_legacy_from_rut
-from backend.app.services.sii_f29_remanente import fetch_remanente_prev_month
+from backend.app.services import metrics, profiling
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.sii_download import make_run_dir
+from backend.app.services.sii_f29_remanente import fetch_remanente_chain, fetch_remanente_prev_month
+from backend.app.services.timing import bind, period_label, start_run
 
 
 def main():
@@ -13,32 +16,54 @@ def main():
     p.add_argument("--to-month", type=int, required=True)
     p.add_argument("--storage-dir", default="storage")
     p.add_argument("--headless", action="store_true")
+    p.add_argument(
+        "--chain",
+        action="store_true",
+        help="Abrir cada F29 declarado una sola vez (caché f29_cache.json) y derivar todos los meses",
+    )
+    p.add_argument(
+        "--force",
+        action="store_true",
+        help="Con --chain: volver a abrir los F29 aunque estén en caché o en el manifest",
+    )
+    profiling.add_arguments(p)
     args = p.parse_args()
+    profiling.configure_from_args(args)
 
     if not (1 <= args.to_month <= 12):
         raise SystemExit("--to-month debe estar entre 1 y 12")
 
     storage_dir = Path(args.storage_dir)
-    company_id = company_id_from_rut(args.rut)
-    legacy_company_id = company_id_legacy_from_rut(args.rut)
-
-    state_path = storage_dir / "companies" / company_id / "playwright_state" / "state.json"
-    legacy_state_path = storage_dir / "companies" / legacy_company_id / "playwright_state" / "state.json"
-    if not state_path.exists() and legacy_state_path.exists():
-        state_path = legacy_state_path
+    company = CompanyStorage.for_rut(storage_dir, args.rut)
+    company_id = company.company_id
+    state_path = company.state_path()
     if not state_path.exists():
         raise SystemExit(f"No existe state.json en: {state_path}")
 
+    run_dir = make_run_dir(storage_dir, company_id)
+    start_run(run_dir / "logs", company=company_id)
+    metrics.start_from_env()
+    metrics.QUEUE_DEPTH.set(args.to_month, source="f29")
+
     with sync_playwright() as pw:
         browser = pw.chromium.launch(headless=args.headless)
         context = browser.new_context(storage_state=str(state_path), accept_downloads=True)
         page = context.new_page()
 
         nuevos = []
-        for m in range(1, args.to_month + 1):
-            res = fetch_remanente_prev_month(page, storage_dir, company_id, args.year, m)
-            if res:
-                nuevos.append(res)
+        if args.chain:
+            with bind(period=period_label(args.year, args.to_month)):
+                nuevos = fetch_remanente_chain(
+                    page, storage_dir, company_id, args.year, list(range(1, args.to_month + 1)), force=args.force
+                )
+            metrics.QUEUE_DEPTH.set(0, source="f29")
+        else:
+            for m in range(1, args.to_month + 1):
+                with bind(period=period_label(args.year, m)):
+                    res = fetch_remanente_prev_month(page, storage_dir, company_id, args.year, m)
+                metrics.QUEUE_DEPTH.dec(source="f29")
+                if res:
+                    nuevos.append(res)
 
         if nuevos:
             print("[OK] Remanentes (código 77) procesados:")
@@ -3,14 +3,15 @@ import json
 from pathlib import Path
 
 from playwright.sync_api import sync_playwright
-from backend.app.services.sii_auth import (
-    company_id_from_rut,
-    company_id_legacy_from_rut,
-    normalize_rut,
-)
+from backend.app.services import metrics, profiling
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.rcv_dataset import sync_year
+from backend.app.services.sii_auth import normalize_rut
 from backend.app.services.sii_bhe import fetch_bhe_month
 from backend.app.services.sii_dcv import download_month_all
+from backend.app.services.sii_download import make_run_dir
 from backend.app.services.sii_f29_remanente import fetch_remanente_prev_month
+from backend.app.services.timing import bind, period_label, start_run
 
 def _load_manifest(path: Path, root_key: str) -> dict:
     if not path.exists():
@@ -79,18 +80,17 @@ def main():
     p.add_argument("--storage-dir", default="storage")
     p.add_argument("--headless", action="store_true")
 
+    profiling.add_arguments(p)
     args = p.parse_args()
+    profiling.configure_from_args(args)
 
     if not (1 <= args.to_month <= 12):
         raise SystemExit("--to-month debe estar entre 1 y 12")
 
     storage_dir = Path(args.storage_dir)
-    company_id = company_id_from_rut(args.rut)
-    legacy_company_id = company_id_legacy_from_rut(args.rut)
-    state_path = storage_dir / "companies" / company_id / "playwright_state" / "state.json"
-    legacy_state_path = storage_dir / "companies" / legacy_company_id / "playwright_state" / "state.json"
-    if not state_path.exists() and legacy_state_path.exists():
-        state_path = legacy_state_path
+    company = CompanyStorage.for_rut(storage_dir, args.rut)
+    company_id = company.company_id
+    state_path = company.state_path()
     if not state_path.exists():
         raise SystemExit(f"No existe state.json en: {state_path}")
 
@@ -106,6 +106,13 @@ def main():
     need_rem = bool(missing_rem)
 
     if need_dcv or need_bhe or need_rem:
+        run_dir = make_run_dir(storage_dir, company_id)
+        start_run(run_dir / "logs", company=company_id)
+        metrics.start_from_env()
+        metrics.QUEUE_DEPTH.set(len(missing_dcv), source="dcv")
+        metrics.QUEUE_DEPTH.set(len(missing_bhe), source="bhe")
+        metrics.QUEUE_DEPTH.set(len(missing_rem), source="f29")
+
         with sync_playwright() as pw:
             browser = pw.chromium.launch(headless=args.headless)
             context = browser.new_context(storage_state=str(state_path), accept_downloads=True)
@@ -114,19 +121,25 @@ def main():
             # 1) DCV
             nuevos_dcv = []
             for m in missing_dcv:
-                artifacts = download_month_all(page, storage_dir, company_id, args.year, m)
+                with bind(period=period_label(args.year, m)):
+                    artifacts = download_month_all(page, storage_dir, company_id, args.year, m)
+                metrics.QUEUE_DEPTH.dec(source="dcv")
                 nuevos_dcv.extend([a.saved_path for a in artifacts])
             if nuevos_dcv:
                 print("[OK] Archivos DCV nuevos:")
                 for f in nuevos_dcv:
                     print(" -", f)
+                written = sync_year(storage_dir, company_id, args.year, to_month=args.to_month, storage=company)
+                print(f"[OK] Dataset RCV: {len(written)} particiones actualizadas.")
             else:
                 print("[OK] No hubo archivos DCV nuevos (manifest ya cubria el rango).")
 
             # 2) BHE (honorarios)
             nuevos_bhe = []
             for m in missing_bhe:
-                art = fetch_bhe_month(page, storage_dir, company_id, rut_sin_dv, args.year, m)
+                with bind(period=period_label(args.year, m)):
+                    art = fetch_bhe_month(page, storage_dir, company_id, rut_sin_dv, args.year, m)
+                metrics.QUEUE_DEPTH.dec(source="bhe")
                 if art:
                     nuevos_bhe.append(art)
             if nuevos_bhe:
@@ -139,7 +152,9 @@ def main():
             # 3) F29 Remanente (codigo 77 del mes anterior)
             nuevos_rem = []
             for m in missing_rem:
-                res = fetch_remanente_prev_month(page, storage_dir, company_id, args.year, m)
+                with bind(period=period_label(args.year, m)):
+                    res = fetch_remanente_prev_month(page, storage_dir, company_id, args.year, m)
+                metrics.QUEUE_DEPTH.dec(source="f29")
                 if res:
                     nuevos_rem.append(res)
             if nuevos_rem:
@@ -4,14 +4,14 @@ import shutil
 from pathlib import Path
 
 from playwright.sync_api import sync_playwright
-from backend.app.services.sii_auth import (
-    company_id_from_rut,
-    company_id_legacy_from_rut,
-    normalize_rut,
-)
+from backend.app.services import metrics, profiling
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.sii_auth import normalize_rut
 from backend.app.services.sii_bhe import fetch_bhe_month
 from backend.app.services.sii_dcv import download_month_all
+from backend.app.services.sii_download import make_run_dir
 from backend.app.services.sii_f29_remanente import fetch_remanente_prev_month
+from backend.app.services.timing import period_label, start_run
 
 
 def _load_manifest(path: Path, root_key: str) -> dict:
@@ -91,18 +91,17 @@ def main() -> None:
     p.add_argument("--storage-dir", default="storage")
     p.add_argument("--headless", action="store_true")
 
+    profiling.add_arguments(p)
     args = p.parse_args()
+    profiling.configure_from_args(args)
 
     if not (1 <= args.to_month <= 12):
         raise SystemExit("--to-month debe estar entre 1 y 12")
 
     storage_dir = Path(args.storage_dir)
-    company_id = company_id_from_rut(args.rut)
-    legacy_company_id = company_id_legacy_from_rut(args.rut)
-    state_path = storage_dir / "companies" / company_id / "playwright_state" / "state.json"
-    legacy_state_path = storage_dir / "companies" / legacy_company_id / "playwright_state" / "state.json"
-    if not state_path.exists() and legacy_state_path.exists():
-        state_path = legacy_state_path
+    company = CompanyStorage.for_rut(storage_dir, args.rut)
+    company_id = company.company_id
+    state_path = company.state_path()
     if not state_path.exists():
         raise SystemExit(f"No existe state.json en: {state_path}")
 
@@ -127,6 +126,10 @@ def main() -> None:
         for pth in removed_rem:
             print(" -", pth)
 
+    run_dir = make_run_dir(storage_dir, company_id)
+    start_run(run_dir / "logs", company=company_id, period=period_label(args.year, args.to_month))
+    metrics.start_from_env()
+
     with sync_playwright() as pw:
         browser = pw.chromium.launch(headless=args.headless)
         context = browser.new_context(storage_state=str(state_path), accept_downloads=True)
@@ -4,19 +4,15 @@ from pathlib import Path
 
 from playwright.sync_api import sync_playwright
 
+from backend.app.services import metrics, profiling, ytd_rollup
+from backend.app.services.company_storage import CompanyStorage
 from backend.app.services.monthly_tax_pdf import generate_monthly_tax_summary_pdf
-from backend.app.services.sii_auth import company_id_from_rut, company_id_legacy_from_rut, normalize_rut
+from backend.app.services.sii_auth import normalize_rut
 from backend.app.services.sii_bhe import fetch_bhe_month
 from backend.app.services.sii_dcv import download_month_all
+from backend.app.services.sii_download import make_run_dir
 from backend.app.services.sii_f29_remanente import fetch_remanente_prev_month
-
-
-def _pick_latest_file(folder: Path, patterns: list[str]) -> Path | None:
-    for pattern in patterns:
-        matches = sorted(folder.glob(pattern))
-        if matches:
-            return matches[-1]
-    return None
+from backend.app.services.timing import bind, period_label, start_run
 
 
 def _load_manifest(path: Path, root_key: str) -> dict:
@@ -78,30 +74,36 @@ def main():
         action="store_true",
         help="Generar PDF para todos los meses 1..to-month (por defecto solo el mes to-month).",
     )
+    profiling.add_arguments(p)
     args = p.parse_args()
+    profiling.configure_from_args(args)
 
     if not (1 <= args.to_month <= 12):
         raise SystemExit("--to-month debe estar entre 1 y 12")
 
     storage_root = Path(args.storage_dir)
-    company_id = company_id_from_rut(args.rut)
-    legacy_company_id = company_id_legacy_from_rut(args.rut)
-
-    state_path = storage_root / "companies" / company_id / "playwright_state" / "state.json"
-    legacy_state_path = storage_root / "companies" / legacy_company_id / "playwright_state" / "state.json"
-    if not state_path.exists() and legacy_state_path.exists():
-        state_path = legacy_state_path
+    company = CompanyStorage.for_rut(storage_root, args.rut)
+    company_id = company.company_id
+    state_path = company.state_path()
     if not state_path.exists():
         raise SystemExit(f"No existe state.json en: {state_path}")
 
     rut_norm = normalize_rut(args.rut)
     rut_sin_dv = rut_norm.split("-", 1)[0]
 
+    run_dir = make_run_dir(storage_root, company_id)
+    start_run(run_dir / "logs", company=company_id)
+    metrics.start_from_env()
+
     missing_dcv = _missing_dcv(storage_root, company_id, args.year, args.to_month)
     missing_bhe = _missing_bhe(storage_root, company_id, args.year, args.to_month)
     missing_rem = _missing_remanente(storage_root, company_id, args.year, args.to_month)
 
     if missing_dcv or missing_bhe or missing_rem:
+        metrics.QUEUE_DEPTH.set(len(missing_dcv), source="dcv")
+        metrics.QUEUE_DEPTH.set(len(missing_bhe), source="bhe")
+        metrics.QUEUE_DEPTH.set(len(missing_rem), source="f29")
+
         with sync_playwright() as pw:
             browser = pw.chromium.launch(headless=args.headless)
             context = browser.new_context(storage_state=str(state_path), accept_downloads=True)
@@ -110,60 +112,41 @@ def main():
             page_rem = context.new_page()
 
             for m in missing_dcv:
-                download_month_all(page_dcv, storage_root, company_id, args.year, m)
+                with bind(period=period_label(args.year, m)):
+                    download_month_all(page_dcv, storage_root, company_id, args.year, m)
+                metrics.QUEUE_DEPTH.dec(source="dcv")
 
             for m in missing_bhe:
-                fetch_bhe_month(page_bhe, storage_root, company_id, rut_sin_dv, args.year, m)
+                with bind(period=period_label(args.year, m)):
+                    fetch_bhe_month(page_bhe, storage_root, company_id, rut_sin_dv, args.year, m)
+                metrics.QUEUE_DEPTH.dec(source="bhe")
 
             for m in missing_rem:
-                fetch_remanente_prev_month(page_rem, storage_root, company_id, args.year, m)
+                with bind(period=period_label(args.year, m)):
+                    fetch_remanente_prev_month(page_rem, storage_root, company_id, args.year, m)
+                metrics.QUEUE_DEPTH.dec(source="f29")
 
             context.close()
             browser.close()
 
-    company_dir = storage_root / "companies" / company_id
-    legacy_company_dir = storage_root / "companies" / legacy_company_id
-
-    profile_path = company_dir / "profile.json"
-    if not profile_path.exists():
-        legacy_profile = legacy_company_dir / "profile.json"
-        if legacy_profile.exists():
-            profile_path = legacy_profile
-
-    razon_social = company_id
-    if profile_path.exists():
-        try:
-            profile = json.loads(profile_path.read_text(encoding="utf-8"))
-            razon_social = profile.get("razon_social") or profile.get("rut") or company_id
-        except Exception:
-            razon_social = company_id
+    # Lo descargado arriba aún no está en los listados: se listan ahora, una vez por año.
+    company.invalidate()
+    company.prefetch_year("dcv", args.year)
+    company.prefetch_year("bhe", args.year)
+    razon_social = company.razon_social()
 
     months = range(1, args.to_month + 1) if args.pdf_all_months else [args.to_month]
+    rem_index = company.remanente_index()
     for month in months:
-        dcv_dir = storage_root / "companies" / company_id / "dcv" / str(args.year) / f"{month:02d}"
-        ventas_path = _pick_latest_file(
-            dcv_dir,
-            [
-                f"RCV_VENTA_*_{args.year}{month:02d}*.csv",
-                f"VENTAS_{args.year}{month:02d}*.csv",
-            ],
-        )
-        compras_path = _pick_latest_file(
-            dcv_dir,
-            [
-                f"RCV_COMPRA_*_{args.year}{month:02d}*.csv",
-                f"COMPRAS_{args.year}{month:02d}*.csv",
-            ],
-        )
-
+        ventas_path = company.ventas(args.year, month)
+        compras_path = company.compras(args.year, month)
         if not ventas_path or not compras_path:
-            raise SystemExit(f"No se encontraron archivos DCV en {dcv_dir}")
+            raise SystemExit(f"No se encontraron archivos DCV en {company.month_dir('dcv', args.year, month)}")
 
-        bhe_dir = storage_root / "companies" / company_id / "bhe" / str(args.year) / f"{month:02d}"
-        bhe_path = _pick_latest_file(bhe_dir, ["*.html", "*.htm", "*.xls", "*.xlsx"])
+        bhe_path = company.bhe(args.year, month)
 
-        rem_dir = storage_root / "companies" / company_id / "f29_remanente" / str(args.year) / f"{month:02d}"
-        rem_path = _pick_latest_file(rem_dir, ["*.json", "*.html", "*.pdf", "*.txt"])
+        # Remanente desde el índice (O(1) por mes; cada archivo se extrae una sola vez).
+        rem_entry = rem_index.get(args.year, month)
 
         out_pdf = (
             storage_root
@@ -173,16 +156,27 @@ def main():
             / f"Resumen_{company_id}_{args.year}_{month:02d}.pdf"
         )
 
-        summary = generate_monthly_tax_summary_pdf(
-            company_name=str(razon_social),
-            period_year=int(args.year),
-            period_month=int(month),
-            ventas_path=str(ventas_path),
-            compras_path=str(compras_path),
-            boletas_honorarios_path=str(bhe_path) if bhe_path else None,
-            formulario_compacto_path=str(rem_path) if rem_path else None,
-            out_pdf_path=str(out_pdf),
+        with bind(period=period_label(args.year, month)):
+            summary = generate_monthly_tax_summary_pdf(
+                company_name=str(razon_social),
+                period_year=int(args.year),
+                period_month=int(month),
+                ventas_path=str(ventas_path),
+                compras_path=str(compras_path),
+                boletas_honorarios_path=str(bhe_path) if bhe_path else None,
+                formulario_compacto_path=None,
+                remanente_override=rem_entry.codigo_77 if rem_entry else None,
+                out_pdf_path=str(out_pdf),
+            )
+
+        # Acumulado anual: el mes recién resumido ajusta el YTD con su diferencia.
+        boletas_path = company.boletas(args.year, month)
+        sources = ytd_rollup.sources_signature(
+            {"ventas": ventas_path, "compras": compras_path, "bhe": bhe_path, "boletas": boletas_path},
+            remanente=rem_entry.codigo_77 if rem_entry else None,
+            ppm_factor=None,
         )
+        ytd_rollup.record_month(storage_root, company_id, summary, sources)
 
         print("PDF generado:", out_pdf)
         print("Resumen:", json.dumps(summary.get("totales", {}), ensure_ascii=False))
@@ -6,7 +6,11 @@ import subprocess
 import sys
 from pathlib import Path
 
-from backend.app.services.sii_auth import company_id_from_rut, company_id_legacy_from_rut, login_and_save_state
+from backend.app.services import metrics, profiling
+from backend.app.services.company_storage import CompanyStorage
+from backend.app.services.sii_auth import login_and_save_state
+from backend.app.services.sii_download import make_run_dir
+from backend.app.services.timing import start_run
 
 
 def _load_profile_password(profile_path: Path) -> str | None:
@@ -22,14 +26,12 @@ def _load_profile_password(profile_path: Path) -> str | None:
     return None
 
 
-def _resolve_password(storage_dir: Path, company_id: str, legacy_company_id: str) -> str | None:
-    profile_path = storage_dir / "companies" / company_id / "profile.json"
-    password = _load_profile_password(profile_path)
-    if password:
-        return password
-
-    legacy_profile = storage_dir / "companies" / legacy_company_id / "profile.json"
-    return _load_profile_password(legacy_profile)
+def _resolve_password(company: CompanyStorage) -> str | None:
+    for company_dir in (company.dir, company.legacy_dir):
+        password = _load_profile_password(company_dir / "profile.json") if company_dir else None
+        if password:
+            return password
+    return None
 
 
 def _ensure_login_state(
@@ -38,21 +40,22 @@ def _ensure_login_state(
     rut: str,
     headless: bool,
 ) -> None:
-    company_id = company_id_from_rut(rut)
-    legacy_company_id = company_id_legacy_from_rut(rut)
-
-    state_path = storage_dir / "companies" / company_id / "playwright_state" / "state.json"
-    legacy_state_path = storage_dir / "companies" / legacy_company_id / "playwright_state" / "state.json"
-    if state_path.exists() or legacy_state_path.exists():
+    company = CompanyStorage.for_rut(storage_dir, rut)
+    company_id = company.company_id
+    if company.has_state():
         return
 
-    password = _resolve_password(storage_dir, company_id, legacy_company_id)
+    password = _resolve_password(company)
     if not password:
         raise SystemExit(
             "No existe state.json ni password guardado en profile.json. "
             "Primero ejecuta 01_login_save_state.py con --rut y --clave."
         )
 
+    run_dir = make_run_dir(storage_dir, company_id)
+    start_run(run_dir / "logs", company=company_id)
+    metrics.start_from_env()
+
     login_and_save_state(
         rut=rut,
         clave=password,
@@ -73,7 +76,9 @@ def main() -> None:
         action="store_true",
         help="Generar PDF para todos los meses 1..to-month (por defecto solo el mes to-month).",
     )
+    profiling.add_arguments(p)
     args = p.parse_args()
+    profiling.configure_from_args(args)
 
     storage_dir = Path(args.storage_dir)
     _ensure_login_state(storage_dir=storage_dir, rut=args.rut, headless=bool(args.headless))
@@ -95,6 +100,7 @@ def main() -> None:
         cmd.append("--headless")
     if args.pdf_all_months:
         cmd.append("--pdf-all-months")
+    cmd += profiling.cli_passthrough(args)
 
     subprocess.run(cmd, check=True)
 
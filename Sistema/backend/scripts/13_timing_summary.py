@@ -0,0 +1,41 @@
+import argparse
+import json
+from pathlib import Path
+
+from backend.app.services.timing import STAGES, find_timing_files, iter_records, summarize
+
+
+def main():
+    p = argparse.ArgumentParser(description="Resumen p50/p95 por etapa desde runs/*/logs/timings.jsonl.")
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--company-id", default=None, help="Limitar a una empresa (default: toda la flota)")
+    p.add_argument("--period", default=None, help="Filtrar por período AAAA-MM")
+    p.add_argument("--json", action="store_true", help="Imprimir el resumen como JSON")
+    args = p.parse_args()
+
+    files = find_timing_files(Path(args.storage_dir), args.company_id)
+    if not files:
+        raise SystemExit(f"No hay timings.jsonl bajo {Path(args.storage_dir) / 'companies'}")
+
+    records = iter_records(files)
+    if args.period:
+        records = (r for r in records if r.get("period") == args.period)
+    stats = summarize(records)
+
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return
+
+    order = [s for s in STAGES if s in stats] + sorted(s for s in stats if s not in STAGES)
+    print(f"[OK] {len(files)} archivos de timings")
+    print(f"{'etapa':<20}{'n':>7}{'err':>6}{'p50 ms':>12}{'p95 ms':>12}{'max ms':>12}{'bytes':>14}")
+    for stage in order:
+        st = stats[stage]
+        print(
+            f"{stage:<20}{st['count']:>7}{st['errors']:>6}{st['p50_ms']:>12.1f}"
+            f"{st['p95_ms']:>12.1f}{st['max_ms']:>12.1f}{st['bytes']:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import tempfile
+from pathlib import Path
+
+from backend.app.services import profiling
+from backend.app.services.benchmark import (
+    compare_results,
+    load_result,
+    resolve_result_path,
+    run_benchmark,
+    save_result,
+)
+from backend.app.services.sii_synthetic import SyntheticConfig, generate_fleet
+
+
+def _add_scale_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--year", type=int, default=2025)
+    p.add_argument("--to-month", type=int, default=12)
+    p.add_argument("--compras-rows", type=int, default=200, help="Filas por mes en RCV compras")
+    p.add_argument("--ventas-rows", type=int, default=600, help="Filas por mes en RCV ventas")
+    p.add_argument("--bhe-rows", type=int, default=12, help="Boletas de honorarios por mes")
+    p.add_argument("--no-boletas", action="store_true", help="No generar VENTAS_BOLETAS_RESUMEN")
+    p.add_argument("--seed", type=int, default=1234)
+
+
+def _config(args) -> SyntheticConfig:
+    return SyntheticConfig(
+        year=args.year,
+        to_month=args.to_month,
+        compras_rows=args.compras_rows,
+        ventas_rows=args.ventas_rows,
+        bhe_rows=args.bhe_rows,
+        with_boletas=not args.no_boletas,
+        seed=args.seed,
+    )
+
+
+def _print_compare(rows: list, threshold: float) -> bool:
+    print(f"{'caso':<28}{'baseline':>12}{'actual':>12}{'delta %':>10}")
+    failed = False
+    for r in rows:
+        base = "-" if r["baseline"] is None else f"{r['baseline']:.1f}"
+        cur = "-" if r["current"] is None else f"{r['current']:.1f}"
+        delta = "-" if r["delta_pct"] is None else f"{r['delta_pct']:+.1f}"
+        flag = "  REGRESION" if r["regression"] else ""
+        print(f"{r['case']:<28}{base:>12}{cur:>12}{delta:>10}{flag}")
+        failed = failed or r["regression"]
+    if failed:
+        print(f"[WARN] Regresión sobre umbral {threshold:.1f}%")
+    return failed
+
+
+def main():
+    p = argparse.ArgumentParser(description="Datos SII sintéticos y benchmark del resumen mensual.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    g = sub.add_parser("generate", help="Generar empresas sintéticas bajo <storage-dir>/companies")
+    g.add_argument("--storage-dir", required=True, help="Destino (no usar el storage productivo)")
+    g.add_argument("--companies", type=int, default=1)
+    _add_scale_args(g)
+
+    r = sub.add_parser("run", help="Generar datos temporales y medir las etapas del resumen")
+    r.add_argument("--storage-dir", default="storage", help="Donde guardar storage/bench/<label>.json")
+    r.add_argument("--label", required=True)
+    r.add_argument("--month", type=int, default=None)
+    r.add_argument("--repeat", type=int, default=5)
+    r.add_argument("--warmup", type=int, default=1)
+    r.add_argument("--baseline", default=None, help="Label o ruta .json para comparar al terminar")
+    r.add_argument("--threshold", type=float, default=10.0, help="Umbral de regresión en %% (p50)")
+    _add_scale_args(r)
+    profiling.add_arguments(r)
+
+    c = sub.add_parser("compare", help="Comparar dos resultados guardados")
+    c.add_argument("--storage-dir", default="storage")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "min_ms", "max_ms"])
+    c.add_argument("--threshold", type=float, default=10.0)
+
+    args = p.parse_args()
+    profiling.configure_from_args(args)
+    storage_dir = Path(args.storage_dir)
+
+    if args.cmd == "generate":
+        fleet = generate_fleet(storage_dir, args.companies, _config(args))
+        files = sum(len(c.files) for c in fleet)
+        print(f"[OK] {len(fleet)} empresas sintéticas, {files} archivos en {storage_dir / 'companies'}")
+        for company in fleet:
+            print(f"  {company.company_id}  {company.razon_social}")
+        return
+
+    if args.cmd == "run":
+        with tempfile.TemporaryDirectory(prefix="sii_synthetic_") as tmp:
+            result = run_benchmark(
+                Path(tmp),
+                _config(args),
+                label=args.label,
+                month=args.month,
+                repeat=args.repeat,
+                warmup=args.warmup,
+            )
+        out = save_result(storage_dir, result)
+        print(f"[OK] Benchmark guardado: {out}")
+        for name, case in result.cases.items():
+            print(f"  {name:<28} p50={case.p50_ms:>9.1f} ms  p95={case.p95_ms:>9.1f} ms  n={case.runs}")
+        if args.baseline:
+            base = load_result(resolve_result_path(storage_dir, args.baseline))
+            rows = compare_results(base, load_result(out), threshold_pct=args.threshold)
+            if _print_compare(rows, args.threshold):
+                raise SystemExit(1)
+        return
+
+    base = load_result(resolve_result_path(storage_dir, args.baseline))
+    cur = load_result(resolve_result_path(storage_dir, args.current))
+    rows = compare_results(base, cur, metric=args.metric, threshold_pct=args.threshold)
+    if _print_compare(rows, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
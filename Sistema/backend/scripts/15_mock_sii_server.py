@@ -0,0 +1,52 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+from backend.app.services.sii_mock_server import MockConfig, start_mock_server
+
+
+def main():
+    p = argparse.ArgumentParser(description="Servidor SII local (mock) para medir scrapers sin tocar el portal.")
+    p.add_argument("--storage-dir", default="storage", help="Storage con artefactos grabados (real o sintético)")
+    p.add_argument("--company-id", default=None, help="Empresa por defecto si no hay sesión (cookie)")
+    p.add_argument("--addr", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency-ms", type=int, default=0, help="Latencia fija por request")
+    p.add_argument("--jitter-ms", type=int, default=0, help="Latencia aleatoria adicional (0..jitter)")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Fracción de requests con error (0..1)")
+    p.add_argument("--error-status", type=int, default=503)
+    p.add_argument("--no-modal", action="store_true", help="No mostrar modal 'Actualizar datos' post-login")
+    p.add_argument("--seed", type=int, default=None, help="Semilla para latencia/errores repetibles")
+    args = p.parse_args()
+
+    cfg = MockConfig(
+        data_dir=Path(args.storage_dir),
+        company_id=args.company_id,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        show_update_modal=not args.no_modal,
+        seed=args.seed,
+    )
+    server = start_mock_server(cfg, args.addr, args.port)
+    print(f"[OK] Mock SII en {server.base_url} ({len(server.data.company_ids())} empresas)")
+    print("Exportar antes de correr los scripts:")
+    for k, v in server.env().items():
+        print(f"  {k}={v}")
+    print(f"Estadísticas: {server.base_url}/__mock/stats")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats.snapshot(), ensure_ascii=False, indent=2))
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+from pathlib import Path
+
+from backend.app.services.profiling import find_profiles, top_functions, write_collapsed
+
+
+def main():
+    p = argparse.ArgumentParser(description="Exporta perfiles cProfile (.prof) a stacks colapsados para flamegraph.")
+    p.add_argument("paths", nargs="*", help="Archivos .prof (default: todos bajo storage/companies/*/runs/*/logs/profiles)")
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--company-id", default=None)
+    p.add_argument("--stage", default=None, help="Solo perfiles de esta etapa (prefijo del archivo)")
+    p.add_argument("--merged", default=None, help="Además, escribir un único .folded combinado en esta ruta")
+    p.add_argument("--top", type=int, default=0, help="Imprimir top-N funciones (pstats, acumulado)")
+    args = p.parse_args()
+
+    paths = [Path(x) for x in args.paths] or find_profiles(Path(args.storage_dir), args.company_id)
+    if args.stage:
+        paths = [x for x in paths if x.name.startswith(f"{args.stage}_")]
+    if not paths:
+        raise SystemExit("No se encontraron perfiles .prof")
+
+    merged_lines = []
+    for prof in paths:
+        out = write_collapsed(prof)
+        print(f"[OK] {out}")
+        if args.merged:
+            merged_lines.append(out.read_text(encoding="utf-8"))
+
+    if args.merged:
+        merged = Path(args.merged)
+        merged.parent.mkdir(parents=True, exist_ok=True)
+        merged.write_text("".join(merged_lines), encoding="utf-8")
+        print(f"[OK] Combinado: {merged}")
+
+    if args.top:
+        print(top_functions(paths, limit=args.top))
+
+
+if __name__ == "__main__":
+    main()
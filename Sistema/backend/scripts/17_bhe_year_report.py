@@ -0,0 +1,55 @@
+import argparse
+import json
+from dataclasses import asdict
+from pathlib import Path
+
+from backend.app.services import profiling
+from backend.app.services.bhe_store import MONEY_FIELDS, load_year, store_path
+
+
+def main():
+    p = argparse.ArgumentParser(description="Honorarios del año desde el almacén columnar de boletas BHE.")
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--company-id", required=True)
+    p.add_argument("--year", type=int, required=True)
+    p.add_argument("--top", type=int, default=10, help="Cantidad de emisores en el ranking")
+    p.add_argument("--by", default="bruto", choices=MONEY_FIELDS + ("boletas",))
+    p.add_argument("--include-nulas", action="store_true", help="Incluir boletas no vigentes")
+    p.add_argument("--rebuild", action="store_true", help="Reconstruir desde los HTML aunque exista el .bin")
+    p.add_argument("--json", action="store_true")
+    profiling.add_arguments(p)
+    args = p.parse_args()
+    profiling.configure_from_args(args)
+
+    storage = Path(args.storage_dir)
+    store = load_year(storage, args.company_id, args.year, rebuild=args.rebuild)
+    vig = not args.include_nulas
+    report = {
+        "company_id": args.company_id,
+        "year": args.year,
+        "boletas": len(store),
+        "totales": store.retention_totals(vigentes_only=vig),
+        "tendencia_bruto": store.monthly_trend("bruto", vigentes_only=vig),
+        "top_emisores": [asdict(t) for t in store.top_issuers(args.top, by=args.by, vigentes_only=vig)],
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    tot = report["totales"]
+    print(f"[OK] {store_path(storage, args.company_id, args.year)} ({len(store)} boletas)")
+    print(
+        f"Totales: bruto={tot['bruto']} retenido={tot['retenido']} pagado={tot['pagado']} "
+        f"tasa={tot['tasa_retencion_pct']}%"
+    )
+    print("Tendencia mensual (bruto):")
+    for month, value in report["tendencia_bruto"].items():
+        print(f"  {month:02d}  {value:>14}")
+    print(f"Top {args.top} emisores por {args.by}:")
+    for t in report["top_emisores"]:
+        print(f"  {t['rut']:<12} {(t['nombre'] or '')[:32]:<32} {t['boletas']:>4} {t['bruto']:>14} {t['retenido']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import json
+from pathlib import Path
+
+from backend.app.services.f29_compacto import IVA_CHAIN_CODES, load_form, sync_forms
+from backend.app.services.sii_auth import company_id_from_rut
+
+
+def main():
+    p = argparse.ArgumentParser(description="Códigos F29 desde los compactos guardados (sin navegador).")
+    p.add_argument("--rut", required=True)
+    p.add_argument("--year", type=int, required=True)
+    p.add_argument("--month", type=int, required=True, help="Período declarado (no el mes objetivo)")
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--codes", default=None, help="Códigos separados por coma (default: cadena IVA)")
+    p.add_argument("--all", action="store_true", help="Imprimir todos los códigos del formulario")
+    args = p.parse_args()
+
+    storage_dir = Path(args.storage_dir)
+    company_id = company_id_from_rut(args.rut)
+
+    written = sync_forms(storage_dir, company_id)
+    if written:
+        print(f"[OK] {len(written)} formularios parseados desde HTML")
+
+    form = load_form(storage_dir, company_id, args.year, args.month)
+    if form is None:
+        raise SystemExit(f"No hay F29 compacto guardado para {args.year}-{args.month:02d}")
+
+    if args.all:
+        wanted = sorted(form.codes)
+    elif args.codes:
+        wanted = [int(c) for c in args.codes.split(",") if c.strip()]
+    else:
+        wanted = sorted(IVA_CHAIN_CODES)
+
+    out = {
+        str(c): {"monto": form.codes.get(c), "glosa": form.glosas.get(c) or IVA_CHAIN_CODES.get(c)}
+        for c in wanted
+        if c in form.codes
+    }
+    print(json.dumps({"folio": form.folio, "codigos": out}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+from pathlib import Path
+
+from backend.app.services import metrics, profiling
+from backend.app.services.report_builder import generate_full_report
+from backend.app.services.sii_auth import company_id_from_rut
+from backend.app.services.sii_download import make_run_dir
+from backend.app.services.timing import bind, period_label, start_run
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Reporte completo (resumen, compras, ventas, honorarios) desde datos ya descargados."
+    )
+    p.add_argument("--rut", required=True)
+    p.add_argument("--year", type=int, required=True)
+    p.add_argument("--to-month", type=int, required=True)
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--all-months", action="store_true", help="Generar 1..to-month (default: solo to-month)")
+    p.add_argument("--top", type=int, default=5, help="Cantidad de RUT en los rankings")
+    profiling.add_arguments(p)
+    args = p.parse_args()
+    profiling.configure_from_args(args)
+
+    if not (1 <= args.to_month <= 12):
+        raise SystemExit("--to-month debe estar entre 1 y 12")
+
+    storage_root = Path(args.storage_dir)
+    company_id = company_id_from_rut(args.rut)
+    if not (storage_root / "companies" / company_id).exists():
+        raise SystemExit(f"No existe la empresa en storage: {company_id}")
+
+    run_dir = make_run_dir(storage_root, company_id)
+    start_run(run_dir / "logs", company=company_id)
+    metrics.start_from_env()
+
+    months = range(1, args.to_month + 1) if args.all_months else [args.to_month]
+    for month in months:
+        with bind(period=period_label(args.year, month)):
+            try:
+                pdf = generate_full_report(storage_root, company_id, args.year, month, top_n=args.top)
+            except FileNotFoundError as e:
+                print(f"[WARN] {args.year}-{month:02d}: {e}")
+                continue
+        print(f"[OK] {pdf}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import json
+from pathlib import Path
+
+from backend.app.services import profiling
+from backend.app.services.report_builder import update_ytd
+from backend.app.services.sii_auth import company_id_from_rut
+from backend.app.services.ytd_rollup import state_path, ytd_block
+
+
+def main():
+    p = argparse.ArgumentParser(description="Acumulado anual (enero..mes) desde los datos ya descargados.")
+    p.add_argument("--rut", required=True)
+    p.add_argument("--year", type=int, required=True)
+    p.add_argument("--to-month", type=int, required=True)
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--months", action="store_true", help="Incluir el detalle por mes")
+    profiling.add_arguments(p)
+    args = p.parse_args()
+    profiling.configure_from_args(args)
+
+    if not (1 <= args.to_month <= 12):
+        raise SystemExit("--to-month debe estar entre 1 y 12")
+
+    storage_root = Path(args.storage_dir)
+    company_id = company_id_from_rut(args.rut)
+    if not (storage_root / "companies" / company_id).exists():
+        raise SystemExit(f"No existe la empresa en storage: {company_id}")
+
+    state = update_ytd(storage_root, company_id, args.year, args.to_month)
+    block = ytd_block(state, args.to_month)
+    if not args.months:
+        block.pop("meses", None)
+    print(json.dumps(block, ensure_ascii=False, indent=2))
+    print(f"[OK] {state_path(storage_root, company_id, args.year)}")
+
+
+if __name__ == "__main__":
+    main()
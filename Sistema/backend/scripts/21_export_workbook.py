@@ -0,0 +1,46 @@
+import argparse
+from pathlib import Path
+
+from backend.app.services import profiling
+from backend.app.services.sii_auth import company_id_from_rut
+from backend.app.services.workbook_export import export_many, list_companies
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Planilla consolidada (Resumen, RCV Compra, RCV Venta, BH) desde los datos ya descargados."
+    )
+    p.add_argument("--rut", action="append", default=[], help="Repetible; sin --rut ni --all no se exporta nada")
+    p.add_argument("--all", action="store_true", help="Todas las empresas con DCV en storage")
+    p.add_argument("--year", type=int, required=True)
+    p.add_argument("--to-month", type=int, required=True)
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (default: CPUs)")
+    p.add_argument("--top", type=int, default=10)
+    profiling.add_arguments(p)
+    args = p.parse_args()
+    profiling.configure_from_args(args)
+
+    if not (1 <= args.to_month <= 12):
+        raise SystemExit("--to-month debe estar entre 1 y 12")
+
+    storage_root = Path(args.storage_dir)
+    company_ids = list_companies(storage_root) if args.all else [company_id_from_rut(r) for r in args.rut]
+    if not company_ids:
+        raise SystemExit("Indicar --rut o --all")
+
+    results = export_many(storage_root, company_ids, args.year, args.to_month, workers=args.workers, top_n=args.top)
+    failed = 0
+    for r in results:
+        if r.error:
+            failed += 1
+            print(f"[ERROR] {r.company_id}: {r.error}")
+        else:
+            detail = ", ".join(f"{k}={v}" for k, v in r.rows.items())
+            print(f"[OK] {r.path} ({detail})")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
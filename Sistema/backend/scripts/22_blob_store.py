@@ -0,0 +1,35 @@
+import argparse
+from pathlib import Path
+
+from backend.app.services.blob_store import blobs_dir, dedupe_tree, gc
+from backend.app.services.sii_auth import company_id_from_rut
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+def main():
+    p = argparse.ArgumentParser(description="Almacén deduplicado de archivos crudos (SII_BLOB_STORE).")
+    p.add_argument("command", choices=["dedupe", "gc"])
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--rut", action="append", default=[], help="Limitar dedupe a estas empresas (repetible)")
+    p.add_argument("--dry-run", action="store_true", help="gc: solo informar")
+    args = p.parse_args()
+
+    storage_root = Path(args.storage_dir)
+    if args.command == "dedupe":
+        company_ids = [company_id_from_rut(r) for r in args.rut] or None
+        st = dedupe_tree(storage_root, company_ids)
+        print(
+            f"[OK] {st.files} archivos; {st.linked} deduplicados ({_mb(st.bytes_saved)} recuperados), "
+            f"{st.new_blobs} blobs nuevos en {blobs_dir(storage_root)}"
+        )
+    else:
+        st = gc(storage_root, dry_run=args.dry_run)
+        verb = "a borrar" if args.dry_run else "borrados"
+        print(f"[OK] {st.blobs} blobs; {st.removed} sin referencias {verb} ({_mb(st.bytes_freed)})")
+
+
+if __name__ == "__main__":
+    main()
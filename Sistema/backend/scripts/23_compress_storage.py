@@ -0,0 +1,26 @@
+import argparse
+from pathlib import Path
+
+from backend.app.services.sii_auth import company_id_from_rut
+from backend.app.services.storage_io import CODEC, CODEC_SUFFIXES, compress_tree
+
+
+def main():
+    p = argparse.ArgumentParser(description="Comprime (o descomprime) los CSV/HTML crudos ya guardados.")
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--codec", choices=sorted(CODEC_SUFFIXES), default=CODEC or "gzip")
+    p.add_argument("--rut", action="append", default=[], help="Limitar a estas empresas (repetible)")
+    p.add_argument("--decompress", action="store_true", help="Volver a archivos sin comprimir")
+    args = p.parse_args()
+
+    company_ids = [company_id_from_rut(r) for r in args.rut] or None
+    st = compress_tree(Path(args.storage_dir), args.codec, company_ids, decompress_back=args.decompress)
+    ratio = (st.bytes_after / st.bytes_before) if st.bytes_before else 1.0
+    print(
+        f"[OK] {st.files} archivos; {st.compressed} convertidos "
+        f"({st.bytes_before / 1024:.0f} KB -> {st.bytes_after / 1024:.0f} KB, {ratio:.0%})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+from pathlib import Path
+
+from backend.app.services.retention import COMPACT_SOURCES, apply, load_policies, plan, restore_year
+from backend.app.services.sii_auth import company_id_from_rut
+
+
+def _parse_policy(value: str):
+    name, _, days = value.partition("=")
+    days = days.strip().lower()
+    return name.strip(), (None if days in ("", "off", "none") else int(days))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Retención y compactación de storage/companies/<id>.")
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--rut", action="append", default=[], help="Limitar a estas empresas (repetible)")
+    sub = p.add_subparsers(dest="cmd")
+
+    run = sub.add_parser("run", help="Aplica las políticas (por defecto solo muestra el plan)")
+    run.add_argument("--apply", action="store_true", help="Ejecutar las acciones (sin esto es dry-run)")
+    run.add_argument(
+        "--policy", action="append", default=[], type=_parse_policy,
+        help="tipo=días (p.ej. run_logs=365, compact=548 para activar la compactación; off desactiva); repetible",
+    )
+    run.add_argument("--verbose", action="store_true")
+
+    rs = sub.add_parser("restore", help="Extrae un archivo anual compactado y restaura el manifest")
+    rs.add_argument("--source", required=True, choices=sorted(COMPACT_SOURCES))
+    rs.add_argument("--year", type=int, required=True)
+
+    args = p.parse_args()
+    storage_root = Path(args.storage_dir)
+    company_ids = [company_id_from_rut(r) for r in args.rut]
+
+    if args.cmd == "restore":
+        if not company_ids:
+            raise SystemExit("restore requiere --rut")
+        for cid in company_ids:
+            out = restore_year(storage_root, cid, args.source, args.year)
+            print(f"[OK] {cid}: restaurado {out}")
+        return
+
+    policies = load_policies(storage_root, dict(getattr(args, "policy", []) or []))
+    report = plan(storage_root, company_ids or None, policies)
+    if getattr(args, "verbose", False) or not getattr(args, "apply", False):
+        for a in report.actions:
+            print(f"  {a.kind:<14} {a.path} ({a.bytes / 1024:.0f} KB) {a.detail}")
+    for kind, size in sorted(report.bytes_by_kind().items()):
+        n = sum(1 for a in report.actions if a.kind == kind)
+        print(f"  {kind:<14} {n:>5} acciones  {size / 1024 / 1024:.1f} MB")
+
+    if not getattr(args, "apply", False):
+        print(f"[OK] dry-run: {len(report.actions)} acciones (usar 'run --apply' para ejecutar)")
+        return
+    apply(storage_root, report)
+    for err in report.errors:
+        print(f"[WARN] {err}")
+    print(f"[OK] {report.applied}/{len(report.actions)} acciones aplicadas")
+
+
+if __name__ == "__main__":
+    main()
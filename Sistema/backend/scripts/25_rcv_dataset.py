@@ -0,0 +1,46 @@
+import argparse
+import json
+from pathlib import Path
+
+from backend.app.services import profiling
+from backend.app.services.rcv_dataset import SECTIONS, RCVDataset, sync_year
+from backend.app.services.sii_auth import company_id_from_rut
+from backend.app.services.workbook_export import list_companies
+
+
+def main():
+    p = argparse.ArgumentParser(description="Ingesta/consulta del dataset columnar anual del RCV.")
+    p.add_argument("--storage-dir", default="storage")
+    p.add_argument("--rut", action="append", default=[], help="Empresa (repetible)")
+    p.add_argument("--all", action="store_true", help="Todas las empresas con dcv/")
+    p.add_argument("--year", type=int, required=True)
+    p.add_argument("--to-month", type=int, default=12)
+    p.add_argument("--top", type=int, default=0, help="Mostrar top-N proveedores/clientes del año")
+    p.add_argument("--iva-trend", action="store_true", help="Mostrar IVA débito/crédito por mes")
+    profiling.add_arguments(p)
+    args = p.parse_args()
+    profiling.configure_from_args(args)
+
+    if not (1 <= args.to_month <= 12):
+        raise SystemExit("--to-month debe estar entre 1 y 12")
+    storage_root = Path(args.storage_dir)
+    company_ids = list_companies(storage_root) if args.all else [company_id_from_rut(r) for r in args.rut]
+    if not company_ids:
+        raise SystemExit("Indique --rut o --all")
+
+    for cid in company_ids:
+        written = sync_year(storage_root, cid, args.year, to_month=args.to_month)
+        dataset = RCVDataset(storage_root, cid, args.year)
+        months = {s: dataset.months(s) for s in SECTIONS}
+        print(f"[OK] {cid}: {len(written)} particiones escritas; meses {json.dumps(months)}")
+        if args.top:
+            for section in SECTIONS:
+                for e in dataset.top_parties(section, args.top, to_month=args.to_month):
+                    print(f"  {section:<8} {e.rut:<12} {e.total:>15,} {e.documentos:>5}  {e.razon_social or ''}")
+        if args.iva_trend:
+            for month, row in dataset.iva_trend(to_month=args.to_month).items():
+                print(f"  {month:02d} debito={row['debito']:,} credito={row['credito']:,} neto={row['neto']:,}")
+
+
+if __name__ == "__main__":
+    main()
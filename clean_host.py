@@ -1,50 +1,55 @@
-import paramiko
-import os
+import posixpath
+import shlex
 
-HOST = "72.61.47.96"
-USER = "sebas024"
-KEY_FILE = "vps_key"
-REMOTE_PATH = "/home/sebas024/htdocs/srv1274145.hstgr.cloud"
+from ssh_manager import DEFAULT_TARGET, get_manager, target_from_args, target_parser
+
+def clean_host(target=DEFAULT_TARGET, manager=None):
+    manager = manager or get_manager()
+    remote_path = target.remote_path
+    # The path is interpolated into rm -rf: an empty, root or relative path would empty
+    # the wrong directory (on the stand-in, the developer's own disk).
+    if not remote_path.startswith("/") or not posixpath.normpath(remote_path).strip("/"):
+        print(f"Refusing to clean {remote_path!r}: need an absolute path below /.")
+        return False
+    q = shlex.quote(remote_path)
 
-def clean_host():
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
     try:
-        key = paramiko.RSAKey.from_private_key_file(KEY_FILE)
-        client.connect(HOST, username=USER, pkey=key)
+        manager.client(target)
         
-        print(f"Connected to {HOST}. cleaning {REMOTE_PATH}...")
+        print(f"Connected to {target.host}. cleaning {remote_path}...")
         
         # Execute command to remove all files in the remote path
         # We preserve the directory itself, but empty it.
         # Be very careful with rm -rf
         
         # Check if directory exists first
-        stdin, stdout, stderr = client.exec_command(f"[ -d {REMOTE_PATH} ] && echo 'exists'")
-        if stdout.read().decode().strip() == 'exists':
-            print(f"Directory {REMOTE_PATH} found. Deleting contents...")
+        if manager.run(f"[ -d {q} ] && echo 'exists'", target).text() == 'exists':
+            print(f"Directory {remote_path} found. Deleting contents...")
             # rm -rf /path/* (and hidden files if any, but * usually misses .files)
             # To delete all including hidden: rm -rf /path/{*,.*} but that matches . and .. which is bad.
             # Try rm -rf for more force, but be careful with path
-            cmd = f"rm -rf {REMOTE_PATH}/* {REMOTE_PATH}/.* 2>/dev/null || true"
-            stdin, stdout, stderr = client.exec_command(cmd)
+            manager.run(f"rm -rf {q}/* {q}/.* 2>/dev/null || true", target)
             
             # Verify if empty
-            stdin, stdout, stderr = client.exec_command(f"ls -A {REMOTE_PATH}")
-            remaining = stdout.read().decode().strip()
+            remaining = manager.run(f"ls -A {q}", target).text()
             
             if not remaining:
                 print("Remote directory cleaned successfully.")
-            else:
-                print(f"Warning: Some files could not be deleted:\n{remaining}")
+                return True
+            print(f"Warning: Some files could not be deleted:\n{remaining}")
+            return False
         else:
-            print(f"Remote directory {REMOTE_PATH} does not exist.")
+            print(f"Remote directory {remote_path} does not exist.")
+            return True
             
     except Exception as e:
         print(f"Connection error: {e}")
-    finally:
-        client.close()
+        return False
 
 if __name__ == "__main__":
-    clean_host()
+    p = target_parser("Empty the site directory on the host.")
+    p.add_argument("--yes", action="store_true", help="Required: confirms emptying the remote site directory.")
+    args = p.parse_args()
+    if not args.yes:
+        p.error("clean empties the remote site directory; pass --yes to confirm")
+    clean_host(target_from_args(args))
@@ -1,23 +1,95 @@
-import paramiko
+import io
+import posixpath
+import shlex
 import time
 
+from ssh_manager import DEFAULT_TARGET, get_manager, target_from_args, target_parser
+
 # Configuration
-HOST = "72.61.47.96"
-USER = "sebas024"
-KEY_FILE = "vps_key"
-REMOTE_PATH = "/home/sebas024/htdocs/srv1274145.hstgr.cloud"
 REPO_URL = "https://github.com/Seb024yt/cuatro4arce.git"
+BRANCH = "main"
+
+# Release mode (--release): every deploy is staged in a side directory and the site path
+# becomes a symlink that is switched atomically once the release is ready.
+#   .<site>-deploy/repo.git          cached mirror, only fetched incrementally
+#   .<site>-deploy/releases/<id>/    one exported tree per deploy (+ .venv link)
+#   .<site>-deploy/venvs/<hash>/     virtualenvs keyed by requirements.txt + python version
+#   .<site>-deploy/shared/           data that outlives releases (linked into each one)
+#
+# In release mode the app is started by deploy.py itself, not by start.sh: launch_app.py
+# runs uvicorn (--fd) from the resolved release directory with that release's venv and
+# passes its listening socket on to the next release's launcher (over the unix socket
+# app.sock), so old and new instance share one accept queue. The new instance starts
+# next to the old one, and the old one only gets SIGTERM (uvicorn's graceful shutdown)
+# once the new one has logged READY_MARKER. The first release deploy on a host still
+# running the start.sh instance stops it first (one cold restart); every later deploy
+# is a handover. If that first deploy fails, the old site directory is moved back and
+# start.sh is run again.
+#
+# Only SHARED_DIRS/SHARED_FILES outlive a release: the rest of the site path is the git
+# export of one release. Anything upload_to_host (or consolidate's push_app_files) writes
+# there outside those paths lands in the live release and is gone after the next
+# release deploy; commit it to the repository or add it to SHARED_DIRS instead.
+APP_HOST = "127.0.0.1"
+APP_PORT = 8000
+APP_ARGS = "-m uvicorn --fd {fd} app.main:app"
+READY_MARKER = "Application startup complete"
+STARTUP_TIMEOUT = 60
+LEGACY_PROCESS = "[u]vicorn"  # bracket so pkill/pgrep do not match the shell running them
+SHARED_DIRS = ["sii_data"]
+SHARED_FILES = [".env"]
+KEEP_RELEASES = 5
+GET_PIP_URL = "https://bootstrap.pypa.io/get-pip.py"
+
+LAUNCHER = """\
+import signal
+import socket
+import subprocess
+import sys
+import threading
+
+# launch_app.py HOST PORT TAKE_FROM SERVE_ON ARGS...: take the listening socket from the
+# running launcher at TAKE_FROM (or bind HOST:PORT if there is none), run this python with
+# ARGS ("{fd}" replaced by the socket) as a child and hand the socket to the next launcher
+# that connects to SERVE_ON. SIGTERM is forwarded to the child.
+host, port, take_from, serve_on = sys.argv[1], int(sys.argv[2]), sys.argv[3], sys.argv[4]
+try:
+    with socket.socket(socket.AF_UNIX) as peer:
+        peer.connect(take_from)
+        _, fds, _, _ = socket.recv_fds(peer, 1, 1)
+    sock = socket.socket(fileno=fds[0])
+except (OSError, ValueError):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+
+handoff = socket.socket(socket.AF_UNIX)
+handoff.bind(serve_on)
+handoff.listen(1)
+
+
+def serve_handoff():
+    while True:
+        conn, _ = handoff.accept()
+        with conn:
+            socket.send_fds(conn, [b"fd"], [sock.fileno()])
 
-def deploy():
-    print(f"Connecting to {HOST}...")
+
+threading.Thread(target=serve_handoff, daemon=True).start()
+args = [a.replace("{fd}", str(sock.fileno())) for a in sys.argv[5:]]
+app = subprocess.Popen([sys.executable] + args, pass_fds=[sock.fileno()])
+for sig in (signal.SIGTERM, signal.SIGINT):
+    signal.signal(sig, lambda signum, frame: app.send_signal(signum))
+sys.exit(app.wait())
+"""
+
+def deploy(target=DEFAULT_TARGET, manager=None):
+    manager = manager or get_manager()
+    remote_path = target.remote_path
+    print(f"Connecting to {target.host}...")
     try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        # Load private key
-        key = paramiko.RSAKey.from_private_key_file(KEY_FILE)
-        
-        client.connect(HOST, username=USER, pkey=key)
+        manager.client(target)
         
         print("Connected. Configuring git safety and deploying...")
         
@@ -26,7 +98,7 @@ def deploy():
             # Group 1: Git and project setup
             [
                 "git config --global --add safe.directory '*'",
-                f"cd {REMOTE_PATH}",
+                f"cd {remote_path}",
                 "git init",
                 f"git remote remove origin || true",
                 f"git remote add origin {REPO_URL}",
@@ -35,14 +107,14 @@ def deploy():
             ],
             # Group 2: Dependencies
             [
-                f"cd {REMOTE_PATH}",
+                f"cd {remote_path}",
                 "curl https://bootstrap.pypa.io/get-pip.py -o get-pip.py",
                 "python3 get-pip.py --break-system-packages --user",
                 "python3 -m pip install -r requirements.txt --break-system-packages --user"
             ],
             # Group 3: Start Application
             [
-                f"cd {REMOTE_PATH}",
+                f"cd {remote_path}",
                 "chmod +x start.sh",
                 "./start.sh"
             ]
@@ -50,28 +122,354 @@ def deploy():
 
         for i, commands in enumerate(command_groups, 1):
             print(f"\nExecuting Group {i}...")
-            full_command = " && ".join(commands)
-            stdin, stdout, stderr = client.exec_command(full_command)
-            
-            exit_status = stdout.channel.recv_exit_status()
-            output = stdout.read().decode().strip()
-            error = stderr.read().decode().strip()
+            res = manager.run(" && ".join(commands), target)
+            output = res.text()
+            error = res.error_text()
             
             if output:
                 print(f"OUTPUT Group {i}:\n{output}")
             if error:
                 print(f"ERRORS/WARNINGS Group {i}:\n{error}")
                 
-            if exit_status != 0:
-                print(f"Group {i} failed with exit status {exit_status}. Stopping.")
-                return
+            if not res.ok:
+                print(f"Group {i} failed with exit status {res.status}. Stopping.")
+                return False
 
         print("\nDeployment successful! [OK]")
-            
-        client.close()
+        return True
         
     except Exception as e:
         print(f"Connection failed: {e}")
+        return False
+
+class ReleaseLayout:
+    def __init__(self, remote_path):
+        parent, name = posixpath.split(remote_path.rstrip("/"))
+        self.current = remote_path.rstrip("/")
+        self.root = posixpath.join(parent, f".{name}-deploy")
+        self.repo = posixpath.join(self.root, "repo.git")
+        self.releases = posixpath.join(self.root, "releases")
+        self.venvs = posixpath.join(self.root, "venvs")
+        self.shared = posixpath.join(self.root, "shared")
+        self.launcher = posixpath.join(self.root, "launch_app.py")
+        self.pidfile = posixpath.join(self.root, "app.pid")
+        self.handoff = posixpath.join(self.root, "app.sock")
+        self.logs = posixpath.join(self.root, "logs")
+
+
+def _run_step(manager, target, name, script):
+    res = manager.run("set -e\n" + script, target)
+    if not res.ok:
+        print(f"Step '{name}' failed with exit status {res.status}:\n{res.error_text() or res.text()}")
+        return None
+    return res.text()
+
+
+def _fetch_script(layout, repo_url, branch):
+    repo, url = shlex.quote(layout.repo), shlex.quote(repo_url)
+    return f"""
+mkdir -p {shlex.quote(layout.root)}
+if [ -d {repo} ]; then
+  git --git-dir={repo} remote set-url origin {url}
+  git --git-dir={repo} fetch -q --prune origin
+else
+  git clone -q --mirror {url} {repo}
+fi
+git --git-dir={repo} rev-parse --short=12 {shlex.quote("refs/heads/" + branch)}
+"""
+
+
+def _stage_script(layout, release, revision):
+    q = shlex.quote
+    tmp = release + ".tmp"
+    links = []
+    for d in SHARED_DIRS:
+        links.append(f"mkdir -p {q(posixpath.join(layout.shared, d))}")
+        links.append(f"rm -rf {q(posixpath.join(tmp, d))}; ln -s {q(posixpath.join(layout.shared, d))} {q(posixpath.join(tmp, d))}")
+    for f in SHARED_FILES:
+        src = q(posixpath.join(layout.shared, f))
+        links.append(f"if [ -e {src} ]; then rm -f {q(posixpath.join(tmp, f))}; ln -s {src} {q(posixpath.join(tmp, f))}; fi")
+    links = "\n".join(links)
+    return f"""
+rm -rf {q(tmp)}
+mkdir -p {q(tmp)} {q(layout.shared)}
+git --git-dir={q(layout.repo)} archive {q(revision)} | tar -x -C {q(tmp)}
+echo {q(revision)} > {q(posixpath.join(tmp, "REVISION"))}
+{links}
+mv {q(tmp)} {q(release)}
+"""
+
+
+def _env_script(layout, release):
+    q = shlex.quote
+    req = q(posixpath.join(release, "requirements.txt"))
+    get_pip = q(posixpath.join(layout.root, "get-pip.py"))
+    return f"""
+key=$( (cat {req} 2>/dev/null || true; python3 -V 2>&1) | sha256sum | cut -c1-16)
+venv={q(layout.venvs)}/$key
+if [ -f "$venv/.ready" ]; then
+  echo "cached $key"
+else
+  rm -rf "$venv"
+  mkdir -p {q(layout.venvs)}
+  if ! python3 -m venv "$venv" 2>/dev/null; then
+    rm -rf "$venv"
+    python3 -m venv --without-pip "$venv"
+    [ -f {get_pip} ] || curl -fsS {GET_PIP_URL} -o {get_pip}
+    "$venv/bin/python" {get_pip} -q
+  fi
+  if [ -f {req} ]; then "$venv/bin/python" -m pip install -q -r {req}; fi
+  touch "$venv/.ready"
+  echo "built $key"
+fi
+ln -sfn "$venv" {q(posixpath.join(release, ".venv"))}
+"""
+
+
+def _pre_release_dir(layout, release_id):
+    return posixpath.join(layout.root, "pre-release-" + release_id)
+
+
+def _switch_script(layout, release, release_id):
+    q = shlex.quote
+    link_tmp = q(posixpath.join(layout.root, "current.tmp"))
+    current = q(layout.current)
+    # A site path that is still a plain directory (pre-release deploys) is adopted once:
+    # its shared data moves to shared/ and the directory itself is kept aside.
+    adopt = "\n".join(
+        f"  if [ -e {current}/{q(p)} ] && [ ! -L {current}/{q(p)} ]; then rm -rf {q(posixpath.join(layout.shared, p))}; "
+        f"mv {current}/{q(p)} {q(posixpath.join(layout.shared, p))}; ln -s {q(posixpath.join(layout.shared, p))} {current}/{q(p)}; fi"
+        for p in SHARED_DIRS + SHARED_FILES
+    )
+    return f"""
+prev=$(readlink {current} || true)
+ln -sfn {q(release)} {link_tmp}
+if [ -e {current} ] && [ ! -L {current} ]; then
+{adopt}
+  mv {current} {q(_pre_release_dir(layout, release_id))}
+fi
+mv -T {link_tmp} {current}
+echo "$prev"
+"""
+
+
+def _stop_legacy_script(layout):
+    # Kept apart from _restart_script: that one carries the app command line, which the
+    # pkill pattern would match in the shell running it.
+    pidfile = shlex.quote(layout.pidfile)
+    return f"""
+old=$(cat {pidfile} 2>/dev/null || true)
+if [ -n "$old" ] && kill -0 "$old" 2>/dev/null; then
+  echo handover
+  exit 0
+fi
+# Instance started by start.sh (no socket handoff): stop it before binding the port.
+pkill -f {shlex.quote(LEGACY_PROCESS)} || true
+i=0
+while pgrep -f {shlex.quote(LEGACY_PROCESS)} >/dev/null && [ $i -lt 20 ]; do sleep 0.5; i=$((i + 1)); done
+echo cold
+"""
+
+
+def _restart_script(layout, release_id, host=APP_HOST, port=APP_PORT, app_args=APP_ARGS):
+    """Starts the release `current` points to, then stops the process it replaces."""
+    q = shlex.quote
+    pidfile, handoff, new_handoff = q(layout.pidfile), q(layout.handoff), q(layout.handoff + ".new")
+    log = q(posixpath.join(layout.logs, f"{release_id}.log"))
+    args = " ".join(q(a) for a in shlex.split(app_args))
+    return f"""
+release=$(readlink -f {q(layout.current)})
+cd "$release"
+mkdir -p {q(layout.logs)}
+old=$(cat {pidfile} 2>/dev/null || true)
+kill -0 "$old" 2>/dev/null || old=
+rm -f {new_handoff}
+nohup "$release/.venv/bin/python" {q(layout.launcher)} {q(host)} {int(port)} {handoff} {new_handoff} {args} >{log} 2>&1 </dev/null &
+new=$!
+i=0
+until grep -q {q(READY_MARKER)} {log} 2>/dev/null; do
+  if [ $i -ge {STARTUP_TIMEOUT * 2} ] || ! kill -0 "$new" 2>/dev/null; then
+    kill "$new" 2>/dev/null || true
+    rm -f {new_handoff}
+    tail -n 20 {log} >&2
+    echo "new release did not start" >&2
+    exit 1
+  fi
+  sleep 0.5
+  i=$((i + 1))
+done
+echo "$new" > {pidfile}
+mv -f {new_handoff} {handoff}
+[ -z "$old" ] || kill -TERM "$old"
+"""
+
+
+def _unadopt_script(layout, release_id):
+    """Undoes the first adoption: the pre-release site directory goes back and start.sh runs."""
+    q = shlex.quote
+    current, pidfile, pre = q(layout.current), q(layout.pidfile), q(_pre_release_dir(layout, release_id))
+    return f"""
+if [ ! -d {pre} ]; then
+  echo none
+  exit 0
+fi
+pid=$(cat {pidfile} 2>/dev/null || true)
+if [ -n "$pid" ]; then
+  kill -TERM "$pid" 2>/dev/null || true
+  i=0
+  while kill -0 "$pid" 2>/dev/null && [ $i -lt 40 ]; do sleep 0.5; i=$((i + 1)); done
+fi
+rm -f {pidfile} {q(layout.handoff)}
+[ ! -L {current} ] || rm {current}
+mv {pre} {current}
+cd {current}
+chmod +x start.sh
+./start.sh >&2
+echo restored
+"""
+
+
+def _health_script(url, attempts=15):
+    return f"""
+i=0
+until curl -fs -o /dev/null {shlex.quote(url)}; do
+  i=$((i + 1))
+  [ $i -ge {attempts} ] && exit 1
+  sleep 1
+done
+"""
+
+
+def _prune_script(layout, keep):
+    q = shlex.quote
+    return f"""
+cd {q(layout.releases)}
+active=$(basename "$(readlink {q(layout.current)})")
+ls -1 | grep -v '\\.tmp$' | sort -r | tail -n +{keep + 1} | while read -r old; do
+  [ "$old" = "$active" ] || rm -rf "$old"
+done
+for venv in {q(layout.venvs)}/*; do
+  [ -d "$venv" ] || continue
+  used=0
+  for link in */.venv; do [ "$(readlink "$link")" = "$venv" ] && used=1; done
+  [ $used = 1 ] || rm -rf "$venv"
+done
+for log in {q(layout.logs)}/*.log; do
+  [ -f "$log" ] || continue
+  [ -d "$(basename "$log" .log)" ] || rm -f "$log"
+done
+"""
+
+
+def deploy_release(target=DEFAULT_TARGET, manager=None, repo_url=REPO_URL, branch=BRANCH, health_url=None,
+                   keep=KEEP_RELEASES, app_host=APP_HOST, app_port=APP_PORT, app_args=APP_ARGS):
+    """
+    Zero-downtime deploy: fetch, export and environment setup happen beside the live
+    release; the app is only touched by the symlink switch and the process handover
+    (new instance up before the old one stops). The venv is reused whenever
+    requirements.txt (and the python version) did not change.
+    """
+    manager = manager or get_manager()
+    layout = ReleaseLayout(target.remote_path)
+    started = time.monotonic()
+    print(f"Connecting to {target.host}...")
+    try:
+        manager.client(target)
+
+        print("Fetching repository...")
+        revision = _run_step(manager, target, "fetch", _fetch_script(layout, repo_url, branch))
+        if revision is None:
+            return False
+        revision = revision.splitlines()[-1]
+        release_id = time.strftime("%Y%m%d%H%M%S") + "-" + revision
+        release = posixpath.join(layout.releases, release_id)
+
+        print(f"Staging release {release_id}...")
+        if _run_step(manager, target, "stage", _stage_script(layout, release, revision)) is None:
+            return False
+
+        env = _run_step(manager, target, "environment", _env_script(layout, release))
+        if env is None:
+            return False
+        state, key = env.splitlines()[-1].split()
+        print(f"Dependencies {'unchanged, reusing' if state == 'cached' else 'changed, built'} venv {key}.")
+        sftp = manager.client(target).open_sftp()
+        try:
+            sftp.putfo(io.BytesIO(LAUNCHER.encode()), layout.launcher)
+        finally:
+            sftp.close()
+        prepared = time.monotonic()
+
+        def restart(rid, only_if_down=False):
+            mode = _run_step(manager, target, "stop legacy", _stop_legacy_script(layout))
+            if mode is None or (only_if_down and mode == "handover"):
+                return mode
+            if _run_step(manager, target, "restart", _restart_script(layout, rid, app_host, app_port, app_args)) is None:
+                return None
+            return mode
+
+        def rollback(previous, only_if_down):
+            if not previous:
+                # First release deploy: the start.sh instance is already stopped and the
+                # site directory was moved aside by the switch.
+                pre = _pre_release_dir(layout, release_id)
+                print(f"Restoring the pre-release site from {pre}...")
+                restored = _run_step(manager, target, "restore pre-release", _unadopt_script(layout, release_id))
+                if restored is not None and restored.endswith("none"):
+                    print("There was no site before this release; nothing to restore.")
+                elif restored is None:
+                    print(
+                        f"Restore it by hand: rm {target.remote_path} && mv {pre} {target.remote_path} "
+                        f"&& cd {target.remote_path} && ./start.sh"
+                    )
+                return
+            print(f"Rolling back to {posixpath.basename(previous)}...")
+            _run_step(manager, target, "rollback", _switch_script(layout, previous, release_id))
+            restart(posixpath.basename(previous), only_if_down)
+
+        print("Switching release...")
+        previous = _run_step(manager, target, "switch", _switch_script(layout, release, release_id))
+        if previous is None:
+            return False
+        mode = restart(release_id)
+        if mode is None:
+            # A failed handover leaves the old process serving; only a failed cold start
+            # needs the previous release started again.
+            rollback(previous, only_if_down=True)
+            return False
+        switched = time.monotonic()
+        print(f"Restart: {mode}.")
+
+        if health_url and _run_step(manager, target, "health check", _health_script(health_url)) is None:
+            rollback(previous, only_if_down=False)
+            return False
+
+        _run_step(manager, target, "prune", _prune_script(layout, keep))
+        print(
+            f"\nDeployment successful! [OK] release {release_id}: prepared in {prepared - started:.1f}s, "
+            f"switch + restart {switched - prepared:.1f}s."
+        )
+        return True
+
+    except Exception as e:
+        print(f"Connection failed: {e}")
+        return False
 
 if __name__ == "__main__":
-    deploy()
+    p = target_parser("Deploy the app from git on the host.")
+    p.add_argument("--release", action="store_true",
+                   help="Zero-downtime mode: side release + cached venv + atomic symlink switch.")
+    p.add_argument("--repo-url", default=REPO_URL)
+    p.add_argument("--branch", default=BRANCH)
+    p.add_argument("--health-url", help="Release mode: URL that must answer after the switch (else roll back).")
+    p.add_argument("--keep", type=int, default=KEEP_RELEASES, help="Release mode: releases to keep.")
+    p.add_argument("--app-host", default=APP_HOST, help="Release mode: address the app listens on.")
+    p.add_argument("--app-port", type=int, default=APP_PORT, help="Release mode: port the app listens on.")
+    p.add_argument("--app-args", default=APP_ARGS, help="Release mode: python arguments that run the app ({fd} = socket).")
+    args = p.parse_args()
+    if args.release:
+        deploy_release(target_from_args(args), repo_url=args.repo_url, branch=args.branch,
+                       health_url=args.health_url, keep=args.keep, app_host=args.app_host,
+                       app_port=args.app_port, app_args=args.app_args)
+    else:
+        deploy(target_from_args(args))
@@ -1,49 +1,41 @@
-import paramiko
-import os
+from ssh_manager import DEFAULT_TARGET, get_manager, target_from_args, target_parser
+from stream_transfer import fetch_tree
 
-HOST = "72.61.47.96"
-USER = "sebas024"
-KEY_FILE = "vps_key"
-REMOTE_PATH = "/home/sebas024/htdocs/srv1274145.hstgr.cloud"
+FILES_TO_SYNC = [
+    "app/data_processor.py",
+    "app/sii_connector.py",
+    "app/email_sender.py",
+    "app/main.py",
+    "app/templates/portal.html",
+    "app/templates/inicio.html",
+    "deploy.py"
+]
 
-def download_changes():
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
-    try:
-        key = paramiko.RSAKey.from_private_key_file(KEY_FILE)
-        client.connect(HOST, username=USER, pkey=key)
-        sftp = client.open_sftp()
-        
-        files_to_sync = [
-            "app/data_processor.py",
-            "app/sii_connector.py",
-            "app/email_sender.py",
-            "app/main.py",
-            "app/templates/portal.html",
-            "app/templates/inicio.html",
-            "deploy.py"
-        ]
-        
-        for file_path in files_to_sync:
-            remote_file = f"{REMOTE_PATH}/{file_path}"
-            local_file = file_path
-            
-            try:
-                # Check if remote file exists
-                sftp.stat(remote_file)
-                print(f"Downloading {file_path} from remote...")
-                sftp.get(remote_file, local_file)
-                print(f"Successfully updated {local_file}")
-            except FileNotFoundError:
-                print(f"Remote file {remote_file} not found. Skipping.")
-            except Exception as e:
-                print(f"Error downloading {file_path}: {e}")
 
+def download_changes(paths=None, target=DEFAULT_TARGET, local_base=".", manager=None):
+    """
+    Streams the selected remote paths (files or directories) as one compressed tar and
+    extracts them locally as they arrive. Files already up to date locally are skipped,
+    so an interrupted download resumes on the next run.
+    """
+    paths = paths or FILES_TO_SYNC
+    manager = manager or get_manager()
+    try:
+        result = fetch_tree(
+            manager.client(target), target.remote_path, paths, local_base, reconnect=lambda: manager.reconnect(target)
+        )
+        for path in result.missing:
+            print(f"Remote file {target.remote_path}/{path} not found. Skipping.")
+        print(f"Downloaded {result.files} file(s), {result.bytes} bytes ({result.skipped} already up to date).")
+        return True
     except Exception as e:
         print(f"Connection error: {e}")
-    finally:
-        client.close()
+        return False
+
 
 if __name__ == "__main__":
-    download_changes()
+    p = target_parser("Stream files or folders from the host into the working tree.")
+    p.add_argument("paths", nargs="*", help=f"Remote paths relative to the site root (default: {len(FILES_TO_SYNC)} app files).")
+    p.add_argument("--local-dir", default=".")
+    args = p.parse_args()
+    download_changes(args.paths, target_from_args(args), args.local_dir)
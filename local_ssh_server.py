@@ -0,0 +1,309 @@
+"""
+Local SSH/SFTP stand-in for the ops scripts (upload_to_host.py, ...).
+
+Runs a paramiko server on 127.0.0.1 that accepts any key, serves SFTP on the local
+filesystem and runs exec requests with /bin/sh, so the scripts can be exercised
+end to end without touching the VPS:
+
+    python local_ssh_server.py --port 2222
+    python upload_to_host.py --host 127.0.0.1 --port 2222 --remote-path /tmp/vps/site
+
+Remote paths are local paths: point --remote-path somewhere disposable.
+
+    python local_ssh_server.py --check-fetch
+
+runs stream_transfer.fetch_tree against a throwaway stand-in over a tree with hard links
+(as the blob store leaves them) and fails unless every name arrives with its content.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from paramiko.sftp import SFTP_FAILURE, SFTP_OK
+
+
+def _errno(e):
+    return SFTPServer.convert_errno(e.errno)
+
+
+class StandInSFTPHandle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return _errno(e)
+
+    def chattr(self, attr):
+        try:
+            SFTPServer.set_file_attr(self.filename, attr)
+            return SFTP_OK
+        except OSError as e:
+            return _errno(e)
+
+
+class StandInSFTPServer(SFTPServerInterface):
+    def list_folder(self, path):
+        try:
+            out = []
+            for name in os.listdir(path):
+                attr = SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+                attr.filename = name
+                out.append(attr)
+            return out
+        except OSError as e:
+            return _errno(e)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(path))
+        except OSError as e:
+            return _errno(e)
+
+    def lstat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(path))
+        except OSError as e:
+            return _errno(e)
+
+    def open(self, path, flags, attr):
+        try:
+            binary_flag = getattr(os, "O_BINARY", 0)
+            mode = getattr(attr, "st_mode", None) or 0o666
+            fd = os.open(path, flags | binary_flag, mode)
+        except OSError as e:
+            return _errno(e)
+        if flags & os.O_CREAT and attr is not None:
+            attr._flags &= ~attr.FLAG_PERMISSIONS
+            SFTPServer.set_file_attr(path, attr)
+        if flags & os.O_WRONLY:
+            fstr = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            fstr = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            fstr = "rb"
+        try:
+            f = os.fdopen(fd, fstr)
+        except OSError as e:
+            return _errno(e)
+        handle = StandInSFTPHandle(flags)
+        handle.filename = path
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            return _errno(e)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        if os.path.exists(newpath):
+            return SFTP_FAILURE
+        try:
+            os.rename(oldpath, newpath)
+        except OSError as e:
+            return _errno(e)
+        return SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.replace(oldpath, newpath)
+        except OSError as e:
+            return _errno(e)
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(path)
+            if attr is not None:
+                SFTPServer.set_file_attr(path, attr)
+        except OSError as e:
+            return _errno(e)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            return _errno(e)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            SFTPServer.set_file_attr(path, attr)
+        except OSError as e:
+            return _errno(e)
+        return SFTP_OK
+
+    def symlink(self, target_path, path):
+        try:
+            os.symlink(target_path, path)
+        except OSError as e:
+            return _errno(e)
+        return SFTP_OK
+
+    def readlink(self, path):
+        try:
+            return os.readlink(path)
+        except OSError as e:
+            return _errno(e)
+
+
+def _run_exec(channel, command):
+    """Runs `command` with /bin/sh, piping the channel to stdin/stdout/stderr."""
+    proc = subprocess.Popen(
+        ["/bin/sh", "-c", command], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+    def pump_in():
+        try:
+            while True:
+                data = channel.recv(65536)
+                if not data:
+                    break
+                proc.stdin.write(data)
+        except (OSError, EOFError):
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    def pump_out(stream, send):
+        for chunk in iter(lambda: stream.read1(65536), b""):
+            send(chunk)
+
+    threads = [
+        threading.Thread(target=pump_in, daemon=True),
+        threading.Thread(target=pump_out, args=(proc.stdout, channel.sendall), daemon=True),
+        threading.Thread(target=pump_out, args=(proc.stderr, channel.sendall_stderr), daemon=True),
+    ]
+    for t in threads:
+        t.start()
+    rc = proc.wait()
+    threads[1].join()
+    threads[2].join()
+    # The exec reply goes out after check_channel_exec_request returns; a client only sends
+    # EOF once it has that reply, so waiting for it keeps fast commands from closing the
+    # channel first. Clients that never send EOF just wait out the timeout.
+    threads[0].join(timeout=2)
+    channel.send_exit_status(rc)
+    channel.close()
+
+
+class StandInServer(paramiko.ServerInterface):
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "publickey,password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=_run_exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+def _serve_connection(conn, host_key):
+    transport = paramiko.Transport(conn)
+    transport.add_server_key(host_key)
+    transport.set_subsystem_handler("sftp", SFTPServer, StandInSFTPServer)
+    try:
+        transport.start_server(server=StandInServer())
+    except (paramiko.SSHException, EOFError):
+        return
+    # Accepted channels must stay referenced: paramiko closes a Channel when it is collected.
+    channels = []
+    while transport.is_active():
+        channel = transport.accept(1)
+        channels = [c for c in channels if not c.closed]
+        if channel is not None:
+            channels.append(channel)
+
+
+def serve(port, host_key=None, ready=None):
+    host_key = host_key or paramiko.RSAKey.generate(2048)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", port))
+    sock.listen(16)
+    if ready is not None:
+        ready.set()
+    while True:
+        conn, _ = sock.accept()
+        threading.Thread(target=_serve_connection, args=(conn, host_key), daemon=True).start()
+
+
+def check_fetch():
+    from stream_transfer import fetch_tree
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    ready = threading.Event()
+    threading.Thread(target=serve, args=(port,), kwargs={"ready": ready}, daemon=True).start()
+    ready.wait()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        remote = os.path.join(tmp, "remote")
+        local = os.path.join(tmp, "local")
+        os.makedirs(os.path.join(remote, "data", "sub"))
+        expected = {"data/x.csv": b"a;b;c\n", "data/w.csv": b"other\n"}
+        for rel, content in expected.items():
+            with open(os.path.join(remote, rel), "wb") as f:
+                f.write(content)
+        for link in ("data/y.csv", "data/sub/z.csv"):
+            os.link(os.path.join(remote, "data", "x.csv"), os.path.join(remote, link))
+            expected[link] = expected["data/x.csv"]
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect("127.0.0.1", port=port, username="check", pkey=paramiko.RSAKey.generate(2048))
+        try:
+            result = fetch_tree(client, remote, ["data"], local, progress=None)
+        finally:
+            client.close()
+
+        problems = []
+        for rel, content in sorted(expected.items()):
+            path = os.path.join(local, *rel.split("/"))
+            if not os.path.isfile(path):
+                problems.append(f"missing {rel}")
+            else:
+                with open(path, "rb") as f:
+                    if f.read() != content:
+                        problems.append(f"wrong content in {rel}")
+        if result.files != len(expected):
+            problems.append(f"reported {result.files} file(s), expected {len(expected)}")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print(f"OK: {len(expected)} files (2 hard links) fetched through the stand-in")
+    return not problems
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Local SSH/SFTP stand-in for the ops scripts.")
+    p.add_argument("--port", type=int, default=2222)
+    p.add_argument("--check-fetch", action="store_true", help="Run the fetch_tree hard-link check and exit.")
+    args = p.parse_args()
+    if args.check_fetch:
+        sys.exit(0 if check_fetch() else 1)
+    print(f"SSH stand-in listening on 127.0.0.1:{args.port} (any key accepted)")
+    serve(args.port)
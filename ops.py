@@ -0,0 +1,89 @@
+"""
+Single entry point for the ops scripts. Steps run in the order given and share one SSH
+connection (see ssh_manager.py), so a chain pays for a single handshake:
+
+    python ops.py upload consolidate fetch restart
+    python ops.py release status
+    python ops.py --host 127.0.0.1 --port 2222 --remote-path /tmp/vps/site status
+
+A failing step stops the chain. After a release deploy the site path is a release
+symlink: upload only keeps what lands in deploy.SHARED_DIRS/SHARED_FILES across the
+next release (see deploy.py).
+"""
+import shlex
+import sys
+import time
+
+from clean_host import clean_host
+from deploy import REPO_URL, SHARED_DIRS, SHARED_FILES, deploy, deploy_release
+from download_from_host import download_changes
+from restart_remote_app import restart_app
+from run_consolidation_remote import JOB_ID, consolidate, fetch_results
+from ssh_manager import SSHManager, target_parser, target_from_args
+from upload_to_host import DEFAULT_JOBS, upload_files
+
+
+def status(target, manager):
+    """Independent checks, each on its own channel of the shared connection."""
+    q = shlex.quote(target.remote_path)
+    checks = [
+        ("uptime", "uptime"),
+        ("disk", f"df -h {q} | tail -n 1"),
+        ("app", "ps -eo pid,args | grep '[u]vicorn' || echo 'not running'"),
+        ("revision", f"cd {q} && (cat REVISION 2>/dev/null || git rev-parse --short HEAD 2>/dev/null || echo 'unknown')"),
+    ]
+    results = manager.run_parallel([cmd for _, cmd in checks], target)
+    for (name, _), res in zip(checks, results):
+        print(f"{name:>9}: {res.text() or res.error_text()}")
+    return all(res.ok for res in results)
+
+
+STEPS = {
+    "upload": lambda a, t, m: upload_files(t, jobs=a.jobs, dry_run=a.dry_run, full=a.full, manager=m),
+    "consolidate": lambda a, t, m: consolidate(t, a.job_id, m),
+    "fetch": lambda a, t, m: fetch_results(t, a.job_id, m),
+    "download": lambda a, t, m: download_changes(a.path, t, a.local_dir, m),
+    "restart": lambda a, t, m: restart_app(t, m),
+    "deploy": lambda a, t, m: deploy(t, m),
+    "release": lambda a, t, m: deploy_release(t, m, repo_url=a.repo_url, health_url=a.health_url),
+    "clean": lambda a, t, m: clean_host(t, m),
+    "status": lambda a, t, m: status(t, m),
+}
+
+
+def main(argv=None):
+    p = target_parser("Run ops steps against the host over one SSH connection.")
+    p.add_argument("steps", nargs="+", choices=sorted(STEPS), metavar="STEP",
+                   help=f"One or more of: {', '.join(STEPS)}.")
+    p.add_argument("--job-id", default=JOB_ID, help="Job for consolidate/fetch.")
+    p.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Concurrent channels for upload.")
+    p.add_argument("--dry-run", action="store_true", help="upload: only list what would be sent.")
+    p.add_argument("--full", action="store_true", help="upload: ignore the manifest.")
+    p.add_argument("--path", action="append", help="download: remote path (repeatable).")
+    p.add_argument("--local-dir", default=".", help="download: destination folder.")
+    p.add_argument("--repo-url", default=REPO_URL, help="release: git repository to deploy from.")
+    p.add_argument("--health-url", help="release: URL that must answer after the switch (else roll back).")
+    p.add_argument("--yes", action="store_true", help="Required for the clean step.")
+    args = p.parse_args(argv)
+    if "clean" in args.steps and not args.yes:
+        p.error("clean empties the remote site directory; pass --yes to confirm")
+
+    if "upload" in args.steps and "release" in args.steps:
+        print(f"Warning: with release, uploaded files outside {', '.join(SHARED_DIRS + SHARED_FILES)} "
+              "are replaced by the next release deploy.")
+
+    target = target_from_args(args)
+    with SSHManager() as manager:
+        for step in args.steps:
+            print(f"\n=== {step} ===")
+            started = time.monotonic()
+            ok = STEPS[step](args, target, manager)
+            print(f"=== {step}: {'ok' if ok else 'FAILED'} ({time.monotonic() - started:.1f}s) ===")
+            if not ok:
+                return 1
+        print(f"\n{len(args.steps)} step(s) over {manager.handshakes} SSH handshake(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
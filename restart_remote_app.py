@@ -1,36 +1,27 @@
-import paramiko
 import time
 
-HOST = "72.61.47.96"
-USER = "sebas024"
-KEY_FILE = "vps_key"
-REMOTE_PATH = "/home/sebas024/htdocs/srv1274145.hstgr.cloud"
+from ssh_manager import DEFAULT_TARGET, get_manager, target_from_args, target_parser
 
-def restart_app():
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+def restart_app(target=DEFAULT_TARGET, manager=None):
+    manager = manager or get_manager()
     try:
-        key = paramiko.RSAKey.from_private_key_file(KEY_FILE)
-        client.connect(HOST, username=USER, pkey=key)
-        
         print("--- Restarting Application ---")
-        command = f"cd {REMOTE_PATH} && bash start.sh"
+        command = f"cd {target.remote_path} && bash start.sh"
         
         print(f"Executing: {command}")
-        stdin, stdout, stderr = client.exec_command(command)
+        res = manager.run(command, target)
         
-        print("Output:", stdout.read().decode())
-        print("Errors:", stderr.read().decode())
+        print("Output:", res.out.decode())
+        print("Errors:", res.err.decode())
         
         print("--- Verifying Process ---")
         time.sleep(2)
-        stdin, stdout, stderr = client.exec_command("ps aux | grep uvicorn")
-        print(stdout.read().decode())
+        print(manager.run("ps aux | grep uvicorn", target).out.decode())
+        return res.ok
 
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        client.close()
+        return False
 
 if __name__ == "__main__":
-    restart_app()
+    restart_app(target_from_args(target_parser("Restart the app on the host.").parse_args()))
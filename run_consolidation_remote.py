@@ -1,87 +1,20 @@
-import paramiko
-import time
+import io
 import os
 
-HOST = "72.61.47.96"
-USER = "sebas024"
-KEY_FILE = "vps_key"
-REMOTE_PATH = "/home/sebas024/htdocs/srv1274145.hstgr.cloud"
+from ssh_manager import DEFAULT_TARGET, get_manager, target_from_args, target_parser
+from stream_transfer import fetch_tree
 
-def run():
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
-    try:
-        key = paramiko.RSAKey.from_private_key_file(KEY_FILE)
-        client.connect(HOST, username=USER, pkey=key)
-        
-        # Upload app/data_processor.py
-        sftp = client.open_sftp()
-        print("Uploading app/data_processor.py...")
-        sftp.put("app/data_processor.py", f"{REMOTE_PATH}/app/data_processor.py")
-
-        # Upload app/sii_connector.py
-        print("Uploading app/sii_connector.py...")
-        sftp.put("app/sii_connector.py", f"{REMOTE_PATH}/app/sii_connector.py")
-
-        # Upload app/email_sender.py
-        print("Uploading app/email_sender.py...")
-        sftp.put("app/email_sender.py", f"{REMOTE_PATH}/app/email_sender.py")
+JOB_ID = "test_job_manual_047"
+SOURCE_JOB_ID = "test_job_manual_046"
 
-        # Upload app/main.py
-        print("Uploading app/main.py...")
-        sftp.put("app/main.py", f"{REMOTE_PATH}/app/main.py")
-
-        # Upload app/templates/portal.html
-        print("Uploading app/templates/portal.html...")
-        sftp.put("app/templates/portal.html", f"{REMOTE_PATH}/app/templates/portal.html")
-        
-        # Upload examples image
-        try:
-            try:
-                sftp.stat(f"{REMOTE_PATH}/ejemplos")
-            except FileNotFoundError:
-                sftp.mkdir(f"{REMOTE_PATH}/ejemplos")
-            
-            images_to_upload = ["3 RCV COMPRA.png", "7 COMPRAS.png", "8 VENTAS.png", "9 BH.png", "10 IMPUESTO UNICO.png", "11 DIN.png", "13 COMPRAS ANALISIS.png", "15 VENTAS ANALISIS.png"]
-            for img_name in images_to_upload:
-                local_img = f"ejemplos/{img_name}"
-                if os.path.exists(local_img):
-                    print(f"Uploading {img_name}...")
-                    sftp.put(local_img, f"{REMOTE_PATH}/ejemplos/{img_name}")
-        except Exception as e:
-            print(f"Error uploading image: {e}")
-
-        # Upload static folder content (videos, etc)
-        try:
-            print("Syncing static folder...")
-            # Ensure remote static dir exists
-            try:
-                sftp.stat(f"{REMOTE_PATH}/static")
-            except FileNotFoundError:
-                sftp.mkdir(f"{REMOTE_PATH}/static")
-            
-            for root, dirs, files in os.walk("static"):
-                for file in files:
-                    if file == ".gitkeep": continue
-                    local_path = os.path.join(root, file)
-                    # Rel path for remote
-                    rel_path = os.path.relpath(local_path, "static")
-                    remote_path = f"{REMOTE_PATH}/static/{rel_path}".replace("\\", "/")
-                    
-                    print(f"Uploading static/{rel_path}...")
-                    sftp.put(local_path, remote_path)
-        except Exception as e:
-            print(f"Error syncing static folder: {e}")
-
-        # Create a small script on remote to run consolidation
-        remote_script = """
+REMOTE_SCRIPT = "temp_consolidate.py"
+CONSOLIDATE_SCRIPT = """
 import sys
 import os
 sys.path.append(os.getcwd())
 from app.data_processor import consolidate_data
 
-job_id = "test_job_manual_047"
+job_id = sys.argv[1]
 base_dir = "sii_data"
 download_dir = os.path.join(base_dir, "descargados", job_id)
 output_dir = os.path.join(base_dir, "generados")
@@ -94,51 +27,135 @@ try:
 except Exception as e:
     print(f"Error: {e}")
 """
-        with open("temp_consolidate.py", "w") as f:
-            f.write(remote_script)
-            
-        print("Uploading temp_consolidate.py...")
-        sftp.put("temp_consolidate.py", f"{REMOTE_PATH}/temp_consolidate.py")
+
+
+def push_app_files(sftp, remote_path):
+    # Upload app/data_processor.py
+    print("Uploading app/data_processor.py...")
+    sftp.put("app/data_processor.py", f"{remote_path}/app/data_processor.py")
+
+    # Upload app/sii_connector.py
+    print("Uploading app/sii_connector.py...")
+    sftp.put("app/sii_connector.py", f"{remote_path}/app/sii_connector.py")
+
+    # Upload app/email_sender.py
+    print("Uploading app/email_sender.py...")
+    sftp.put("app/email_sender.py", f"{remote_path}/app/email_sender.py")
+
+    # Upload app/main.py
+    print("Uploading app/main.py...")
+    sftp.put("app/main.py", f"{remote_path}/app/main.py")
+
+    # Upload app/templates/portal.html
+    print("Uploading app/templates/portal.html...")
+    sftp.put("app/templates/portal.html", f"{remote_path}/app/templates/portal.html")
+    
+    # Upload examples image
+    try:
+        try:
+            sftp.stat(f"{remote_path}/ejemplos")
+        except FileNotFoundError:
+            sftp.mkdir(f"{remote_path}/ejemplos")
         
-        # Ensure 047 data exists by copying from 046
-        print("Ensuring test data exists for 047...")
-        client.exec_command(f"cp -r {REMOTE_PATH}/sii_data/descargados/test_job_manual_046 {REMOTE_PATH}/sii_data/descargados/test_job_manual_047")
+        images_to_upload = ["3 RCV COMPRA.png", "7 COMPRAS.png", "8 VENTAS.png", "9 BH.png", "10 IMPUESTO UNICO.png", "11 DIN.png", "13 COMPRAS ANALISIS.png", "15 VENTAS ANALISIS.png"]
+        for img_name in images_to_upload:
+            local_img = f"ejemplos/{img_name}"
+            if os.path.exists(local_img):
+                print(f"Uploading {img_name}...")
+                sftp.put(local_img, f"{remote_path}/ejemplos/{img_name}")
+    except Exception as e:
+        print(f"Error uploading image: {e}")
+
+    # Upload static folder content (videos, etc)
+    try:
+        print("Syncing static folder...")
+        # Ensure remote static dir exists
+        try:
+            sftp.stat(f"{remote_path}/static")
+        except FileNotFoundError:
+            sftp.mkdir(f"{remote_path}/static")
         
+        for root, dirs, files in os.walk("static"):
+            for file in files:
+                if file == ".gitkeep": continue
+                local_path = os.path.join(root, file)
+                # Rel path for remote
+                rel_path = os.path.relpath(local_path, "static")
+                remote_file = f"{remote_path}/static/{rel_path}".replace("\\", "/")
+                
+                print(f"Uploading static/{rel_path}...")
+                sftp.put(local_path, remote_file)
+    except Exception as e:
+        print(f"Error syncing static folder: {e}")
+
+
+def consolidate(target=DEFAULT_TARGET, job_id=JOB_ID, manager=None):
+    """Pushes the app files and runs the consolidation for `job_id` on the host."""
+    remote_path = target.remote_path
+    manager = manager or get_manager()
+    try:
+        client = manager.client(target)
+
+        # Ensure the job data exists by copying it from the previous test job. The copy
+        # runs on its own channel while the files go up over SFTP.
+        print(f"Ensuring test data exists for {job_id}...")
+        _, copy_out, _ = client.exec_command(
+            f"cp -r {remote_path}/sii_data/descargados/{SOURCE_JOB_ID} {remote_path}/sii_data/descargados/{job_id}"
+        )
+
+        sftp = client.open_sftp()
+        try:
+            push_app_files(sftp, remote_path)
+
+            # Small script on remote to run consolidation
+            print(f"Uploading {REMOTE_SCRIPT}...")
+            sftp.putfo(io.BytesIO(CONSOLIDATE_SCRIPT.encode()), f"{remote_path}/{REMOTE_SCRIPT}")
+        finally:
+            sftp.close()
+        copy_out.channel.recv_exit_status()
+
         print("Running consolidation...")
-        stdin, stdout, stderr = client.exec_command(f"cd {REMOTE_PATH} && python3 temp_consolidate.py")
-        print(stdout.read().decode())
-        print(stderr.read().decode())
-        
-        print("\n--- Syncing result back ---")
-        # Tar relevant folders to ensure we get everything (descargados for this job, and generados)
-        # We'll just tar the whole sii_data to be safe and simple, or specific folders
-        print("Creating remote archive...")
-        # Tar only the specific job folder and generados to avoid huge download
-        cmd_tar = f"cd {REMOTE_PATH} && tar -czf sii_data_sync.tar.gz sii_data/generados sii_data/descargados/test_job_manual_047"
-        stdin, stdout, stderr = client.exec_command(cmd_tar)
-        exit_code = stdout.channel.recv_exit_status()
-        
-        if exit_code == 0:
-            print("Downloading sii_data_sync.tar.gz...")
-            sftp.get(f"{REMOTE_PATH}/sii_data_sync.tar.gz", "sii_data_sync.tar.gz")
-            
-            import tarfile
-            if os.path.exists("sii_data_sync.tar.gz") and os.path.getsize("sii_data_sync.tar.gz") > 0:
-                print("Extracting locally...")
-                with tarfile.open("sii_data_sync.tar.gz", "r:gz") as tar:
-                    tar.extractall(path=".")
-                print("Sync complete.")
-            else:
-                print("Error: Downloaded archive is empty or missing.")
-        else:
-            print(f"Error creating remote archive: {stderr.read().decode()}")
+        res = manager.run(f"cd {remote_path} && python3 {REMOTE_SCRIPT} {job_id}", target)
+        print(res.out.decode())
+        print(res.err.decode())
+        return res.ok
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
 
+
+def fetch_results(target=DEFAULT_TARGET, job_id=JOB_ID, manager=None):
+    """
+    Streams only the job folder and generados: tar runs on the host and is extracted
+    here as it arrives (no archive on the remote disk, resumable if the link drops).
+    """
+    manager = manager or get_manager()
+    print("\n--- Syncing result back ---")
+    try:
+        result = fetch_tree(
+            manager.client(target),
+            target.remote_path,
+            ["sii_data/generados", f"sii_data/descargados/{job_id}"],
+            ".",
+            reconnect=lambda: manager.reconnect(target),
+            progress=None,
+        )
     except Exception as e:
         print(f"Error: {e}")
-    finally:
-        client.close()
-        if os.path.exists("temp_consolidate.py"):
-            os.remove("temp_consolidate.py")
+        return False
+    for path in result.missing:
+        print(f"Remote path {path} not found.")
+    print(f"Sync complete: {result.files} file(s), {result.bytes} bytes ({result.skipped} already up to date).")
+    return True
+
+
+def run(target=DEFAULT_TARGET, job_id=JOB_ID, manager=None):
+    manager = manager or get_manager()
+    return consolidate(target, job_id, manager) and fetch_results(target, job_id, manager)
+
 
 if __name__ == "__main__":
-    run()
+    p = target_parser("Run the consolidation on the host and stream the results back.")
+    p.add_argument("--job-id", default=JOB_ID)
+    args = p.parse_args()
+    run(target_from_args(args), args.job_id)
@@ -0,0 +1,156 @@
+"""
+Shared SSH connection manager for the ops scripts.
+
+One authenticated paramiko transport per target (host, port, user) is opened on first
+use and reused by every command, SFTP session and tar stream after that, so chained
+operations (upload -> consolidate -> fetch -> restart) pay for a single handshake.
+Independent commands run on parallel channels of that same transport.
+"""
+import argparse
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+HOST = "72.61.47.96"
+USER = "sebas024"
+KEY_FILE = "vps_key"
+REMOTE_PATH = "/home/sebas024/htdocs/srv1274145.hstgr.cloud"
+KEEPALIVE_SECONDS = 30
+
+
+class Target:
+    def __init__(self, host=HOST, port=22, user=USER, key_file=KEY_FILE, remote_path=REMOTE_PATH):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.key_file = key_file
+        self.remote_path = remote_path
+
+    @property
+    def key(self):
+        return (self.host, self.port, self.user)
+
+    def __repr__(self):
+        return f"{self.user}@{self.host}:{self.port}{self.remote_path}"
+
+
+DEFAULT_TARGET = Target()
+
+
+class CommandResult:
+    def __init__(self, command, status, out, err):
+        self.command = command
+        self.status = status
+        self.out = out
+        self.err = err
+
+    @property
+    def ok(self):
+        return self.status == 0
+
+    def text(self):
+        return self.out.decode(errors="replace").strip()
+
+    def error_text(self):
+        return self.err.decode(errors="replace").strip()
+
+
+def run_command(client, command, stdin_data=None):
+    """Runs `command` on its own channel; stdin gets `stdin_data` (if any) and then EOF."""
+    stdin, stdout, stderr = client.exec_command(command)
+    if stdin_data is not None:
+        stdin.write(stdin_data)
+    stdin.channel.shutdown_write()
+    out = stdout.read()
+    err = stderr.read()
+    return CommandResult(command, stdout.channel.recv_exit_status(), out, err)
+
+
+class SSHManager:
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.handshakes = 0
+
+    def _connect(self, target):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        key = paramiko.RSAKey.from_private_key_file(target.key_file)
+        client.connect(target.host, port=target.port, username=target.user, pkey=key)
+        client.get_transport().set_keepalive(KEEPALIVE_SECONDS)
+        self.handshakes += 1
+        return client
+
+    def client(self, target=DEFAULT_TARGET):
+        """Connected client for `target`, reusing the open transport when it is still alive."""
+        with self._lock:
+            client = self._clients.get(target.key)
+            transport = client.get_transport() if client else None
+            if transport is None or not transport.is_active():
+                if client is not None:
+                    client.close()
+                client = self._clients[target.key] = self._connect(target)
+            return client
+
+    def reconnect(self, target=DEFAULT_TARGET):
+        """Drops the cached transport for `target` and opens a new one."""
+        with self._lock:
+            old = self._clients.pop(target.key, None)
+            if old is not None:
+                old.close()
+        return self.client(target)
+
+    def run(self, command, target=DEFAULT_TARGET, stdin_data=None):
+        return run_command(self.client(target), command, stdin_data)
+
+    def run_parallel(self, commands, target=DEFAULT_TARGET, max_workers=8):
+        """Independent commands, each on its own channel of the shared transport (order kept)."""
+        client = self.client(target)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(commands) or 1))) as pool:
+            return list(pool.map(lambda c: run_command(client, c), commands))
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_manager = None
+
+
+def get_manager():
+    """Process-wide manager shared by the ops scripts (closed at exit)."""
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = SSHManager()
+        atexit.register(_default_manager.close)
+    return _default_manager
+
+
+# ----------------------------
+# CLI helpers
+# ----------------------------
+def add_target_arguments(parser):
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=22)
+    parser.add_argument("--user", default=USER)
+    parser.add_argument("--key-file", default=KEY_FILE)
+    parser.add_argument("--remote-path", default=REMOTE_PATH)
+    return parser
+
+
+def target_from_args(args):
+    return Target(args.host, args.port, args.user, args.key_file, args.remote_path)
+
+
+def target_parser(description):
+    return add_target_arguments(argparse.ArgumentParser(description=description))
@@ -0,0 +1,189 @@
+"""
+Streaming download of remote subtrees over SSH.
+
+The host runs `tar -czf -` on the selected paths and the archive is read straight off
+the exec channel into a local incremental extractor: nothing is written to the remote
+disk, and each file lands locally (as <file>.part, then renamed) while the rest of the
+stream is still arriving.
+
+Resume: before each attempt the remote files are listed (one `find`) and compared with
+what is already on disk (size + mtime, which tar preserves), so only missing or changed
+files are requested. After an interruption the same call (or the automatic retry)
+picks up where it stopped, at file granularity.
+"""
+import os
+import posixpath
+import shlex
+import shutil
+import tarfile
+import threading
+import time
+import zlib
+
+import paramiko
+
+from ssh_manager import run_command
+
+DEFAULT_RETRIES = 3
+
+
+class FetchResult:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.missing = []
+        self.attempts = 0
+
+    def __repr__(self):
+        return (
+            f"FetchResult(files={self.files}, bytes={self.bytes}, skipped={self.skipped}, "
+            f"missing={self.missing}, attempts={self.attempts})"
+        )
+
+
+# ----------------------------
+# Remote listing / local comparison
+# ----------------------------
+def list_remote(client, remote_base, paths):
+    """{relpath: (size, mtime)} for every file under `paths` (relative to remote_base)."""
+    quoted = " ".join(shlex.quote(p) for p in paths)
+    command = (
+        f"cd {shlex.quote(remote_base)} && "
+        f"for p in {quoted}; do [ -e \"$p\" ] && find \"$p\" -type f -printf '%p\\t%s\\t%T@\\n'; done; true"
+    )
+    res = run_command(client, command)
+    if not res.ok:
+        raise RuntimeError(f"Remote listing failed: {res.error_text()}")
+    listing = {}
+    for line in res.out.decode("utf-8", errors="surrogateescape").splitlines():
+        parts = line.rsplit("\t", 2)
+        if len(parts) == 3:
+            rel = posixpath.normpath(parts[0])
+            listing[rel] = (int(parts[1]), int(float(parts[2])))
+    return listing
+
+
+def _local_path(local_base, rel):
+    return os.path.join(local_base, *rel.split("/"))
+
+
+def _is_current(local_base, rel, size, mtime):
+    try:
+        st = os.stat(_local_path(local_base, rel))
+    except OSError:
+        return False
+    return st.st_size == size and int(st.st_mtime) == mtime
+
+
+# ----------------------------
+# Streaming extraction
+# ----------------------------
+def _safe_rel(name):
+    rel = posixpath.normpath(name)
+    if rel.startswith("/") or rel == ".." or rel.startswith("../"):
+        return None
+    return rel
+
+
+def _extract_stream(fileobj, local_base, compress, result, progress):
+    """Extracts regular files one by one as they arrive."""
+    with tarfile.open(fileobj=fileobj, mode="r|gz" if compress else "r|") as tar:
+        for member in tar:
+            rel = _safe_rel(member.name)
+            if rel is None:
+                continue
+            target = _local_path(local_base, rel)
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if not member.isfile() and not member.islnk():
+                continue
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            part = target + ".part"
+            if member.islnk():
+                # The remote tar runs with --hard-dereference, so this only happens with a tar
+                # that ignores it: the first name already arrived (or was current) locally.
+                linked = _safe_rel(member.linkname)
+                if linked is None or not os.path.isfile(_local_path(local_base, linked)):
+                    raise tarfile.ExtractError(f"Hard link {rel} -> {member.linkname} has no local target")
+                shutil.copyfile(_local_path(local_base, linked), part)
+            else:
+                src = tar.extractfile(member)
+                with open(part, "wb") as dst:
+                    for chunk in iter(lambda: src.read(1 << 20), b""):
+                        dst.write(chunk)
+            os.replace(part, target)
+            os.utime(target, (member.mtime, member.mtime))
+            size = member.size if member.isfile() else os.path.getsize(target)
+            result.files += 1
+            result.bytes += size
+            if progress:
+                progress(f"Fetched {rel} ({size} bytes)")
+
+
+def _stream_files(client, remote_base, rels, local_base, compress, result, progress):
+    channel = client.get_transport().open_session()
+    flags = "-czf" if compress else "-cf"
+    # --hard-dereference: hard-linked files (blob store) travel as regular files, so every
+    # requested name arrives with its content instead of as a link to another member.
+    channel.exec_command(f"cd {shlex.quote(remote_base)} && tar {flags} - --hard-dereference --null -T -")
+
+    # The file list goes in from a separate thread so a long list can't deadlock against
+    # the archive coming back.
+    def feed():
+        try:
+            for rel in rels:
+                channel.sendall(rel.encode("utf-8", errors="surrogateescape") + b"\0")
+            channel.shutdown_write()
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        _extract_stream(channel.makefile("rb"), local_base, compress, result, progress)
+        rc = channel.recv_exit_status()
+        if rc != 0:
+            err = channel.recv_stderr(65536).decode(errors="replace").strip()
+            raise RuntimeError(f"Remote tar exited with {rc}: {err}")
+    finally:
+        feeder.join(timeout=1)
+        channel.close()
+
+
+def fetch_tree(client, remote_base, paths, local_base=".", reconnect=None, retries=DEFAULT_RETRIES, compress=True,
+               progress=print):
+    """
+    Downloads `paths` (relative to remote_base) into local_base, streaming and resumable.
+    A broken transfer is resumed up to `retries` times; if the connection itself dropped,
+    `reconnect()` must return a new connected SSHClient (e.g. SSHManager.reconnect). The
+    clients stay owned by the caller.
+    """
+    result = FetchResult()
+    while True:
+        result.attempts += 1
+        try:
+            listing = list_remote(client, remote_base, paths)
+            result.missing = [p for p in paths if not _has_files(listing, p)]
+            todo = sorted(r for r, (size, mtime) in listing.items() if not _is_current(local_base, r, size, mtime))
+            result.skipped = len(listing) - len(todo)
+            if todo:
+                _stream_files(client, remote_base, todo, local_base, compress, result, progress)
+            return result
+        except (OSError, EOFError, zlib.error, tarfile.TarError, paramiko.SSHException) as e:
+            if result.attempts > retries:
+                raise
+            if progress:
+                progress(f"Transfer interrupted ({e}); resuming...")
+            time.sleep(min(2 ** (result.attempts - 1), 10))
+            transport = client.get_transport()
+            if transport is None or not transport.is_active():
+                if reconnect is None:
+                    raise
+                client = reconnect()
+
+
+def _has_files(listing, path):
+    prefix = posixpath.normpath(path)
+    return any(r == prefix or r.startswith(prefix + "/") for r in listing)
@@ -1,76 +1,303 @@
-import paramiko
+import hashlib
+import json
 import os
-import stat
+import posixpath
+import shlex
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-HOST = "72.61.47.96"
-USER = "sebas024"
-KEY_FILE = "vps_key"
-REMOTE_BASE_PATH = "/home/sebas024/htdocs/srv1274145.hstgr.cloud"
+from ssh_manager import DEFAULT_TARGET, get_manager, run_command, target_from_args, target_parser
 
+MANIFEST_FILE = ".upload_manifest.json"
 IGNORE_DIRS = {'.git', '.venv', 'venv', '__pycache__', '.idea', '.vscode'}
-IGNORE_FILES = {'.DS_Store', 'vps_key', 'vps_key.pub', 'upload_to_host.py', 'clean_host.py', '.gitignore'}
+IGNORE_FILES = {'.DS_Store', 'vps_key', 'vps_key.pub', 'upload_to_host.py', 'clean_host.py', 'local_ssh_server.py', '.gitignore',
+                MANIFEST_FILE}
 
-def upload_files():
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
+# Delta sync: only new or changed files are sent.
+# - The local manifest keeps (size, mtime_ns, sha256) of what was last uploaded to each
+#   target, so unchanged files are not even re-hashed.
+# - The remote tree is listed once (a single `find` over exec).
+# - Small files go as one streamed tar.gz per bundle (`tar -xzf -` on the remote side);
+#   big files go over several SFTP channels of the same connection in parallel.
+SMALL_FILE_BYTES = 256 * 1024
+BUNDLE_BYTES = 32 * 1024 * 1024
+DEFAULT_JOBS = 4
+
+
+# ----------------------------
+# Local side
+# ----------------------------
+def scan_local(base):
+    """{relpath: (size, mtime_ns, abspath)} with the same ignore rules as always."""
+    out = {}
+    stack = [("", base)]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORE_DIRS:
+                        stack.append((rel, entry.path))
+                    continue
+                if entry.name in IGNORE_FILES or entry.name.endswith(".pyc"):
+                    continue
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                out[rel] = (st.st_size, st.st_mtime_ns, entry.path)
+    return out
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(path, target):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data.setdefault("version", 1)
+    data.setdefault("targets", {})
+    return data, data["targets"].setdefault(target, {})
+
+
+def save_manifest(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def local_hash(rel, size, mtime_ns, abspath, known):
+    """Hash from the manifest when size/mtime did not move; otherwise read the file."""
+    entry = known.get(rel)
+    if entry and entry[0] == size and entry[1] == mtime_ns:
+        return entry[2]
+    return file_sha256(abspath)
+
+
+# ----------------------------
+# Remote side
+# ----------------------------
+def list_remote(client, base):
+    """{relpath: size} of every file under base, in a single round trip."""
+    q = shlex.quote(base)
+    res = run_command(client, f"[ -d {q} ] || exit 0; cd {q} && find . -type f -printf '%P\\t%s\\n'")
+    if not res.ok:
+        raise RuntimeError(f"Remote listing failed: {res.error_text()}")
+    listing = {}
+    for line in res.out.decode("utf-8", errors="surrogateescape").splitlines():
+        rel, _, size = line.rpartition("\t")
+        if rel:
+            listing[rel] = int(size)
+    return listing
+
+
+def remote_hashes(client, base, rels):
+    """sha256 of remote files (only used when there is no manifest entry yet)."""
+    if not rels:
+        return {}
+    payload = b"\0".join(r.encode("utf-8", errors="surrogateescape") for r in rels) + b"\0"
+    res = run_command(client, f"cd {shlex.quote(base)} && xargs -0 sha256sum --", payload)
+    hashes = {}
+    for line in res.out.decode("utf-8", errors="surrogateescape").splitlines():
+        digest, _, rel = line.partition("  ")
+        if rel:
+            hashes[rel] = digest
+    return hashes
+
+
+def make_remote_dirs(client, base, rels):
+    dirs = sorted({posixpath.join(base, posixpath.dirname(r)) for r in rels})
+    if not dirs:
+        return
+    payload = b"\0".join(d.encode("utf-8", errors="surrogateescape") for d in dirs) + b"\0"
+    res = run_command(client, "xargs -0 mkdir -p --", payload)
+    if not res.ok:
+        raise RuntimeError(f"mkdir failed: {res.error_text()}")
+
+
+class _ChannelWriter:
+    """File-like wrapper so tarfile can stream straight into the exec channel."""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def write(self, data):
+        self.channel.sendall(data)
+        return len(data)
+
+
+def upload_bundle(client, base, items):
+    """Streams `items` [(rel, abspath)] as tar.gz into `tar -xzf -` on the remote side."""
+    transport = client.get_transport()
+    channel = transport.open_session()
+    channel.exec_command(f"tar -xzf - -C {shlex.quote(base)}")
+    with tarfile.open(fileobj=_ChannelWriter(channel), mode="w|gz") as tar:
+        for rel, abspath in items:
+            tar.add(abspath, arcname=rel, recursive=False)
+    channel.shutdown_write()
+    err = b"".join(iter(lambda: channel.recv_stderr(65536), b""))
+    rc = channel.recv_exit_status()
+    channel.close()
+    if rc != 0:
+        raise RuntimeError(f"tar exited with {rc}: {err.decode(errors='replace').strip()}")
+
+
+class _SftpSessions:
+    """One SFTP session per worker thread on the shared transport, closed after the sync."""
+
+    def __init__(self, client):
+        self.client = client
+        self._local = threading.local()
+        self._opened = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        sftp = getattr(self._local, "sftp", None)
+        if sftp is None:
+            sftp = self._local.sftp = self.client.open_sftp()
+            with self._lock:
+                self._opened.append(sftp)
+        return sftp
+
+    def close(self):
+        for sftp in self._opened:
+            sftp.close()
+        self._opened.clear()
+
+
+def upload_file(sessions, base, rel, abspath):
+    """Written to .part and renamed into place."""
+    sftp = sessions.get()
+    remote_file = posixpath.join(base, rel)
+    tmp = remote_file + ".part"
+    sftp.put(abspath, tmp)
+    st = os.stat(abspath)
+    sftp.utime(tmp, (st.st_atime, st.st_mtime))
+    sftp.posix_rename(tmp, remote_file)
+
+
+def plan_bundles(small, sizes):
+    bundles, current, current_bytes = [], [], 0
+    for rel, abspath in small:
+        if current and current_bytes + sizes[rel] > BUNDLE_BYTES:
+            bundles.append(current)
+            current, current_bytes = [], 0
+        current.append((rel, abspath))
+        current_bytes += sizes[rel]
+    if current:
+        bundles.append(current)
+    return bundles
+
+
+# ----------------------------
+# Sync
+# ----------------------------
+def upload_files(target=DEFAULT_TARGET, local_base=None, jobs=DEFAULT_JOBS, dry_run=False, full=False, manager=None):
+    """Returns True when everything pending reached the host."""
+    local_base = local_base or os.getcwd()
+    remote_base = target.remote_path
+    manifest_path = os.path.join(local_base, MANIFEST_FILE)
+    manifest, known = load_manifest(manifest_path, repr(target))
+    manager = manager or get_manager()
+
+    sessions = None
     try:
-        print(f"Connecting to {HOST}...")
-        key = paramiko.RSAKey.from_private_key_file(KEY_FILE)
-        client.connect(HOST, username=USER, pkey=key)
-        sftp = client.open_sftp()
+        print(f"Connecting to {target.host}...")
+        client = manager.client(target)
         print("Connected.")
 
-        # Walk through local directory
-        local_base_path = os.getcwd()
-        
-        for root, dirs, files in os.walk(local_base_path):
-            # Filter ignored directories in place
-            dirs[:] = [d for d in dirs if d not in IGNORE_DIRS]
-            
-            # Calculate relative path
-            rel_path = os.path.relpath(root, local_base_path)
-            if rel_path == ".":
-                rel_path = ""
-                
-            remote_path = os.path.join(REMOTE_BASE_PATH, rel_path).replace("\\", "/")
-            
-            # Create remote directory if it doesn't exist
-            try:
-                sftp.stat(remote_path)
-            except FileNotFoundError:
-                print(f"Creating directory: {remote_path}")
+        local = scan_local(local_base)
+        remote = list_remote(client, remote_base)
+        print(f"Local files: {len(local)}, remote files: {len(remote)}")
+
+        for rel in [r for r in known if r not in local]:
+            del known[rel]
+        hashes = {}
+        pending = []
+        unverified = []
+        for rel, (size, mtime_ns, abspath) in local.items():
+            digest = hashes[rel] = local_hash(rel, size, mtime_ns, abspath, known)
+            if full or remote.get(rel) != size:
+                pending.append(rel)
+            elif rel not in known:
+                unverified.append(rel)  # same size remotely, but never uploaded from here
+            elif known[rel][2] != digest:
+                pending.append(rel)
+        if unverified:
+            theirs = remote_hashes(client, remote_base, unverified)
+            pending.extend(r for r in unverified if theirs.get(r) != hashes[r])
+            for r in unverified:
+                if theirs.get(r) == hashes[r]:
+                    known[r] = [local[r][0], local[r][1], hashes[r]]
+
+        pending.sort()
+        sizes = {rel: local[rel][0] for rel in pending}
+        total = sum(sizes.values())
+        print(f"To upload: {len(pending)} files, {total / 1e6:.1f} MB ({len(local) - len(pending)} unchanged)")
+        if dry_run:
+            for rel in pending:
+                print(f"  {rel}")
+            return True
+        if not pending:
+            save_manifest(manifest_path, manifest)
+            print("Upload complete (nothing changed).")
+            return True
+
+        make_remote_dirs(client, remote_base, pending)
+        small = [(rel, local[rel][2]) for rel in pending if sizes[rel] <= SMALL_FILE_BYTES]
+        large = [(rel, local[rel][2]) for rel in pending if sizes[rel] > SMALL_FILE_BYTES]
+
+        failed = 0
+        sessions = _SftpSessions(client)
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            futures = {}
+            for bundle in plan_bundles(small, sizes):
+                futures[pool.submit(upload_bundle, client, remote_base, bundle)] = bundle
+            for rel, abspath in large:
+                futures[pool.submit(upload_file, sessions, remote_base, rel, abspath)] = [(rel, abspath)]
+            for fut in as_completed(futures):
+                items = futures[fut]
                 try:
-                    sftp.mkdir(remote_path)
+                    fut.result()
                 except Exception as e:
-                    # Maybe parent doesn't exist? recursiveness usually needed but os.walk is top-down
-                    # os.walk is top-down, so parents should exist already if we follow order.
-                    # But just in case sftp.mkdir doesn't like deep paths if intermediates miss.
-                    # Since we walk top-down, intermediates should be created in previous iterations.
-                    print(f"Error creating {remote_path}: {e}")
-
-            for file in files:
-                if file in IGNORE_FILES:
-                    continue
-                if file.endswith(".pyc"): # Extra safety
+                    failed += len(items)
+                    print(f"Failed to upload {len(items)} file(s) starting at {items[0][0]}: {e}")
                     continue
-                    
-                local_file_path = os.path.join(root, file)
-                remote_file_path = os.path.join(remote_path, file).replace("\\", "/")
-                
-                print(f"Uploading {local_file_path} -> {remote_file_path}")
-                try:
-                    sftp.put(local_file_path, remote_file_path)
-                except Exception as e:
-                    print(f"Failed to upload {file}: {e}")
+                for rel, _ in items:
+                    known[rel] = [local[rel][0], local[rel][1], hashes[rel]]
+                if len(items) == 1 and sizes[items[0][0]] > SMALL_FILE_BYTES:
+                    print(f"Uploaded {items[0][0]}")
+                else:
+                    print(f"Uploaded bundle of {len(items)} files")
 
-        print("Upload complete.")
-        sftp.close()
-        
+        save_manifest(manifest_path, manifest)
+        if failed:
+            print(f"Upload finished with {failed} failed file(s); re-run to retry them.")
+        else:
+            print("Upload complete.")
+        return not failed
     except Exception as e:
         print(f"An error occurred: {e}")
+        return False
     finally:
-        client.close()
+        if sessions is not None:
+            sessions.close()
+
 
 if __name__ == "__main__":
-    upload_files()
+    p = target_parser("Delta upload of the working tree to the host.")
+    p.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Concurrent SFTP channels / tar streams.")
+    p.add_argument("--dry-run", action="store_true", help="Only list what would be uploaded.")
+    p.add_argument("--full", action="store_true", help="Upload everything, ignoring the manifest.")
+    args = p.parse_args()
+    upload_files(target_from_args(args), jobs=args.jobs, dry_run=args.dry_run, full=args.full)